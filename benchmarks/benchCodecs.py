@@ -0,0 +1,62 @@
+"""
+compare the .wts codecs on a synthetic weight matrix: file size, encode time and decode time
+
+python benchmarks/benchCodecs.py --vertices 250000 --influences 300 --nonzeros 4
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from skinning import weightFile
+from skinning import weightOps
+
+
+def benchCodec(fileName, skinData, codec, repeat):
+    encodeTimes = []
+    decodeTimes = []
+    for _ in range(repeat):
+        startTime = time.perf_counter()
+        weightFile.saveSkinData(fileName, skinData, codec=codec)
+        encodeTimes.append(time.perf_counter() - startTime)
+
+        startTime = time.perf_counter()
+        decoded = weightFile.loadSkinData(fileName, mmap=False)
+        decodeTimes.append(time.perf_counter() - startTime)
+
+    error = float(np.abs(decoded['weights'] - skinData['weights'].ravel()).max())
+    return {'codec': codec,
+            'bytes': os.path.getsize(fileName),
+            'encode': min(encodeTimes),
+            'decode': min(decodeTimes),
+            'max_error': error}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--vertices', type=int, default=250000)
+    parser.add_argument('--influences', type=int, default=300)
+    parser.add_argument('--nonzeros', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--codecs', nargs='+', default=sorted(weightFile.CODECS))
+    args = parser.parse_args()
+
+    skinData = weightOps.syntheticSkinData(args.vertices, args.influences, args.nonzeros, positions=False)
+
+    print("{} vertices, {} influences, {} nonzeros per vertex".format(args.vertices, args.influences,
+                                                                       args.nonzeros))
+    print("{:<12} {:>12} {:>10} {:>10} {:>10}".format('codec', 'MB', 'encode s', 'decode s', 'max error'))
+    with tempfile.TemporaryDirectory() as tempDir:
+        fileName = os.path.join(tempDir, 'bench.wts')
+        for codec in args.codecs:
+            result = benchCodec(fileName, skinData, codec, args.repeat)
+            print("{codec:<12} {mb:>12.2f} {encode:>10.3f} {decode:>10.3f} {max_error:>10.2e}".format(
+                mb=result['bytes'] / float(1 << 20), **result))
+
+
+if __name__ == '__main__':
+    main()
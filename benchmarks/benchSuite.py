@@ -0,0 +1,149 @@
+"""
+time the maya-free hot paths behind the skinning tools on synthetic sparse weights
+
+python benchmarks/benchSuite.py --sizes 10000 100000 1000000 2000000 --output bench.json
+
+every benchmark runs the same numpy code the tools run inside maya, MFnSkinCluster arrays are
+replaced by DoubleArray so the conversions to and from maya arrays are part of the timings.
+those python float lists dominate the memory use, 2M vertices with 64 influences needs around 16GB.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from skinning import weightFile
+from skinning import weightMath
+from skinning import weightOps
+
+
+class DoubleArray(list):
+    """
+    stand-in for om.MDoubleArray, a python sequence without the buffer protocol,
+    numpy converts it element by element the same way
+    """
+
+
+def benchPrune(data):
+    # skinTools.pruneToMaxInflueness
+    weights = weightMath.pruneWeights(data['weights'], data['maxInfs'])
+    return DoubleArray(weights.ravel().tolist())
+
+
+def benchAudit(data):
+    # skinTools.checkMaxInfluences
+    audit = weightMath.auditInfluences(data['weights'], data['maxInfs'])
+    return weightMath.indexRanges(audit['offending'])
+
+
+def benchRemap(data):
+    # SkinWeightIOCmd.getInfluenceWeightMapping
+    mapping = weightMath.influenceMapping(data['influences'], data['targetInfluences'])
+    weights = weightMath.remapWeights(data['weights'], mapping, len(data['targetInfluences']))
+    return DoubleArray(weights.ravel().tolist())
+
+
+def benchNormalize(data):
+    return weightMath.normalizeRows(data['weights'] * data['scale'][:, None])
+
+
+def benchFromMaya(data):
+    # getWeights result to a weight matrix
+    return weightMath.asWeightMatrix(data['mayaWeights'], len(data['influences']))
+
+
+def benchSave(data):
+    # SkinWeightIOCmd.exportWeights
+    weightFile.saveSkinData(data['fileName'], data['skinData'])
+
+
+def benchLoad(data):
+    # SkinWeightIOCmd.loadSkinData
+    return weightFile.loadSkinData(data['fileName'])['weights']
+
+
+def benchStats(data):
+    return weightOps.weightStats(data['skinData'], maxInfs=data['maxInfs'])
+
+
+BENCHMARKS = (('prune', benchPrune),
+              ('audit', benchAudit),
+              ('remap', benchRemap),
+              ('normalize', benchNormalize),
+              ('from_maya_array', benchFromMaya),
+              ('save', benchSave),
+              ('load', benchLoad),
+              ('stats', benchStats))
+
+
+def buildData(vertexCount, influenceCount, nonzeros, maxInfs, tempDir, mayaArrays=True, seed=0):
+    rng = np.random.default_rng(seed)
+    skinData = weightOps.syntheticSkinData(vertexCount, influenceCount, nonzeros, seed=seed, positions=False)
+    weights, influences = skinData['weights'], skinData['partial_path_names']
+    # the target skincluster has the influences shuffled and a few of them missing
+    targetInfluences = [influences[i] for i in rng.permutation(influenceCount)[:max(1, influenceCount - 4)]]
+    return {'weights': weights,
+            'maxInfs': maxInfs,
+            'influences': influences,
+            'targetInfluences': targetInfluences,
+            'scale': rng.uniform(0.5, 1.5, vertexCount),
+            'mayaWeights': DoubleArray(weights.ravel().tolist()) if mayaArrays else None,
+            'fileName': os.path.join(tempDir, 'bench.wts'),
+            'skinData': skinData}
+
+
+def timeBenchmark(function, data, repeat):
+    times = []
+    for _ in range(repeat):
+        startTime = time.perf_counter()
+        function(data)
+        times.append(time.perf_counter() - startTime)
+    return {'min': min(times), 'mean': sum(times) / len(times), 'repeat': repeat}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--influences', type=int, default=64)
+    parser.add_argument('--nonzeros', type=int, default=6)
+    parser.add_argument('--max-infs', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--benchmarks', nargs='+', default=[name for name, _ in BENCHMARKS])
+    parser.add_argument('--output', help="json file the results are written to")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tempDir:
+        for vertexCount in args.sizes:
+            data = buildData(vertexCount, args.influences, args.nonzeros, args.max_infs, tempDir,
+                             mayaArrays='from_maya_array' in args.benchmarks)
+            weightFile.saveSkinData(data['fileName'], data['skinData'])
+            for name, function in BENCHMARKS:
+                if name not in args.benchmarks:
+                    continue
+                timing = timeBenchmark(function, data, args.repeat)
+                timing.update(name=name, vertices=vertexCount)
+                results.append(timing)
+                print("{:<16} {:>9} vertices {:>10.4f}s".format(name, vertexCount, timing['min']))
+            del data
+
+    report = {'python': platform.python_version(),
+              'numpy': np.__version__,
+              'platform': platform.platform(),
+              'influences': args.influences,
+              'nonzeros': args.nonzeros,
+              'max_infs': args.max_infs,
+              'results': results}
+    if args.output:
+        with open(args.output, "w") as outputFile:
+            json.dump(report, outputFile, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,6 @@
+import json
+import os
+import threading
 import time
 import functools
 
@@ -9,22 +12,9 @@ def decorator(func):
         print("result is {}".format(res))
         print("after running function")
         return res
-    
-    return wrapper
-
-@decorator
-def test(a, b):
-    return a + b
-
-#test(2, 3)
-#x = decorator(test)(2, 3)
 
-#x = decorator(test) # it return wrapper
-#print(x.__name__)
-
-print(test.__name__)
+    return wrapper
 
----------------------------------------------------
 # again insert into another function
 def decoratorWithArgument(param):
     def inner(func):
@@ -37,43 +27,207 @@ def decoratorWithArgument(param):
         return wrapper
     return inner
 
-@decoratorWithArgument(10)
-def test(a, b):
-    return a + b
-test(2, 3)
+#@decoratorWithArgument(10)
+#def test(a, b):
+#    return a + b
+#test(2, 3)
 #result is 50, (2+3)*10
 
--------------------------------------------------------------------
-def timeIt(func):
+
+class Span(object):
+    """
+    one timed region, counters hold what it processed, e.g. {'vertices': 1000, 'bytes': 8000}
+    """
+    __slots__ = ('session', 'name', 'parent', 'depth', 'threadId', 'start', 'end', 'counters')
+
+    def __init__(self, session, name, counters):
+        self.session = session
+        self.name = name
+        self.counters = dict(counters)
+        self.parent = None
+        self.depth = 0
+        self.threadId = 0
+        self.start = 0.0
+        self.end = 0.0
+
+    def __enter__(self):
+        stack = self.session.stack()
+        if stack:
+            self.parent = stack[-1]
+            self.depth = len(stack)
+        self.threadId = threading.get_ident()
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.end = time.perf_counter()
+        self.session.stack().pop()
+        self.session.record(self)
+
+    def count(self, name, value):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+
+class NullSpan(object):
+    # handed out while the session is disabled, costs one call and nothing is recorded
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        pass
+
+    def count(self, name, value):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+class TimingSession(object):
+    """
+    collects the spans of timeIt and span while enabled.
+
+    session.enable()
+    mc.skinWeightIO(mesh, load=True, filename=path)
+    session.dumpChromeTrace(tracePath)   # open in chrome://tracing or perfetto
+    """
+
+    def __init__(self):
+        self.enabled = os.environ.get('SKINNING_TIMING', '').strip().lower() not in ('', '0', 'false', 'off')
+        self.spans = []
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.origin = time.perf_counter()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self.lock:
+            self.spans = []
+        self.origin = time.perf_counter()
+
+    def stack(self):
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    def record(self, span):
+        with self.lock:
+            self.spans.append(span)
+
+    def span(self, name, **counters):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, counters)
+
+    def count(self, name, value):
+        """
+        add to a counter of the innermost open span
+        """
+        if self.enabled:
+            stack = self.stack()
+            if stack:
+                stack[-1].count(name, value)
+
+    def report(self):
+        """
+        :return: dict with every span in completion order and per name totals,
+            self time excludes the time spent in child spans
+        """
+        with self.lock:
+            spans = list(self.spans)
+        childTime = {}
+        for span in spans:
+            if span.parent is not None:
+                childTime[id(span.parent)] = childTime.get(id(span.parent), 0.0) + span.end - span.start
+
+        totals = {}
+        entries = []
+        for span in spans:
+            seconds = span.end - span.start
+            selfSeconds = seconds - childTime.get(id(span), 0.0)
+            entries.append({'name': span.name,
+                            'parent': span.parent.name if span.parent is not None else None,
+                            'depth': span.depth,
+                            'thread': span.threadId,
+                            'start': span.start - self.origin,
+                            'seconds': seconds,
+                            'self_seconds': selfSeconds,
+                            'counters': span.counters})
+            total = totals.setdefault(span.name, {'calls': 0, 'seconds': 0.0, 'self_seconds': 0.0, 'counters': {}})
+            total['calls'] += 1
+            total['seconds'] += seconds
+            total['self_seconds'] += selfSeconds
+            for counter, value in span.counters.items():
+                total['counters'][counter] = total['counters'].get(counter, 0) + value
+        return {'spans': entries, 'totals': totals}
+
+    def printReport(self):
+        totals = self.report()['totals']
+        for name, total in sorted(totals.items(), key=lambda item: -item[1]['seconds']):
+            counters = ", ".join("{} {}".format(key, value) for key, value in sorted(total['counters'].items()))
+            print("{:<48} {:>6} calls {:>10.6f}s self {:>10.6f}s {}".format(
+                name, total['calls'], total['seconds'], total['self_seconds'], counters))
+
+    def dumpJson(self, fileName):
+        with open(fileName, "w") as reportFile:
+            json.dump(self.report(), reportFile, indent=2)
+
+    def dumpChromeTrace(self, fileName):
+        """
+        write the spans in the chrome trace event format
+        """
+        events = []
+        for entry in self.report()['spans']:
+            events.append({'name': entry['name'],
+                           'ph': 'X',
+                           'ts': entry['start'] * 1e6,
+                           'dur': entry['seconds'] * 1e6,
+                           'pid': os.getpid(),
+                           'tid': entry['thread'],
+                           'args': entry['counters']})
+        with open(fileName, "w") as traceFile:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, traceFile)
+
+
+# one session for every module, set SKINNING_TIMING=1 to have it enabled from the start
+session = TimingSession()
+
+
+def span(name, **counters):
+    """
+    with span('serialize', bytes=size) as timing:
+        ...
+        timing.count('vertices', vertexCount)
+    """
+    return session.span(name, **counters)
+
+
+def count(name, value):
+    session.count(name, value)
+
+
+def timeIt(func=None, name=None):
+    """
+    record a span for every call while the session is enabled
+    @timeIt or @timeIt(name='skinWeightIO.load')
+    """
+    if func is None:
+        return functools.partial(timeIt, name=name)
+    spanName = name or "{}.{}".format(func.__module__.rsplit('.', 1)[-1], func.__qualname__)
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        startTime = time.time()
-        result = func(*args, **kwargs)
-        endTime = time.time()
-        print("{} executed in {} seconds".format(func.__name__, endTime - startTime:.6f))
-        return result
+        if not session.enabled:
+            return func(*args, **kwargs)
+        with Span(session, spanName, {}):
+            return func(*args, **kwargs)
     return wrapper
-
-@timeIt
-def test1(num):
-    for i in range(num):
-        print(i)
-
-test1(1000)
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
@@ -1,24 +1,109 @@
 import maya.cmds as mc
 import maya.api.OpenMaya as om
 import maya.api.OpenMayaAnim as oma
+import numpy as np
+
+from . import decorators
+from . import weightFile
+from . import weightMath
+
+# session cache of skincluster lookups, {MObjectHandle hash code: info dict}, see getSkinclusterInfo
+skinclusterCache = {}
+# {skincluster name: MObjectHandle hash code}, skips the MSelectionList for known names
+skinclusterNames = {}
 
 def getMObject(node):
     selectionList = om.MSelectionList()
     selectionList.add(node)
     return selectionList.getDependNode(0)
 
-def getMfnSkinCluster(skincluster):
+def invalidateSkinclusterInfo(clientData):
+    # only flags the entry, the callbacks are removed outside of the callback when it is rebuilt
+    info = skinclusterCache.get(clientData)
+    if info:
+        info['valid'] = False
+
+def onInfluenceConnectionChanged(msg, plug, otherPlug, clientData):
+    connectionMsg = om.MNodeMessage.kConnectionMade | om.MNodeMessage.kConnectionBroken
+    if msg & connectionMsg and plug.partialName(useLongNames=True).startswith('matrix'):
+        invalidateSkinclusterInfo(clientData)
+
+def onTopologyChanged(*args):
+    # (mesh, [componentIds,] clientData) depending on the maya version, clientData is always last
+    invalidateSkinclusterInfo(args[-1])
+
+def onInfluenceDagChanged(msgType, child, parent, clientData):
+    # a reparented influence leaves its cached dag path pointing at the old parent
+    invalidateSkinclusterInfo(clientData)
+
+def removeSkinclusterInfo(key):
+    info = skinclusterCache.pop(key, None)
+    if info:
+        om.MMessage.removeCallbacks(info['callbackIds'])
+
+def clearSkinclusterCache():
+    for key in list(skinclusterCache):
+        removeSkinclusterInfo(key)
+    skinclusterNames.clear()
+
+def getSkinclusterInfo(skincluster):
     """
+    cached function set and geometry data of a skincluster, rebuilt automatically after the mesh topology,
+    the influence connections or the dag path of an influence change. influence names are not cached,
+    see getInfluences, a renamed joint never leaves a stale name behind
     :param skincluster(str): the name of the skincluster node
-    :return: functionset of skincluster object
+    :return: dict with 'skinFn', 'dagPath', 'vertComp', 'influencePaths' (MDagPathArray) and 'influenceIds'
     """
+    key = skinclusterNames.get(skincluster)
+    info = skinclusterCache.get(key)
+    if info and not (info['valid'] and info['handle'].isValid() and
+                     om.MFnDependencyNode(info['handle'].object()).name() == skincluster):
+        removeSkinclusterInfo(key)
+        info = None
+    if info:
+        return info
+    
     mObject = getMObject(skincluster)
+    handle = om.MObjectHandle(mObject)
+    key = handle.hashCode()
+    removeSkinclusterInfo(key)
+    
     mfnSkinCluster = oma.MFnSkinCluster(mObject)
-    return mfnSkinCluster
+    dagPath, vertComp = getGeomInfo(mfnSkinCluster)
+    influencePaths = mfnSkinCluster.influenceObjects()
+    callbackIds = [om.MNodeMessage.addAttributeChangedCallback(mObject, onInfluenceConnectionChanged, key),
+                   om.MPolyMessage.addPolyTopologyChangedCallback(dagPath.node(), onTopologyChanged, key)]
+    callbackIds.extend(om.MDagMessage.addAllDagChangesDagPathCallback(influencePath, onInfluenceDagChanged, key)
+                       for influencePath in influencePaths)
+    info = {'handle': handle,
+            'valid': True,
+            'skinFn': mfnSkinCluster,
+            'dagPath': dagPath,
+            'vertComp': vertComp,
+            'influencePaths': influencePaths,
+            'influenceIds': om.MIntArray(list(range(len(influencePaths)))),
+            'callbackIds': callbackIds}
+    skinclusterCache[key] = info
+    skinclusterNames[skincluster] = key
+    return info
+
+def getMfnSkinCluster(skincluster):
+    """
+    :param skincluster(str): the name of the skincluster node
+    :return: functionset of skincluster object
+    """
+    return getSkinclusterInfo(skincluster)['skinFn']
+
+def getSkinclusterFromMesh(mesh):
+    """
+    :param mesh(str): mesh transform or shape
+    :return: list of skinCluster nodes found in the mesh history
+    """
+    return mc.ls(mc.listHistory(mesh), type='skinCluster')
 
 def getInfluences(skincluster):
-    mfnSkinCluster = getMfnSkinCluster(skincluster)
-    influences = [inf.partialPathName() for inf in mfnSkinCluster.influences()]
+    # names are read from the cached dag paths on every call, they follow renames of the influences
+    influences = [path.partialPathName() for path in getSkinclusterInfo(skincluster)['influencePaths']]
     return influences, influences.__len__()
 
 def getGeomInfo(mfnSkinCluster):
@@ -33,33 +118,115 @@ def getGeomInfo(mfnSkinCluster):
     singleIdComp.addElements(indices)
     return dagPath, vertComp
 
+@decorators.timeIt
 def getSkinweights(skincluster, influences=None):
-    mfnSkinCluster = getMfnSkinCluster(skincluster)
-    meshDagPath, vertComp = getGeomInfo(mfnSkinCluster)
+    info = getSkinclusterInfo(skincluster)
+    mfnSkinCluster, meshDagPath, vertComp = info['skinFn'], info['dagPath'], info['vertComp']
     if not influences:
         weightsArray, influenceCount = mfnSkinCluster.getWeights(meshDagPath, vertComp)
     else:
         influencesArray = om.MIntArray()
-        influenceObjects = mfnSkinCluster.influenceObjects()
-        influencePartialNames = [inf.partialPathName() for inf in influenceObjects]
-        for inf in influenceObjects:
-            if inf in influencePartialNames:
-                index = influencePartialNames.index(inf)
-                influencesArray.append(index)
+        currentInfluences = getInfluences(skincluster)[0]
+        for inf in influences:
+            if inf in currentInfluences:
+                influencesArray.append(currentInfluences.index(inf))
         weightsArray = mfnSkinCluster.getWeights(meshDagPath, vertComp, influencesArray)
+        influenceCount = len(influencesArray)
+    decorators.count('vertices', len(weightsArray) // max(influenceCount, 1))
     return weightsArray
 
-def setSkinweights(skincluster, weightsArray):
-    mfnSkinCluster = getMfnSkinCluster(skincluster)
-    meshDagPath, vertComp = getGeomInfo(mfnSkinCluster)
-    _, influenceCount = getInfluences(skincluster)
-    infIndexes = om.MIntArray()
-    for index in range(influenceCount):
-        infIndexes.append(index)
-    weightsArray = om.MDoubleArray(weightsArray)
-    oldWeights = mfnSkinCluster.setWeights(meshDagPath, vertComp, infIndexes,
-                                           weightsArray, normalize= True,
+def getMeshPoints(mesh):
+    """
+    :param mesh(MDagPath/MObject): mesh shape or mesh data
+    :return: (V, 3) float64 object space points in one getPoints call
+    """
+    points = om.MFnMesh(mesh).getPoints(om.MSpace.kObject)
+    return np.array(points, dtype=np.float64).reshape(-1, 4)[:, :3]
+
+def getBindPoints(skincluster):
+    """
+    the points of the skincluster input geometry, the mesh before it is deformed by the skincluster,
+    so a posed rig gives the same points as its bind pose
+    :param skincluster(str): the name of the skincluster node
+    :return: (V, 3) float64 object space points
+    """
+    return getMeshPoints(getSkinclusterInfo(skincluster)['skinFn'].getInputGeometry()[0])
+
+def getMeshTopology(dagPath):
+    """
+    :param dagPath(MDagPath): mesh shape
+    :return: (vertex count of every face, vertex ids of every face) int32 arrays in one getVertices call
+    """
+    faceCounts, faceConnects = om.MFnMesh(dagPath).getVertices()
+    return np.array(faceCounts, dtype=np.int32), np.array(faceConnects, dtype=np.int32)
+
+def getTopologyFingerprint(dagPath):
+    """
+    :param dagPath(MDagPath): mesh shape
+    :return: hash of the face vertex connectivity, see weightFile.topologyFingerprint
+    """
+    return weightFile.topologyFingerprint(*getMeshTopology(dagPath))
+
+def getInfluenceLocks(mfnSkinCluster):
+    """
+    lock state of every influence through the api, no command per influence
+    :param mfnSkinCluster(MFnSkinCluster): function set of the skincluster
+    :return: bool array in skincluster influence order
+    """
+    locked = []
+    for influence in mfnSkinCluster.influenceObjects():
+        node = om.MFnDependencyNode(influence.node())
+        locked.append(node.hasAttribute('lockInfluenceWeights') and
+                      node.findPlug('lockInfluenceWeights', False).asBool())
+    return np.array(locked, dtype=bool)
+
+def getLockedInfluences(skincluster):
+    """
+    :param skincluster(str): the name of the skincluster node
+    :return: bool array, lock state of every influence in skincluster influence order
+    """
+    return getInfluenceLocks(getSkinclusterInfo(skincluster)['skinFn'])
+
+@decorators.timeIt
+def getSkinData(skincluster):
+    """
+    gather everything a .wts file stores for the full mesh, maya calls only so it belongs on the main thread
+    :param skincluster(str): the name of the skincluster node
+    :return: skin data dict, see weightFile.saveSkinData
+    """
+    info = getSkinclusterInfo(skincluster)
+    mfnSkinCluster = info['skinFn']
+    weightsArray = mfnSkinCluster.getWeights(info['dagPath'], info['vertComp'], info['influenceIds'])
+    components = np.asarray(om.MFnSingleIndexedComponent(info['vertComp']).getElements(), dtype=np.int64)
+    decorators.count('vertices', len(components))
+    return {'partial_path_names': getInfluences(skincluster)[0],
+            'full_path_names': [inf.fullPathName() for inf in info['influencePaths']],
+            'components': components,
+            'positions': getBindPoints(skincluster)[components],
+            'topology_vertex_count': len(components),
+            'topology_fingerprint': getTopologyFingerprint(info['dagPath']),
+            'weights': np.asarray(weightsArray, dtype=np.float64)}
+
+@decorators.timeIt
+def setSkinweights(skincluster, weightsArray, returnReport=False):
+    """
+    set the weights of every vertex, normalized in numpy with the locked influences kept as they are
+    :param skincluster(str): the name of the skincluster node
+    :param weightsArray(list/np.ndarray): flat per vertex weights in skincluster influence order
+    :param returnReport(bool): return the weightMath.normalizeLocked report as well
+    :return: old weights, (old weights, report) with returnReport
+    """
+    info = getSkinclusterInfo(skincluster)
+    weights = weightMath.asWeightMatrix(weightsArray, len(info['influenceIds']))
+    weights, report = weightMath.normalizeLocked(weights, getLockedInfluences(skincluster))
+    decorators.count('vertices', weights.shape[0])
+    decorators.count('rows_normalized', report['rows_adjusted'])
+    weightsArray = om.MDoubleArray(weights.ravel())
+    oldWeights = info['skinFn'].setWeights(info['dagPath'], info['vertComp'], info['influenceIds'],
+                                           weightsArray, normalize=False,
                                            returnOldWeights=True)
+    if returnReport:
+        return oldWeights, report
     return oldWeights
     
 
@@ -1,8 +1,27 @@
+import json
+
 import maya.cmds as mc
 import maya.api.OpenMaya as om
+import numpy as np
 from . import skinLib as lib
+from . import decorators
+from . import weightFile
+from . import weightMath
+from . import weightOps
+
+# mirrored influence of every influence, {influence names: permutation}
+sideCache = {}
 
-def checkMaxInfluences(mesh, maxInfs=4):
+@decorators.timeIt
+def auditMaxInfluences(mesh, maxInfs=4, epsilon=1e-6, worstCount=10):
+    """
+    count the influences of every vertex in one pass over the weight matrix
+    :param mesh:
+    :param maxInfs(int): maximum number of influences allowed per vertex
+    :param epsilon(float): weights at or below this value are not counted
+    :param worstCount(int): how many of the worst vertices to report
+    :return: weightMath.auditInfluences dict, None if the mesh has no skincluster
+    """
     skincluster = lib.getSkinclusterFromMesh(mesh)
     if not skincluster:
         om.MGlobal.displayWarning("There is no skincluster attached to the {}".format(mesh))
@@ -11,40 +30,40 @@ def checkMaxInfluences(mesh, maxInfs=4):
     skincluster = skincluster[0]
     weightsArray = lib.getSkinweights(skincluster)
     influences, influencesCount = lib.getInfluences(skincluster)
-    vertsAboveMaxInfs = []
-    for idx in range(0, len(weightsArray), influencesCount):
-        """
-        (inf1, inf2, inf3, inf4), (inf1, inf2, inf3, inf4)....
-        """
-        infcount = 0
-        weightsPerComponnet = weightsArray[idx: idx + influencesCount]
-        for weight in weightsPerComponnet:
-            if weight > 0:
-                infcount += 1
-        
-        if infcount > maxInfs:
-            vertsAboveMaxInfs.append(idx // influencesCount)
-            
-    #for selection...
-    fnVertComp = om.MFnSingleIndexedComponent()
-    vertComp = fnVertComp.create(om.MFn.kMeshVertComponent)
-    fnVertComp.addElements(vertsAboveMaxInfs)
-    mSelection = om.MSelectionList()
-    mSelection.add(mesh)
-    meshDagPath = mSelection.getDagPath(0)
-    mSelection.merge(meshDagPath, vertComp)
-    selectString = list(mSelection.getSelectionStrings()[1:])
-    mc.select(selectString)
+    weights = weightMath.asWeightMatrix(weightsArray, influencesCount)
+    decorators.count('vertices', weights.shape[0])
+    return weightMath.auditInfluences(weights, maxInfs, epsilon=epsilon, worstCount=worstCount)
+
+@decorators.timeIt
+def checkMaxInfluences(mesh, maxInfs=4, epsilon=1e-6):
+    audit = auditMaxInfluences(mesh, maxInfs=maxInfs, epsilon=epsilon)
+    if audit is None:
+        return
+    
+    #for selection, one string per contiguous range instead of one per vertex
+    selectString = []
+    for start, end in weightMath.indexRanges(audit['offending']):
+        if start == end:
+            selectString.append("{}.vtx[{}]".format(mesh, start))
+        else:
+            selectString.append("{}.vtx[{}:{}]".format(mesh, start, end))
+    
+    if selectString:
+        mc.select(selectString)
+    else:
+        mc.select(clear=True)
     return selectString
 
 # clamp skin influence
-def pruneToMaxInflueness(mesh, verts=None, maxInfs=None):
+@decorators.timeIt
+def pruneToMaxInflueness(mesh, verts=None, maxInfs=None, minWeight=0.0):
     """
     take the remainder of weight from the joints with the smallest weights
     that dont meet the max influences criteria and distributes it (weighted) across the remaining joints
     :param mesh:
     :param verts:
     :param maxInfs:
+    :param minWeight(float): weights below this value are pruned as well
     :return:
     """
     skincluster = lib.getSkinclusterFromMesh(mesh)
@@ -54,7 +73,8 @@ def pruneToMaxInflueness(mesh, verts=None, maxInfs=None):
     else:
         skincluster = skincluster[0]
         
-    skinFn = lib.getMfnSkinCluster(skincluster)
+    skinInfo = lib.getSkinclusterInfo(skincluster)
+    skinFn = skinInfo['skinFn']
     
     #get max influences count from skincluster if maxInfs parameter is None
     if maxInfs is None:
@@ -71,60 +91,210 @@ def pruneToMaxInflueness(mesh, verts=None, maxInfs=None):
             mSelection.add(vert)
         shapeDagPath, vertexComp = mSelection.getComponent(0)
     else:
-        #get geometry information
-        shapeDagPath, vertetxComp = lib.getGeomInfo(skinFn)
+        #get cached geometry information
+        shapeDagPath, vertexComp = skinInfo['dagPath'], skinInfo['vertComp']
     
     #create array of influence indices
-    influencesArray = om.MIntArray()
-    influenceObjs = skinFn.influenceObjects()
-    infCount = len(influenceObjs)
-    for index in range(infCount):
-        influencesArray.append(index)
+    infCount = len(skinInfo['influenceIds'])
+    influencesArray = skinInfo['influenceIds']
     weights = skinFn.getWeights(shapeDagPath, vertexComp, influencesArray)
     
-    #calulate new weight values
-    weightsDict = {}
-    for i in range(0, len(weights), infCount):
-        """
-        (inf1, inf2, inf3, inf4), (inf1, inf2, inf3, inf4)....
-        """
-        for j in range(infCount):
-            weightsDict[j] = weights[i + j]
-        #weightsDict: {infIndex1: weight1, infIndex2: weight2}
-        # [(infIndex1: weight1), (infIndex2: weight2)]
-        sortedWeights = sorted(list(weightsDict.items()), key=lambda w:w[1], reverse=True)
-        # desending order: [(infIndex1: weight1), (infIndex2: weight2)]
-        weightsSum = 0
-        for item in sortedWeights[:maxInfs]:
-            weightsSum += float(item[1])
-        sumMultiplier = (1 / weightsSum)
-        for x in range(infCount):
-            sortedWeights[x] = (sortedWeights[x][0], (sortedWeights[x][1] * sumMultiplier * (x < maxInfs)))
-            weights[i + sortedWeights[x][0] = sortedWeights[x][1]
+    #calulate new weight values for all the vertices at once
+    weights = weightMath.asWeightMatrix(weights, infCount)
+    decorators.count('vertices', weights.shape[0])
+    weights = weightMath.pruneWeights(weights, maxInfs, minWeight=minWeight)
     
     # set new skincluster weights
-    skinFn.setWeights(shapeDagPath, vertetxComp, influencesArray, weights, False)
+    skinFn.setWeights(shapeDagPath, vertexComp, influencesArray, om.MDoubleArray(weights.ravel()), False)
     
     return True
         
 
+def getVertexIds(verts):
+    """
+    :param verts(list): vertex components, e.g. ["body.vtx[0:10]"]
+    :return: (shape dag path, sorted vertex ids)
+    """
+    verts = mc.filterExpand(verts, selectionMask=31)
+    if not verts:
+        raise RuntimeError("No valid vertices were provided or the selection could not be"
+                           "expanded to valid vertex component")
+    mSelection = om.MSelectionList()
+    for vert in verts:
+        mSelection.add(vert)
+    shapeDagPath, vertexComp = mSelection.getComponent(0)
+    return shapeDagPath, np.unique(np.asarray(om.MFnSingleIndexedComponent(vertexComp).getElements()))
 
+def getVertexAdjacency(skincluster):
+    """
+    vertex neighbour lists of the skinned mesh, built from its edges once and kept on the cached skincluster info,
+    which the topology callback of skinLib drops when the mesh changes, a cached call reads nothing from the mesh
+    :param skincluster(str): the name of the skincluster node
+    :return: (indptr, indices), see weightMath.vertexAdjacency
+    """
+    skinInfo = lib.getSkinclusterInfo(skincluster)
+    adjacency = skinInfo.get('adjacency')
+    if adjacency is None:
+        edges = weightMath.faceEdges(*lib.getMeshTopology(skinInfo['dagPath']))
+        adjacency = weightMath.vertexAdjacency(edges, om.MFnMesh(skinInfo['dagPath']).numVertices)
+        skinInfo['adjacency'] = adjacency
+    return adjacency
 
+@decorators.timeIt
+def smoothWeights(mesh, verts=None, iterations=1, strength=0.5):
+    """
+    blend every vertex towards the average weights of its neighbours, locked influences are kept
+    :param mesh:
+    :param verts(list): vertices to smooth, the whole mesh when None
+    :param iterations(int): number of smoothing passes
+    :param strength(float): 0 keeps the weights, 1 replaces them with the neighbour average
+    :return: True when the weights were set
+    """
+    skincluster = lib.getSkinclusterFromMesh(mesh)
+    if not skincluster:
+        om.MGlobal.displayWarning("There is no skincluster attached to the {}".format(mesh))
+        return
+    skincluster = skincluster[0]
+    
+    skinInfo = lib.getSkinclusterInfo(skincluster)
+    skinFn, shapeDagPath, influencesArray = skinInfo['skinFn'], skinInfo['dagPath'], skinInfo['influenceIds']
+    rows = getVertexIds(verts)[1] if verts else None
+    
+    #neighbours outside of the selection are read as well, the whole mesh in one call
+    weights = skinFn.getWeights(shapeDagPath, skinInfo['vertComp'], influencesArray)
+    weights = weightMath.asWeightMatrix(weights, len(influencesArray))
+    decorators.count('vertices', weights.shape[0])
+    indptr, indices = getVertexAdjacency(skincluster)
+    weights = weightMath.smoothWeights(weights, indptr, indices, iterations=iterations, strength=strength,
+                                       rows=rows, lockedColumns=lib.getLockedInfluences(skincluster))
+    
+    if rows is None:
+        vertexComp = skinInfo['vertComp']
+    else:
+        singleIdComp = om.MFnSingleIndexedComponent()
+        vertexComp = singleIdComp.create(om.MFn.kMeshVertComponent)
+        singleIdComp.addElements(rows.tolist())
+        weights = weights[rows]
+    skinFn.setWeights(shapeDagPath, vertexComp, influencesArray, om.MDoubleArray(weights.ravel()), False)
+    return True
 
+def getSymmetryMap(skincluster, bindPoints, axis=0, tolerance=1e-3):
+    """
+    mirrored vertex of every vertex, kept on the cached skincluster info per axis and tolerance,
+    which the topology callback of skinLib drops when the mesh changes
+    :param skincluster(str): the name of the skincluster node
+    :param bindPoints(np.ndarray): (V, 3) points before skinning, see skinLib.getBindPoints
+    :return: see weightMath.symmetryMap, edited bind points replace the cached map
+    """
+    symmetryMaps = lib.getSkinclusterInfo(skincluster).setdefault('symmetryMaps', {})
+    digest = weightFile.arrayDigest(bindPoints)
+    cached = symmetryMaps.get((axis, tolerance))
+    if cached and cached[0] == digest:
+        return cached[1]
+    symmetry = weightMath.symmetryMap(bindPoints, axis=axis, tolerance=tolerance)
+    symmetryMaps[(axis, tolerance)] = (digest, symmetry)
+    return symmetry
 
+def getSidePermutation(influences):
+    key = tuple(influences)
+    permutation = sideCache.get(key)
+    if permutation is None:
+        permutation = sideCache[key] = weightMath.sidePermutation(influences)
+    return permutation
 
+@decorators.timeIt
+def mirrorWeights(mesh, axis='x', positiveToNegative=True, tolerance=1e-3):
+    """
+    copy the weights of one side of the mesh onto the other, left influences swapped for right ones
+    :param mesh:
+    :param axis(str): x, y or z, the object space mirror plane of the bind pose is at 0 on this axis
+    :param positiveToNegative(bool): copy from the positive side onto the negative side, else the other way
+    :param tolerance(float): maximum distance between a vertex and its mirrored position
+    :return: number of vertices mirrored, None if the mesh has no skincluster
+    """
+    skincluster = lib.getSkinclusterFromMesh(mesh)
+    if not skincluster:
+        om.MGlobal.displayWarning("There is no skincluster attached to the {}".format(mesh))
+        return
+    skincluster = skincluster[0]
+    
+    skinInfo = lib.getSkinclusterInfo(skincluster)
+    skinFn, shapeDagPath, influencesArray = skinInfo['skinFn'], skinInfo['dagPath'], skinInfo['influenceIds']
+    axis = 'xyz'.index(axis.lower())
+    # the deformed output points change with the pose, the input geometry does not
+    bindPoints = lib.getBindPoints(skincluster)
+    symmetry = getSymmetryMap(skincluster, bindPoints, axis=axis, tolerance=tolerance)
+    permutation = getSidePermutation(lib.getInfluences(skincluster)[0])
+    
+    # destination side, vertices on the mirror plane are left alone
+    side = bindPoints[:, axis]
+    rows = np.flatnonzero(side < -tolerance if positiveToNegative else side > tolerance)
+    rows = rows[symmetry[rows] >= 0]
+    missing = np.count_nonzero(symmetry < 0)
+    if missing:
+        om.MGlobal.displayWarning("{} vertices of {} have no mirrored vertex within {}".format(missing, mesh, tolerance))
+    
+    weights = skinFn.getWeights(shapeDagPath, skinInfo['vertComp'], influencesArray)
+    weights = weightMath.asWeightMatrix(weights, len(influencesArray))
+    decorators.count('vertices', rows.size)
+    weights = weightMath.mirrorWeights(weights, symmetry, permutation, rows)[rows]
+    
+    singleIdComp = om.MFnSingleIndexedComponent()
+    vertexComp = singleIdComp.create(om.MFn.kMeshVertComponent)
+    singleIdComp.addElements(rows.tolist())
+    skinFn.setWeights(shapeDagPath, vertexComp, influencesArray, om.MDoubleArray(weights.ravel()), False)
+    return int(rows.size)
 
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+@decorators.timeIt
+def removeUnusedInfluences(mesh, epsilon=0.0, dryRun=False, reportFile=None):
+    """
+    find the influences without any weight in one reduction over the weight matrix
+    and remove them from the skincluster in one edit
+    :param mesh:
+    :param epsilon(float): weights at or below this value do not count as used, vertices that still have
+        such a weight on a removed influence are renormalized in numpy and set before the removal
+    :param dryRun(bool): only report, keep every influence and weight
+    :param reportFile(str): json file the report is written to
+    :return: dict with 'influences' (name, weight total and vertex count of every influence),
+        'removed' names and the compacted (V, I) 'weights' of the kept influences
+    """
+    skincluster = lib.getSkinclusterFromMesh(mesh)
+    if not skincluster:
+        om.MGlobal.displayWarning("There is no skincluster attached to the {}".format(mesh))
+        return
+    skincluster = skincluster[0]
+    
+    skinInfo = lib.getSkinclusterInfo(skincluster)
+    influences = lib.getInfluences(skincluster)[0]
+    weights = skinInfo['skinFn'].getWeights(skinInfo['dagPath'], skinInfo['vertComp'], skinInfo['influenceIds'])
+    weights = weightMath.asWeightMatrix(weights, len(influences))
+    decorators.count('vertices', weights.shape[0])
+    
+    unused = weightMath.unusedInfluences(weights, epsilon=epsilon)
+    if unused.size == len(influences):
+        #a skincluster needs at least one influence
+        unused = unused[:-1]
+    removed = [influences[index] for index in unused.tolist()]
+    
+    report = {'influences': weightOps.influenceReport({'partial_path_names': influences, 'weights': weights},
+                                                      epsilon=epsilon),
+              'removed': removed}
+    if reportFile:
+        with open(reportFile, "w") as reportObj:
+            json.dump(report, reportObj, indent=2)
+    
+    #small weights left on the removed influences would be renormalized by maya, do it here with the locks kept
+    weights, rows = weightMath.dropInfluences(weights, unused, lib.getLockedInfluences(skincluster))
+    report['weights'] = np.delete(weights, unused, axis=1)
+    if removed and not dryRun:
+        if rows.size:
+            singleIdComp = om.MFnSingleIndexedComponent()
+            vertexComp = singleIdComp.create(om.MFn.kMeshVertComponent)
+            singleIdComp.addElements(rows.tolist())
+            skinInfo['skinFn'].setWeights(skinInfo['dagPath'], vertexComp, skinInfo['influenceIds'],
+                                          om.MDoubleArray(weights[rows].ravel()), False)
+        #one edit for every influence, the skincluster re-evaluates once
+        mc.skinCluster(skincluster, edit=True, removeInfluence=removed)
+    om.MGlobal.displayInfo("{} unused influences {} on {}".format(len(removed), "found" if dryRun else "removed",
+                                                                   skincluster))
+    return report
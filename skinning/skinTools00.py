@@ -1,8 +1,14 @@
 import os.path
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from fileinput import filename
 
 import maya.cmds as mc
 
+from . import skinLib as lib
+# the skinWeightIO plug-in imports the modules of this package once loaded, preloaded skin data is shared
+from . import weightFile
+
 skinWeightIO_plugin = os.path.join(os.path.dirname(__file__), "skinWeightIO.py")
 
 def getSelMeshes():
@@ -17,7 +23,126 @@ def getSelMeshes():
             selMeshes.add(node)
     return list(selMeshes)
 
-def importExportSkinWeights(meshes=None, doImport=True, outputDir=None, doAncestorSwap=False, replace=[], target=[]):
+def timeCall(func, *args):
+    startTime = time.time()
+    func(*args)
+    return time.time() - startTime
+
+def checkExportCache(skincluster, outputPath):
+    """
+    compare a skincluster against the manifest of its last export. the skin data is always gathered,
+    a cache hit only skips serializing and writing the file. influences and topology are compared
+    on the gathered data first, a mismatch there skips hashing the weights
+    :param skincluster(str): the name of the skincluster node
+    :param outputPath(str): .wts file of the export
+    :return: (skin data, None when unchanged, content hash or None when not computed, reason)
+    """
+    manifest = weightFile.readManifest(outputPath)
+    skinData = lib.getSkinData(skincluster)
+    if not manifest:
+        return skinData, None, 'no manifest'
+    if manifest['influences'] != skinData['partial_path_names']:
+        return skinData, None, 'influences'
+    if manifest['topology_fingerprint'] != skinData['topology_fingerprint']:
+        return skinData, None, 'topology'
+    digest = weightFile.contentHash(skinData)
+    if digest == manifest['content_hash']:
+        return None, digest, 'unchanged'
+    return skinData, digest, 'weights'
+
+def exportSkinData(outputPath, skinData, useCache=False, digest=None):
+    """
+    the save of every export done here, written atomically so a failed export keeps the previous file
+    :param outputPath(str): .wts file of the export
+    :param skinData(dict): skin data, see skinLib.getSkinData
+    :param useCache(bool): write the manifest of the export cache next to the file
+    :param digest(str): content hash of the skin data when already computed, see checkExportCache
+    """
+    weightFile.saveSkinData(outputPath, skinData, atomic=True)
+    if useCache:
+        weightFile.writeManifest(outputPath, skinData, digest)
+
+def printCacheReport(results):
+    cached = [result['mesh'] for result in results if result['status'] == 'cached']
+    print(f"export cache: {len(cached)} of {len(results)} meshes unchanged and skipped")
+    for mesh in cached:
+        print(f"\t{mesh}")
+
+def batchImportExportSkinWeights(meshes, outputDir, doImport=True, doAncestorSwap=False, replace=[], target=[],
+                                 workers=None, useCache=False):
+    """
+    maya calls stay on the main thread, the file work runs in a thread pool:
+    export gathers the weights of every mesh and hands serialization and disk writes to the pool,
+    import reads and parses every file in the pool and applies each one as soon as it is ready
+    :param meshes(list): mesh shapes
+    :param outputDir(str): folder of the .wts files
+    :param workers(int): pool size, ThreadPoolExecutor default when None
+    :param useCache(bool): skip exporting meshes whose weights match the manifest of their last export
+    :return: list of per mesh result dicts with 'mesh', 'file', 'status', 'error' and 'seconds'
+    """
+    results = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for mesh in meshes:
+            outputPath = os.path.join(outputDir, f"{mesh}.wts")
+            result = {'mesh': mesh, 'file': outputPath, 'status': 'ok', 'error': None, 'seconds': 0.0}
+            results.append(result)
+            if doImport:
+                futures[pool.submit(timeCall, weightFile.preloadSkinData, outputPath)] = result
+                continue
+            
+            startTime = time.time()
+            skincluster = lib.getSkinclusterFromMesh(mesh)
+            if not skincluster:
+                result['status'], result['error'] = 'failed', "No skinCluster found on provided mesh."
+                continue
+            if useCache:
+                skinData, digest, result['reason'] = checkExportCache(skincluster[0], outputPath)
+                result['seconds'] = time.time() - startTime
+                if skinData is None:
+                    result['status'] = 'cached'
+                    continue
+            else:
+                skinData, digest = lib.getSkinData(skincluster[0]), None
+                result['seconds'] = time.time() - startTime
+            futures[pool.submit(timeCall, exportSkinData, outputPath, skinData, useCache, digest)] = result
+            
+        for future in as_completed(futures):
+            result = futures[future]
+            try:
+                result['seconds'] += future.result()
+            except Exception as e:
+                result['status'], result['error'] = 'failed', str(e)
+                continue
+            
+            if doImport:
+                startTime = time.time()
+                try:
+                    # picks up the preloaded data instead of reading the file again
+                    mc.skinWeightIO(result['mesh'], filename=result['file'], load=True,
+                                    doAncestorSwap=doAncestorSwap, replace=replace, target=target)
+                except Exception as e:
+                    result['status'], result['error'] = 'failed', str(e)
+                finally:
+                    weightFile.discardPreloadedSkinData(result['file'])
+                result['seconds'] += time.time() - startTime
+    
+    for result in results:
+        if result['status'] in ('ok', 'cached'):
+            print(f"{result['mesh']}: {result['status']} in {result['seconds']:.3f} seconds")
+        else:
+            print(f"{result['mesh']}: {result['status']} - {result['error']}")
+    if useCache and not doImport:
+        printCacheReport(results)
+    return results
+
+def importExportSkinWeights(meshes=None, doImport=True, outputDir=None, doAncestorSwap=False, replace=[], target=[],
+                            batch=False, workers=None, useCache=False):
+    """
+    :param useCache(bool): exports write a manifest next to every .wts file and skip writing the files of meshes
+        whose influences, topology, positions and weights still match it
+    :return: per mesh result dicts when batch or useCache is on
+    """
     if not mc.pluginInfo(skinWeightIO_plugin, query=True, loaded=True):
         try:
             mc.loadPlugin(skinWeightIO_plugin)
@@ -40,8 +165,30 @@ def importExportSkinWeights(meshes=None, doImport=True, outputDir=None, doAncest
             raise RuntimeError("please save the scene or specify an output path to proceed.")
         outputDir = os.path.dirname(scenePath)
         
+    if batch:
+        return batchImportExportSkinWeights(meshes, outputDir, doImport=doImport, doAncestorSwap=doAncestorSwap,
+                                            replace=replace, target=target, workers=workers, useCache=useCache)
+    
+    if useCache and not doImport:
+        results = []
+        for mesh in meshes:
+            outputPath = os.path.join(outputDir, f"{mesh}.wts")
+            result = {'mesh': mesh, 'file': outputPath, 'status': 'ok', 'error': None, 'reason': None}
+            results.append(result)
+            skincluster = lib.getSkinclusterFromMesh(mesh)
+            if not skincluster:
+                result['status'], result['error'] = 'failed', "No skinCluster found on provided mesh."
+                continue
+            skinData, digest, result['reason'] = checkExportCache(skincluster[0], outputPath)
+            if skinData is None:
+                result['status'] = 'cached'
+                continue
+            exportSkinData(outputPath, skinData, useCache=True, digest=digest)
+        printCacheReport(results)
+        return results
+    
     for mesh in meshes:
         outputPath = os.path.join(outputDir, f"{mesh}.wts")
         mc.skinWeightIO(mesh, filename=outputPath, load=doImport, save=not doImport, doAncestorSwap=doAncestorSwap,
                         replace=replace, target=target)
-        
\ No newline at end of file
+        
\ No newline at end of file
@@ -1,10 +1,45 @@
 import maya.api.OpenMaya as om
 import maya.api.OpenMayaAnim as oma
-import re
 import maya.cmds as mc
 
+import importlib
+import json
 import os
-import pickle
+import sys
+
+import numpy as np
+
+def findPackage():
+    """
+    maya loads the plug-in from its file path, not as part of its package. the package the tools already
+    imported is used so the timing session and the preloaded skin data are shared with them,
+    a plug-in loaded on its own imports its folder as a package
+    :return: the package module
+    """
+    folder = os.path.dirname(os.path.abspath(__file__))
+    for module in list(sys.modules.values()):
+        paths = getattr(module, '__path__', None) or []
+        if any(os.path.normcase(os.path.abspath(path)) == os.path.normcase(folder) for path in paths):
+            return module
+    
+    if os.path.dirname(folder) not in sys.path:
+        sys.path.insert(0, os.path.dirname(folder))
+    package = importlib.import_module(os.path.basename(folder))
+    if not any(os.path.normcase(os.path.abspath(path)) == os.path.normcase(folder) for path in package.__path__):
+        raise ImportError(f"{package.__name__} resolves to {list(package.__path__)} instead of {folder}")
+    return package
+
+package = findPackage()
+decorators = importlib.import_module(package.__name__ + '.decorators')
+weightFile = importlib.import_module(package.__name__ + '.weightFile')
+weightMath = importlib.import_module(package.__name__ + '.weightMath')
+weightOps = importlib.import_module(package.__name__ + '.weightOps')
+# maya helpers shared with the tools
+lib = importlib.import_module(package.__name__ + '.skinLib')
+
+# closest point tables of earlier transfers, reused while the saved and the current topology stay the same
+# {(saved fingerprint, mesh fingerprint, neighbours): (points digest, source indices, blend factors)}
+transferCache = {}
 
 def maya_useNewAPI():
     """
@@ -21,13 +56,31 @@ KFileFlag = "-f"
 KFileLongFlag = "-filename"
 KReplaceFlag = "-re"
 KReplaceLongFlag = "-replace"
+KRenameExactFlag = "-rx"
+KRenameExactLongFlag = "-renameExact"
 KTargetListFlag = "-tgt"
 KTargetListLongFlag = "-target"
 KDoAncestorSwapFlag = "-das"
 KDoAncestorSwapLongFlag = "-doAncestorSwap"
+KBlockSizeFlag = "-bs"
+KBlockSizeLongFlag = "-blockSize"
+KCodecFlag = "-cd"
+KCodecLongFlag = "-codec"
+KMetadataFlag = "-md"
+KMetadataLongFlag = "-metadata"
+KClosestPointFlag = "-cp"
+KClosestPointLongFlag = "-closestPoint"
+KNeighboursFlag = "-nb"
+KNeighboursLongFlag = "-neighbours"
+KBaselineFlag = "-bl"
+KBaselineLongFlag = "-baseline"
+KDeltaEpsilonFlag = "-de"
+KDeltaEpsilonLongFlag = "-deltaEpsilon"
+KResolutionFlag = "-rt"
+KResolutionLongFlag = "-resolutionTable"
 KHelpFlag = "-h"
 KHelpLongFlag = "-help"
-KPluginCmdName = "skinWeightIo"
+KPluginCmdName = "skinWeightIO"
 
 class SkinWeightIOCmd(om.MPxCommand):
     def __init__(self):
@@ -37,13 +90,26 @@ class SkinWeightIOCmd(om.MPxCommand):
         self.doExport = False
         self.fileName = None
         self.doAncestorSwap = False
+        self.blockSize = 0
+        self.codec = weightFile.DEFAULT_CODEC
+        self.closestPoint = False
+        self.neighbours = 1
+        self.baseline = None
+        self.deltaEpsilon = 0.0
+        self.returnResolution = False
         # internal data
         self.geomDagPath = None
         self.geomComponent = None
         self.influenceIds = None
         self.skinFn = None
-        self.oldWeights = None
-        self.replaceStringPair = []
+        # sparse old weights of the vertices an import changed, (vertex ids, indptr, influence indices, values)
+        self.undoSnapshots = []
+        # how every saved influence was resolved, see weightOps.resolveInfluences
+        self.resolutionTable = []
+        # rows changed by the numpy normalization of the last import, see weightMath.normalizeLocked
+        self.normalizeReport = None
+        # compiled once, see weightOps.RenameRules
+        self.renameRules = weightOps.RenameRules()
         self.influenceTargetList = []
         
     @staticmethod
@@ -78,7 +144,12 @@ class SkinWeightIOCmd(om.MPxCommand):
         if argData.isFlagSet(KFileFlag):
             self.fileName = argData.flagArgumentString(KFileFlag, 0)
             if argData.isQuery:
-                skin_data = self.loadSkinData()
+                if argData.isFlagSet(KMetadataFlag):
+                    # counts, codec and fingerprint as a json string, straight from the header
+                    self.setResult(json.dumps(weightFile.queryFileInfo(self.fileName)))
+                    return
+                # only the header and influence table are read, weights stay on disk
+                skin_data = weightFile.querySkinData(self.fileName)
                 if skin_data:
                     self.setResult(skin_data["partial_path_names"])
                 else:
@@ -95,27 +166,83 @@ class SkinWeightIOCmd(om.MPxCommand):
         if argData.isFlagSet(KExportFlag):
             self.doExport = argData.flagArgumentBool(KExportFlag, 0)
         
+        if argData.isFlagSet(KRenameExactFlag):
+            # exact names are looked up before any regex rule
+            if not self.addRenameRules(argData, KRenameExactFlag, exact=True):
+                return
+        
         if argData.isFlagSet(KReplaceFlag):
-            replaceCount = argData.numberOfFlagUses(KReplaceFlag)
-            if argData.numberOfFlagUses(KReplaceFlag) != 2:
-                self.displayError('Replace flag requires a source and target string pair.')
+            if not self.addRenameRules(argData, KReplaceFlag):
                 return
-            
-            for i in range(replaceCount):
-                argList = argData.getFlagArgumentList(KReplaceFlag, i)
-                self.replaceStringPair.append(argList.asString(0))
                 
+        if argData.isFlagSet(KDoAncestorSwapFlag):
+            self.doAncestorSwap = argData.flagArgumentBool(KDoAncestorSwapFlag, 0)
+        
         if argData.isFlagSet(KTargetListFlag):
             if argData.numberOfFlagUses(KTargetListFlag):
                 for i in range(argData.numberOfFlagUses(KTargetListFlag)):
                     argList = argData.getFlagArgumentList(KTargetListFlag, i)
                     self.influenceTargetList.append(argList.asString(0))
         
+        if argData.isFlagSet(KBlockSizeFlag):
+            self.blockSize = max(0, argData.flagArgumentInt(KBlockSizeFlag, 0))
+        
+        if argData.isFlagSet(KClosestPointFlag):
+            self.closestPoint = argData.flagArgumentBool(KClosestPointFlag, 0)
+        
+        if argData.isFlagSet(KNeighboursFlag):
+            self.neighbours = max(1, argData.flagArgumentInt(KNeighboursFlag, 0))
+        
+        if argData.isFlagSet(KResolutionFlag):
+            self.returnResolution = argData.flagArgumentBool(KResolutionFlag, 0)
+        
+        if argData.isFlagSet(KBaselineFlag):
+            self.baseline = argData.flagArgumentString(KBaselineFlag, 0)
+        
+        if argData.isFlagSet(KDeltaEpsilonFlag):
+            self.deltaEpsilon = max(0.0, argData.flagArgumentDouble(KDeltaEpsilonFlag, 0))
+        
+        if argData.isFlagSet(KCodecFlag):
+            self.codec = argData.flagArgumentString(KCodecFlag, 0)
+            if self.codec not in weightFile.CODECS:
+                self.displayError(f"Unknown codec {self.codec}, expected one of {sorted(weightFile.CODECS)}.")
+                return
+        
         self.redoIt()
         
+    def addRenameRules(self, argData, flag, exact=False):
+        # every rule is a pair of flag uses, -re "^L_" -re "left_" -re "_jnt$" -re ""
+        useCount = argData.numberOfFlagUses(flag)
+        if useCount % 2:
+            self.displayError(f'{flag} flag requires source and target string pairs.')
+            return False
+        values = [argData.getFlagArgumentList(flag, i).asString(0) for i in range(useCount)]
+        for source, target in zip(values[0::2], values[1::2]):
+            self.renameRules.add(source, target, exact=exact)
+        return True
+    
     def undoIt(self):
-        if self.oldWeights:
-            self.skinFn.setWeights(self.geomDagPath, self.geomComponent, self.influenceIds, self.oldWeights)
+        # only the touched vertices and influences are set back
+        for vertexIds, indptr, indices, values in self.undoSnapshots:
+            if not vertexIds.size:
+                continue
+            columns, localColumns = np.unique(indices, return_inverse=True)
+            oldWeights = weightFile.csrToDense(indptr, localColumns, values, columns.size)
+            influenceIds = om.MIntArray([self.influenceIds[int(column)] for column in columns])
+            self.skinFn.setWeights(self.geomDagPath, self.createVertexComponent(vertexIds), influenceIds,
+                                   om.MDoubleArray(oldWeights.ravel()), normalize=False)
+    
+    @decorators.timeIt(name='skinWeightIO.undoSnapshot')
+    def addUndoSnapshot(self, vertexIds, oldWeights, newWeights):
+        """
+        :param vertexIds(np.ndarray): vertex index of every weight row
+        :param oldWeights(MDoubleArray): weights returned by setWeights
+        :param newWeights(MDoubleArray): weights passed to setWeights
+        """
+        influenceCount = len(self.influenceIds)
+        rows, indptr, indices, values = weightMath.undoSnapshot(weightMath.asWeightMatrix(oldWeights, influenceCount),
+                                                                weightMath.asWeightMatrix(newWeights, influenceCount))
+        self.undoSnapshots.append((np.asarray(vertexIds)[rows], indptr, indices, values))
     
     def redoIt(self):
         if self.doImport is self.doExport:
@@ -124,6 +251,8 @@ class SkinWeightIOCmd(om.MPxCommand):
         
         elif self.doImport:
             result = self.importWeights()
+            if self.returnResolution:
+                result = json.dumps(self.resolutionTable)
         else:
             result = self.exportWeights()
             
@@ -140,23 +269,44 @@ class SkinWeightIOCmd(om.MPxCommand):
         info += "\tload(1)        - If true sets command to load a skin weights file (cannot be used with save).\n"
         info += "\tsave(s)        - If true sets command to save a skin weights file (cannot be used with load).\n"
         info += "\tfilename(f)   - Path to file saved or loaded.\n"
+        info += "\tblockSize(bs)  - Stream weights in blocks of this many vertices to limit memory, 0 disables.\n"
+        info += "\tcodec(cd)      - Weight encoding used when saving: raw, zlib, lzma, uint16, uint16-zlib, uint16-lzma.\n"
+        info += "\tclosestPoint(cp) - Transfer weights by closest saved vertex position, automatic when vertex counts or connectivity differ.\n"
+        info += "\tneighbours(nb)   - Number of closest saved vertices blended by inverse distance on transfer.\n"
+        info += "\treplace(re)    - Regex rename rule as a pattern and replacement pair of flags, rules apply in order.\n"
+        info += "\trenameExact(rx) - Exact rename rule as a name and new name pair of flags, looked up before regex rules.\n"
+        info += "\tdoAncestorSwap(das) - Load weights of missing influences onto their closest existing ancestor joint.\n"
+        info += "\tresolutionTable(rt) - Return how every saved influence was resolved as a json string instead of the weights.\n"
+        info += "\tbaseline(bl)   - Save only the vertices that changed against this weights file, loading applies it back.\n"
+        info += "\tdeltaEpsilon(de) - Weight differences up to this value are not saved as changes, at least the baseline error.\n"
+        info += "\tmetadata(md)   - In query mode return the file metadata as a json string instead of the influences.\n"
         
         om.MGlobal.displayInfo(info)
     
     @staticmethod
     def commandSyntax():
         syntax = om.MSyntax()
-        syntax.addFlag(KExportFlag, KExportLongFlag, om.MSyntax.KBoolean)
-        syntax.addFlag(KImportFlag, KImportLongFlag, om.MSyntax.KBoolean)
-        syntax.addFlag(KFileFlag, KFileLongFlag, om.MSyntax.KString)
-        syntax.addFlag(KReplaceFlag, KReplaceLongFlag, om.MSyntax.KString)
+        syntax.addFlag(KExportFlag, KExportLongFlag, om.MSyntax.kBoolean)
+        syntax.addFlag(KImportFlag, KImportLongFlag, om.MSyntax.kBoolean)
+        syntax.addFlag(KFileFlag, KFileLongFlag, om.MSyntax.kString)
+        syntax.addFlag(KReplaceFlag, KReplaceLongFlag, om.MSyntax.kString)
         syntax.makeFlagMultiUse(KReplaceFlag)
-        syntax.addFlag(KTargetListFlag, KTargetListLongFlag, om.MSyntax.KString)
+        syntax.addFlag(KRenameExactFlag, KRenameExactLongFlag, om.MSyntax.kString)
+        syntax.makeFlagMultiUse(KRenameExactFlag)
+        syntax.addFlag(KTargetListFlag, KTargetListLongFlag, om.MSyntax.kString)
         syntax.makeFlagMultiUse(KTargetListFlag)
-        syntax.addFlag(KDoAncestorSwapFlag, KDoAncestorSwapLongFlag, om.MSyntax.KBoolean)
+        syntax.addFlag(KDoAncestorSwapFlag, KDoAncestorSwapLongFlag, om.MSyntax.kBoolean)
+        syntax.addFlag(KBlockSizeFlag, KBlockSizeLongFlag, om.MSyntax.kLong)
+        syntax.addFlag(KCodecFlag, KCodecLongFlag, om.MSyntax.kString)
+        syntax.addFlag(KMetadataFlag, KMetadataLongFlag, om.MSyntax.kBoolean)
+        syntax.addFlag(KClosestPointFlag, KClosestPointLongFlag, om.MSyntax.kBoolean)
+        syntax.addFlag(KNeighboursFlag, KNeighboursLongFlag, om.MSyntax.kLong)
+        syntax.addFlag(KBaselineFlag, KBaselineLongFlag, om.MSyntax.kString)
+        syntax.addFlag(KDeltaEpsilonFlag, KDeltaEpsilonLongFlag, om.MSyntax.kDouble)
+        syntax.addFlag(KResolutionFlag, KResolutionLongFlag, om.MSyntax.kBoolean)
         syntax.useSelectionAsDefault(True)
-        syntax.setObjectType(om.MSyntax.KSelectionList)
-        syntax.addFlag(KHelpFlag, KHelpLongFlag, om.MSyntax.KBoolean)
+        syntax.setObjectType(om.MSyntax.kSelectionList)
+        syntax.addFlag(KHelpFlag, KHelpLongFlag, om.MSyntax.kBoolean)
         
         syntax.makeFlagsQueryWithFullArgs(KFileFlag, True)
         syntax.enableQuery = True
@@ -169,7 +319,7 @@ class SkinWeightIOCmd(om.MPxCommand):
     
     def getGeomInfoFromSelectionList(self, selectionList):
         # only collect the first valid geometry in selectionlist
-        mSel = om.MSeletcionList()
+        mSel = om.MSelectionList()
         for sel in selectionList:
             if mc.objectType(sel) == "transform":
                 shapes = mc.listRelatives(sel, shapes=True, noIntermediate=True)
@@ -194,20 +344,46 @@ class SkinWeightIOCmd(om.MPxCommand):
         else:
             return False
         
+    @decorators.timeIt(name='skinWeightIO.import')
     def importWeights(self):
-        skinData = self.loadSkinData()
+        if not os.path.exists(self.fileName):
+            raise IOError("File not found!")
+        # the topology is checked against the header before any weight is decoded, legacy files have no header
+        skinData = weightFile.readHeader(self.fileName) or self.loadSkinData()
         if not skinData:
             return
         savedVertexCount = skinData['topology_vertex_count'] or None
+        savedFingerprint = skinData.get('topology_fingerprint')
         vertexCount = None
+        fingerprint = None
         
-        if self.geomDagPath.apiType() == om.MFn.KMesh:
+        if self.geomDagPath.apiType() == om.MFn.kMesh:
             components = set(om.MFnSingleIndexedComponent(self.geomComponent).getElements())
             vertexCount = len(components)
-        
-        if vertexCount and savedVertexCount:
-            if vertexCount != savedVertexCount:
-                raise RuntimeError("Mismatched topologies: mesh vertex count dose not match skin data vertex count")
+            fingerprint = lib.getTopologyFingerprint(self.geomDagPath)
+        
+        transfer = self.closestPoint
+        mismatch = None
+        if savedFingerprint and fingerprint and savedFingerprint != fingerprint:
+            # the same vertex count does not mean the same vertex order
+            mismatch = "mesh connectivity does not match skin data connectivity"
+        elif vertexCount and savedVertexCount and vertexCount != savedVertexCount:
+            mismatch = "mesh vertex count dose not match skin data vertex count"
+        if mismatch:
+            transfer = True
+            # a delta keeps its positions in the baseline, it is checked once loaded
+            if not weightFile.isDelta(skinData) and not self.hasSavedPositions(skinData):
+                raise RuntimeError("Mismatched topologies: " + mismatch)
+        
+        # weights are decoded block by block later on, a delta is applied onto its baseline in memory,
+        # a transfer needs every saved vertex at once and older versions are already decoded
+        stream = bool(self.blockSize) and not transfer and not weightFile.isDelta(skinData) and \
+            'weights' not in skinData
+        if not stream and 'weights' not in skinData:
+            skinData = self.loadSkinData()
+        
+        if transfer and 'positions' not in skinData:
+            raise RuntimeError("Mismatched topologies: " + (mismatch or "no positions saved to transfer from"))
             
         skincluster = mc.ls(mc.listHistory(self.geomDagPath.partialPathName()), type='skinCluster')
         
@@ -224,29 +400,105 @@ class SkinWeightIOCmd(om.MPxCommand):
         
         self.skinFn = self.getMfnSkinCluster(skincluster)
         
+        if transfer:
+            # matched against the bind points, the pose the mesh is in does not matter
+            self.displayInfo(f"Transferring weights by closest point from {savedVertexCount} saved vertices.")
+            skinData['weights'] = self.transferWeights(skinData, skincluster, savedFingerprint, fingerprint)
+        
         self.checkInfluences(skinData)
         
-        skinWeights, self.influenceIds = self.getInfluenceWeightMapping(skinData)
+        if stream:
+            return self.importWeightBlocks(skinData)
         
-        self.oldWeights = self.skinFn.setWeights(self.geomDagPath,
-                                                 self.geomComponent,
-                                                 self.influenceIds,
-                                                 skinWeights,
-                                                 normalize=True,
-                                                 returnOldWeights=True)
+        skinWeights, self.influenceIds = self.getInfluenceWeightMapping(skinData)
+        self.normalizeReport = None
+        skinWeights = self.normalizeWeights(skinWeights, lib.getInfluenceLocks(self.skinFn))
+        
+        with decorators.span('skinWeightIO.setWeights', vertices=skinWeights.shape[0]):
+            newWeights = om.MDoubleArray(skinWeights.ravel())
+            oldWeights = self.skinFn.setWeights(self.geomDagPath,
+                                                self.geomComponent,
+                                                self.influenceIds,
+                                                newWeights,
+                                                normalize=False,
+                                                returnOldWeights=True)
+        self.undoSnapshots = []
+        self.addUndoSnapshot(om.MFnSingleIndexedComponent(self.geomComponent).getElements(), oldWeights, skinWeights)
+        self.displayNormalizeReport()
         mc.select(clear=True)
-        return skinWeights
+        return newWeights
     
+    @decorators.timeIt(name='skinWeightIO.transfer')
+    def transferWeights(self, skinData, skincluster, savedFingerprint=None, fingerprint=None):
+        """
+        map the saved weights onto the selected vertices with one batched closest point query,
+        the query is reused from transferCache while both topologies and all points are unchanged
+        :param skinData(dict): skin data with weights and positions
+        :param skincluster(str): skincluster of the mesh, its input geometry gives the target points
+        :param savedFingerprint(str): topology fingerprint stored in the skin data
+        :param fingerprint(str): topology fingerprint of the mesh
+        :return: flat weights for the selected vertices, in the saved influence order
+        """
+        vertexIds = np.unique(np.asarray(om.MFnSingleIndexedComponent(self.geomComponent).getElements()))
+        targetPoints = lib.getBindPoints(skincluster)[vertexIds]
+        sourceWeights = weightMath.asWeightMatrix(skinData['weights'], len(skinData['partial_path_names']))
+        
+        key = (savedFingerprint, fingerprint, self.neighbours)
+        # hashing the points is far cheaper than the neighbour query
+        digest = weightFile.arrayDigest(np.asarray(skinData['positions'], dtype=np.float64), targetPoints)
+        cached = transferCache.get(key) if savedFingerprint and fingerprint else None
+        if cached and cached[0] == digest:
+            indices, blend = cached[1:]
+            decorators.count('cached_transfer', 1)
+        else:
+            indices, blend = weightMath.transferTable(skinData['positions'], targetPoints, k=self.neighbours)
+            if savedFingerprint and fingerprint:
+                transferCache[key] = (digest, indices, blend)
+        return weightMath.applyTransferTable(sourceWeights, indices, blend).ravel()
+    
+    @decorators.timeIt(name='skinWeightIO.importBlocks')
+    def importWeightBlocks(self, skinData):
+        """
+        set the weights blockSize vertices at a time, the changes of every block are kept sparse for undo
+        :param skinData(dict): skin data without weights, influences already checked
+        :return: number of vertices imported
+        """
+        self.undoSnapshots = []
+        vertexIds = np.unique(np.asarray(om.MFnSingleIndexedComponent(self.geomComponent).getElements()))
+        mapping, self.influenceIds = self.getInfluenceMapping(skinData['partial_path_names'])
+        lockedColumns = lib.getInfluenceLocks(self.skinFn)
+        self.normalizeReport = None
+        for start, end, weights in weightFile.iterWeightBlocks(self.fileName, self.blockSize):
+            blockIds = vertexIds[start:end]
+            blockData = {'partial_path_names': skinData['partial_path_names'], 'weights': weights.ravel()}
+            blockWeights, _ = self.getInfluenceWeightMapping(blockData, mapping, self.influenceIds)
+            blockWeights = self.normalizeWeights(blockWeights, lockedColumns)
+            with decorators.span('skinWeightIO.setWeights', vertices=len(blockIds)):
+                oldWeights = self.skinFn.setWeights(self.geomDagPath,
+                                                    self.createVertexComponent(blockIds),
+                                                    self.influenceIds,
+                                                    om.MDoubleArray(blockWeights.ravel()),
+                                                    normalize=False,
+                                                    returnOldWeights=True)
+            self.addUndoSnapshot(blockIds, oldWeights, blockWeights)
+        self.displayNormalizeReport()
+        mc.select(clear=True)
+        return int(vertexIds.size)
+    
+    @decorators.timeIt(name='skinWeightIO.export')
     def exportWeights(self):
         skinData = dict()
         skincluster = mc.ls(mc.listHistory(self.geomDagPath.partialPathName()), type='skinCluster')
         if skincluster:
             self.skinFn = self.getMfnSkinCluster(skincluster[0])
             skinData['partial_path_names'], skinData['full_path_names'], self.influenceIds = self.getInfluences(self.skinFn)
-            skinData['weights'] = list(self.skinFn.getWeights(self.geomDagPath, self.geomComponent, self.influenceIds))
-            
-            if self.geomDagPath.apiType() == om.MFn.KMesh:
-                skinData['components'] = list(set(om.MFnSingleIndexedComponent(self.geomComponent).getElements()))
+            if self.geomDagPath.apiType() == om.MFn.kMesh:
+                skinData['components'] = np.unique(
+                    np.asarray(om.MFnSingleIndexedComponent(self.geomComponent).getElements()))
+                # object space bind points allow a closest point transfer onto other topologies in any pose
+                skinData['positions'] = lib.getBindPoints(skincluster[0])[skinData['components']]
+                # checked on import before any weight is decoded
+                skinData['topology_fingerprint'] = lib.getTopologyFingerprint(self.geomDagPath)
             else:
                 self.displayWarning("Invalid geometry type, only mesh or nurbsSurface is supported.")
         
@@ -257,23 +509,41 @@ class SkinWeightIOCmd(om.MPxCommand):
         
         skinData['topology_vertex_count'] = len(skinData['components'])
         
-        if not os.path.isdir(os.path.dirname(self.fileName)):
-            os.makedirs(os.path.dirname(self.fileName))
-        
-        with open(self.fileName, "wb") as skinDataFile:
-            pickle.dump(skinData, skinDataFile)
-        # fileName = self.fileName.replace(".weights", ".json")
-        # with open(fileName, "w") as skinDataFile:
-        #     json.dump(skinData, skinDataFile, indent=4)
-        return skinData['weights']
+        if self.blockSize and not self.baseline:
+            # only one block of weights is held in memory at a time
+            with decorators.span('skinWeightIO.serialize', vertices=len(skinData['components'])) as timing:
+                with weightFile.SkinDataWriter(self.fileName, skinData, codec=self.codec, atomic=True) as writer:
+                    for start in range(0, len(skinData['components']), self.blockSize):
+                        blockIds = skinData['components'][start:start + self.blockSize]
+                        with decorators.span('skinWeightIO.getWeights', vertices=len(blockIds)):
+                            blockWeights = self.skinFn.getWeights(self.geomDagPath,
+                                                                  self.createVertexComponent(blockIds),
+                                                                  self.influenceIds)
+                        writer.writeBlock(blockWeights)
+                timing.count('bytes', os.path.getsize(self.fileName))
+            return skinData['topology_vertex_count']
+        
+        with decorators.span('skinWeightIO.getWeights', vertices=len(skinData['components'])):
+            weights = self.skinFn.getWeights(self.geomDagPath, self.geomComponent, self.influenceIds)
+            skinData['weights'] = weightMath.asWeightMatrix(weights, len(self.influenceIds))
+        with decorators.span('skinWeightIO.serialize', vertices=len(skinData['components'])) as timing:
+            if self.baseline:
+                changed = weightFile.saveDeltaSkinData(self.fileName, skinData, self.baseline, codec=self.codec,
+                                                       epsilon=self.deltaEpsilon, atomic=True)
+                timing.count('bytes', os.path.getsize(self.fileName))
+                self.displayInfo(f"Saved {changed} changed vertices against {self.baseline}.")
+                return changed
+            # weights are written as sparse csr arrays, see weightFile
+            weightFile.saveSkinData(self.fileName, skinData, codec=self.codec, atomic=True)
+            timing.count('bytes', os.path.getsize(self.fileName))
+        return list(weights)
     
+    @decorators.timeIt(name='skinWeightIO.checkInfluences')
     def checkInfluences(self, skinData):
-        # iterate influences and remapping to parents if they dont exist
-        missingInfluences = []
-        
+        # resolve every influence against one snapshot of the scene, remapping to ancestors if they dont exist
         skinDataInfluences = skinData['partial_path_names']
         influenceObjects = self.skinFn.influenceObjects()
-        currentSkinInfluences = [influenceObjects.partialPathName() for influenceObject in influenceObjects]
+        currentSkinInfluences = [influenceObject.partialPathName() for influenceObject in influenceObjects]
         
         # if a valid target list is provided, use that influence list instead
         if self.influenceTargetList:
@@ -285,27 +555,28 @@ class SkinWeightIOCmd(om.MPxCommand):
             else:
                 raise RuntimeError("Provided target list does not match influence count")
         
-        for idx, influence in enumerate(skinDataInfluences):
-            influence = self.replaceInfluence(influence)
-            if mc.objExists(influence):
-                if influence not in currentSkinInfluences:
-                    mc.skinCluster(self.skinFn.name(), edit=True, addInfluence=influence, weight=0)
-                    
-                skinDataInfluences[idx] = influence
-                # currentSkinInfluences.append(influence)
-            elif self.doAncestorSwap:
-                parent = self.findAncestorInfluence(skinData['full_path_name'][idx])
-                if parent:
-                    if parent not in currentSkinInfluences:
-                        mc.skinCluster(self.skinFn.name(), edit=True, addInfluence=parent, weight=0)
-                    skinDataInfluences[idx] = parent
-                    self.displayInfo(f"Substituting {influence} for ancestor {parent}.")
-                else:
-                    self.displayError(influence + " and its ancestors are missing.")
-                    missingInfluences.append(influence)
-            
-            else:
-                missingInfluences.append(influence)
+        self.resolutionTable = weightOps.resolveInfluences(skinDataInfluences,
+                                                           skinData.get('full_path_names', []),
+                                                           self.getHierarchyIndex(),
+                                                           rules=self.renameRules,
+                                                           doAncestorSwap=self.doAncestorSwap)
+        
+        missingInfluences = []
+        addedInfluences = []
+        currentSkinInfluences = set(currentSkinInfluences)
+        for idx, entry in enumerate(self.resolutionTable):
+            influence = entry['resolved']
+            if influence is None:
+                if self.doAncestorSwap:
+                    self.displayError(entry['influence'] + " and its ancestors are missing.")
+                missingInfluences.append(entry['influence'])
+                continue
+            if entry['method'] != 'exact':
+                self.displayInfo(f"Substituting {entry['influence']} for {entry['method']} {influence}.")
+            if influence not in currentSkinInfluences:
+                addedInfluences.append(influence)
+                currentSkinInfluences.add(influence)
+            skinDataInfluences[idx] = influence
         
         if missingInfluences:
             error_message = "\n\nUnable to load skin weights! \n\nThe following influences were missing:\n"
@@ -313,43 +584,85 @@ class SkinWeightIOCmd(om.MPxCommand):
                 error_message += "\t" + influence + "\n"
             raise RuntimeError(error_message)
         
-    def findAncestorInfluence(self, influence_data):
-        parentList = influence_data.split('|')[0:-1]
-        for j in range(len(parentList) - 1, 0, -1):
-            parent = parentList[j]
-            parent = self.replaceInfluence(parent)
-            if mc.objExists(parent) and mc.objectType(parent, isType='joint'):
-                return parent
-        return None
+        if addedInfluences:
+            # one edit, the skincluster re-evaluates once instead of once per influence
+            with decorators.span('skinWeightIO.addInfluences', influences=len(addedInfluences)):
+                mc.skinCluster(self.skinFn.name(), edit=True, addInfluence=addedInfluences, weight=0)
     
-    def getInfluenceWeightMapping(self, skinData):
-        skinDataInfluences = skinData['partial_path_names']
-        # Get active influences as a check for missing ones
+    @staticmethod
+    def getHierarchyIndex():
+        # two ls calls instead of objExists/objectType per influence and ancestor
+        return weightOps.HierarchyIndex(mc.ls(type='transform', long=True) or [],
+                                        mc.ls(type='joint', long=True) or [])
+    
+    def getInfluenceMapping(self, skinDataInfluences):
+        """
+        resolve the saved influences against the skincluster influences once
+        :param skinDataInfluences(list): influence names stored in the skin data
+        :return: (source to target index array, None if no remap is needed), target influence ids
+        """
         influenceObjects = self.skinFn.influenceObjects()
         currentSkinInfluences = [influenceObject.partialPathName() for influenceObject in influenceObjects]
+        influenceIds = self.getInfluenceMap(influenceObjects)
+        if skinDataInfluences == currentSkinInfluences:
+            return None, influenceIds
+        # skinDataInfluences = ["joint1", "joint2", "joint4"]
+        # currentSkinInfluences = ["joint2", "joint1"]
+        # mapping = [1, 0, -1]
+        return weightMath.influenceMapping(skinDataInfluences, currentSkinInfluences), influenceIds
+    
+    @decorators.timeIt(name='skinWeightIO.remap')
+    def getInfluenceWeightMapping(self, skinData, mapping=None, influenceIds=None):
+        """
+        :param skinData(dict): skin data with flat weights in the saved influence order
+        :param mapping(np.ndarray): mapping from getInfluenceMapping, resolved here when not provided
+        :param influenceIds(MIntArray): influence ids from getInfluenceMapping
+        :return: (V, I) weights in skincluster influence order, influence ids
+        """
+        skinDataInfluences = skinData['partial_path_names']
+        if influenceIds is None:
+            mapping, influenceIds = self.getInfluenceMapping(skinDataInfluences)
         
+        weights = weightMath.asWeightMatrix(skinData['weights'], len(skinDataInfluences))
         # Return influences and weights if no need to remap
-        if skinDataInfluences == currentSkinInfluences:
-            ids = om.MIntArray(list(range(len(skinDataInfluences))))
-            return om.MDoubleArray(skinData['weights']), ids
-        
-        # remap
-        weights = skinData['weights']
-        mappedWeights = []
-        numInfluences = len(skinDataInfluences)
-        for i in range(0, len(skinData['weights']), numInfluences):
-            skinDataWeightSet = weights[i:i + numInfluences]
-            newWeightSet = [0] * len(influenceObjects)
-            # skinDataInfluences = ["joint1", "joint2", "joint4"]
-            # skinDataWeightSet = [0.4, 0.2, 0.6]
-            # influenceObjects = ["joint1", "joint2"]
-            # newWeightSet = [0.4, 0.2]
-            for j in range(len(influenceObjects)):
-                influence = influenceObjects[j].partialPathName()
-                newWeightSet[j] = sum(
-                    skinDataWeightSet[i] for i, inf in enumerate(skinDataInfluences) if inf == influence
-                )
-        return om.MDoubleArray(mappedWeights), self.getInfluenceMap(influenceObjects)
+        if mapping is None:
+            return weights, influenceIds
+        
+        # remap every vertex in one scatter over the weight matrix
+        return weightMath.remapWeights(weights, mapping, len(influenceIds)), influenceIds
+    
+    @decorators.timeIt(name='skinWeightIO.normalize')
+    def normalizeWeights(self, weights, lockedColumns):
+        """
+        normalize in numpy instead of setWeights, locked influences keep their weights
+        :param weights(np.ndarray): (V, I) weights in skincluster influence order
+        :param lockedColumns(np.ndarray): lock state of every influence
+        :return: normalized (V, I) weights, the report is accumulated on normalizeReport
+        """
+        weights, report = weightMath.normalizeLocked(weights, lockedColumns)
+        if self.normalizeReport is None:
+            self.normalizeReport = report
+        else:
+            for key, value in report.items():
+                if key == 'max_adjustment':
+                    self.normalizeReport[key] = max(self.normalizeReport[key], value)
+                else:
+                    self.normalizeReport[key] += value
+        decorators.count('rows_normalized', report['rows_adjusted'])
+        return weights
+    
+    def displayNormalizeReport(self):
+        report = self.normalizeReport
+        if not report or not (report['rows_adjusted'] or report['unfixable_rows']):
+            return
+        self.displayInfo(f"Normalized {report['rows_adjusted']} vertices, total adjustment "
+                         f"{report['total_adjustment']:.6f}, largest {report['max_adjustment']:.6f}.")
+        if report['assigned_rows']:
+            self.displayWarning(f"{report['assigned_rows']} vertices had no unlocked weight, their remainder "
+                                f"went to the first unlocked influence.")
+        if report['unfixable_rows']:
+            self.displayWarning(f"{report['unfixable_rows']} vertices cannot be normalized "
+                                f"without changing locked influences.")
     
     def getInfluenceMap(self, influenceObjects):
         influenceArray = om.MIntArray()
@@ -357,14 +670,17 @@ class SkinWeightIOCmd(om.MPxCommand):
             influenceArray.append(index)
         return influenceArray
     
-    def replaceInfluence(self, influence):
-        # check if the influence name is replaced or not
-        if self.replaceStringPair:
-            renamedInfluence = re.sub(self.replaceStringPair[0], self.replaceStringPair[1], influence)
-            if renamedInfluence != influence and mc.objExists(renamedInfluence):
-                self.displayInfo(f"Substituting {influence} for influence {renamedInfluence}")
-                influence = renamedInfluence
-        return influence
+    @staticmethod
+    def hasSavedPositions(skinData):
+        # decoded skin data holds the positions, a version 2 header only their section
+        return 'positions' in skinData or bool(skinData.get('sections', {}).get('positions', {}).get('count'))
+    
+    @staticmethod
+    def createVertexComponent(vertexIds):
+        fnComponent = om.MFnSingleIndexedComponent()
+        component = fnComponent.create(om.MFn.kMeshVertComponent)
+        fnComponent.addElements([int(vertexId) for vertexId in vertexIds])
+        return component
     
     @staticmethod
     def getMfnSkinCluster(skinCluster):
@@ -385,37 +701,31 @@ class SkinWeightIOCmd(om.MPxCommand):
         return partialPathNames, fullPathNames, influencesArray
     
     def loadSkinData(self):
-        if not os.path.exists(self.fileName):
-            raise IOError("File not found!")
-        
-        with open(self.fileName, "rb") as skinDataFile:
-            skinData = pickle.load(skinDataFile)
-        
-        if 'partial_path_names' not in skinData or \
-                'full_path_names' not in skinData or \
-                'components' not in skinData:
-            raise RuntimeError('Invalid weights files!')
+        # handles both the legacy pickle files and the versioned sparse files
+        with decorators.span('skinWeightIO.load', bytes=os.path.getsize(self.fileName)) as timing:
+            skinData = weightFile.loadSkinData(self.fileName)
+            timing.count('vertices', len(skinData['components']))
         return skinData
     
-    # initialize the script plug-in
-    def initializePlugin(obj):
-        mplugin = om.MFnPlugin(obj, "Huizi", "1.0", "Any")
-        try:
-            mplugin.registerCommand(KPluginCmdName, SkinWeightIOCmd.cmdCreator, SkinWeightIOCmd.commandSyntax)
-            om.MGlobal.displayInfo(f"Registered command: {KPluginCmdName}")
-        except Exception as e:
-            om.MGlobal.displayError(f"Failed to register command: {KPluginCmdName} - {e}")
-            
-    # uninitialize the script plug-in
-    def uninitializePlugin(obj):
-        mplugin = om.MFnPlugin(obj)
-        try:
-            mplugin.deregisterCommand(KPluginCmdName)
-            om.MGlobal.displayInfo(f"Deregistered command: {KPluginCmdName}")
-        except Exception as e:
-            om.MGlobal.displayError(f"Failed to deregister command: {KPluginCmdName} - {e}")
-        
-        
+# initialize the script plug-in
+def initializePlugin(obj):
+    mplugin = om.MFnPlugin(obj, "Huizi", "1.0", "Any")
+    try:
+        mplugin.registerCommand(KPluginCmdName, SkinWeightIOCmd.cmdCreator, SkinWeightIOCmd.commandSyntax)
+        om.MGlobal.displayInfo(f"Registered command: {KPluginCmdName}")
+    except Exception as e:
+        om.MGlobal.displayError(f"Failed to register command: {KPluginCmdName} - {e}")
+        
+# uninitialize the script plug-in
+def uninitializePlugin(obj):
+    mplugin = om.MFnPlugin(obj)
+    try:
+        mplugin.deregisterCommand(KPluginCmdName)
+        om.MGlobal.displayInfo(f"Deregistered command: {KPluginCmdName}")
+    except Exception as e:
+        om.MGlobal.displayError(f"Failed to deregister command: {KPluginCmdName} - {e}")
+    
+    
 
 
 
@@ -0,0 +1,191 @@
+"""
+run a pipeline of weightOps over many .wts files on a process pool, without maya.
+
+a pipeline is an ordered list of (operation, arguments) steps, see OPERATIONS:
+    [('rename', ('^L_', 'left_')), ('prune', (4,)), ('normalize', ())]
+every file is loaded once, passed through the steps and written atomically,
+so an interrupted batch never leaves a partial output behind.
+delta files are resolved against their baseline and written as full files. a file is never rewritten
+in place while another input is a delta saved against it, the delta would be resolved against a file
+that is being replaced and no longer matches its baseline hash.
+"""
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from . import weightFile
+from . import weightOps
+
+
+def renameStep(skinData, pattern, replacement):
+    return weightOps.renameInfluences(skinData, [(pattern, replacement)])
+
+
+def renameExactStep(skinData, name, newName):
+    return weightOps.renameInfluences(skinData, [(name, newName, True)])
+
+
+def pruneStep(skinData, maxInfs, minWeight=0.0):
+    return weightOps.pruneInfluences(skinData, int(maxInfs), minWeight=float(minWeight))
+
+
+def removeUnusedStep(skinData, epsilon=0.0):
+    return weightOps.removeUnusedInfluences(skinData, epsilon=float(epsilon))
+
+
+def normalizeStep(skinData):
+    return weightOps.normalizeWeights(skinData)
+
+
+OPERATIONS = {'rename': renameStep,
+              'renameExact': renameExactStep,
+              'prune': pruneStep,
+              'removeUnused': removeUnusedStep,
+              'normalize': normalizeStep}
+
+
+def collectFiles(paths, outputDir=None):
+    """
+    :param paths(list): .wts files, directories (searched recursively) or glob patterns
+    :param outputDir(str): directory the outputs are written to, None to overwrite the inputs
+    :return: list of (input file, output file) pairs, directories keep their layout below outputDir,
+             files and glob matches keep theirs relative to the common directory of all of them
+    """
+    jobs = {}
+    # outputs written below an input directory are not inputs of the next run
+    outputRoot = os.path.join(os.path.abspath(outputDir), '') if outputDir else None
+    for path in paths:
+        if os.path.isdir(path):
+            root = path
+            fileNames = glob.glob(os.path.join(path, '**', '*.wts'), recursive=True)
+        else:
+            root = None
+            fileNames = glob.glob(path)
+        for fileName in sorted(fileNames):
+            if outputRoot and os.path.abspath(fileName).startswith(outputRoot):
+                continue
+            if not outputDir:
+                outputName = fileName
+            elif root:
+                outputName = os.path.join(outputDir, os.path.relpath(fileName, root))
+            else:
+                # the output is known once every loose file is collected
+                outputName = None
+            jobs.setdefault(os.path.abspath(fileName), (fileName, outputName))
+    looseFiles = [key for key, (_, outputName) in jobs.items() if outputName is None]
+    if looseFiles:
+        looseRoot = os.path.commonpath([os.path.dirname(key) for key in looseFiles])
+        for key in looseFiles:
+            jobs[key] = (jobs[key][0], os.path.join(outputDir, os.path.relpath(key, looseRoot)))
+    return list(jobs.values())
+
+
+def findOutputCollisions(jobs):
+    """
+    :param jobs(list): (input file, output file) pairs, see collectFiles
+    :return: list of (output file, input files) for every output written by more than one input
+    """
+    inputs = {}
+    for fileName, outputName in jobs:
+        inputs.setdefault(os.path.abspath(outputName), []).append(fileName)
+    return [(outputName, fileNames) for outputName, fileNames in inputs.items() if len(fileNames) > 1]
+
+
+def findBaselineConflicts(jobs):
+    """
+    :param jobs(list): (input file, output file) pairs, see collectFiles
+    :return: list of (baseline file, delta file) pairs where the baseline is rewritten in place
+    """
+    inPlace = set(os.path.abspath(fileName) for fileName, outputName in jobs
+                  if os.path.abspath(fileName) == os.path.abspath(outputName))
+    conflicts = []
+    for fileName, _ in jobs:
+        # only the header is read, legacy files have none and are never deltas
+        metadata = weightFile.readHeader(fileName)
+        if metadata and weightFile.isDelta(metadata):
+            baselineFileName = weightFile.baselinePath(fileName, metadata)
+            if baselineFileName in inPlace:
+                conflicts.append((baselineFileName, fileName))
+    return conflicts
+
+
+def processFile(fileName, outputName, pipeline, codec=None):
+    """
+    :param fileName(str): .wts file to read
+    :param outputName(str): .wts file to write
+    :param pipeline(list): ordered (operation, arguments) steps
+    :param codec(str): codec of the output, None keeps the codec of the input
+    :return: json friendly result dict
+    """
+    result = {'file': fileName, 'output': outputName, 'status': 'ok', 'error': None}
+    startTime = time.perf_counter()
+    try:
+        # read into memory, the output may replace the file being read
+        metadata = weightFile.readHeader(fileName)
+        if metadata and weightFile.isDelta(metadata):
+            # the output holds every vertex, not only the changes
+            result['resolved_delta'] = metadata['baseline_file']
+        skinData = weightFile.loadSkinData(fileName, mmap=False)
+        result['codec'] = codec or skinData.get('codec') or weightFile.DEFAULT_CODEC
+        for operation, arguments in pipeline:
+            skinData = OPERATIONS[operation](skinData, *arguments)
+        outputDir = os.path.dirname(outputName)
+        if outputDir and not os.path.isdir(outputDir):
+            os.makedirs(outputDir, exist_ok=True)
+        weightFile.saveSkinData(outputName, skinData, codec=result['codec'], atomic=True)
+        result['vertex_count'] = len(skinData['components'])
+        result['influence_count'] = len(skinData['partial_path_names'])
+        result['bytes'] = os.path.getsize(outputName)
+    except Exception as error:
+        result['status'] = 'failed'
+        result['error'] = "{}: {}".format(type(error).__name__, error)
+    result['seconds'] = time.perf_counter() - startTime
+    return result
+
+
+def runBatch(jobs, pipeline, codec=None, workers=None, progress=None):
+    """
+    :param jobs(list): (input file, output file) pairs, see collectFiles
+    :param pipeline(list): ordered (operation, arguments) steps
+    :param codec(str): codec of the outputs, None keeps the codec of every input
+    :param workers(int): number of processes, defaults to the cpu count
+    :param progress(callable): called with (done count, total count, result) as files finish
+    :return: summary dict with the per file results in job order
+    """
+    for operation, _ in pipeline:
+        if operation not in OPERATIONS:
+            raise ValueError("Unknown operation {}, expected one of {}".format(operation, sorted(OPERATIONS)))
+    if codec is not None and codec not in weightFile.CODECS:
+        raise ValueError("Unknown codec {}, expected one of {}".format(codec, sorted(weightFile.CODECS)))
+    collisions = findOutputCollisions(jobs)
+    if collisions:
+        raise ValueError("Several inputs would write the same output: " +
+                         ", ".join("{} (from {})".format(outputName, ", ".join(fileNames))
+                                   for outputName, fileNames in collisions))
+    conflicts = findBaselineConflicts(jobs)
+    if conflicts:
+        raise ValueError("Cannot rewrite baselines in place while deltas depend on them, write to an output "
+                         "directory instead: " + ", ".join("{} (baseline of {})".format(baseline, delta)
+                                                          for baseline, delta in conflicts))
+
+    startTime = time.perf_counter()
+    results = [None] * len(jobs)
+    if jobs:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = dict((executor.submit(processFile, fileName, outputName, pipeline, codec), index)
+                           for index, (fileName, outputName) in enumerate(jobs))
+            for done, future in enumerate(as_completed(futures), 1):
+                index = futures[future]
+                results[index] = future.result()
+                if progress:
+                    progress(done, len(jobs), results[index])
+
+    failed = [result for result in results if result['status'] != 'ok']
+    return {'pipeline': [[operation, list(arguments)] for operation, arguments in pipeline],
+            'codec': codec,
+            'file_count': len(results),
+            'failed_count': len(failed),
+            'seconds': time.perf_counter() - startTime,
+            'file_seconds': sum(result['seconds'] for result in results),
+            'results': results}
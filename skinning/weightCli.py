@@ -0,0 +1,249 @@
+"""
+inspect, convert and validate .wts skin weight files without maya
+
+python skinning/weightCli.py stats body.wts
+python skinning/weightCli.py convert body.wts -o body_small.wts --codec uint16-zlib
+python skinning/weightCli.py prune body.wts --max-infs 4
+python skinning/weightCli.py rename body.wts --rule "^L_" "left_" --rule "_jnt$" "" --exact spine_01 spine1
+python skinning/weightCli.py diff old.wts new.wts --json
+python skinning/weightCli.py batch exports/ --rename "^L_" "left_" --prune 4 --normalize -o pruned/ --summary batch.json
+"""
+import argparse
+import json
+import os
+import sys
+
+if not __package__:
+    # run as a script, import this folder as a package like every other entry point does
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    __package__ = os.path.basename(os.path.dirname(os.path.abspath(__file__)))
+
+from . import weightBatch
+from . import weightFile
+from . import weightOps
+
+
+def loadFile(fileName):
+    # read into memory, outputs may overwrite the file they were loaded from
+    return weightFile.loadSkinData(fileName, mmap=False)
+
+
+def saveResult(args, skinData, sourceData):
+    # keep the codec of the source file unless another one is asked for
+    codec = args.codec or sourceData.get('codec') or weightFile.DEFAULT_CODEC
+    fileName = args.output or args.file
+    weightFile.saveSkinData(fileName, skinData, codec=codec, atomic=True)
+    print("saved {} ({})".format(fileName, codec))
+    return 0
+
+
+def printReport(args, report):
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    for key, value in report.items():
+        print("{:<24} {}".format(key, value))
+
+
+def runStats(args):
+    report = weightFile.queryFileInfo(args.file)
+    report.update(weightOps.weightStats(loadFile(args.file), maxInfs=args.max_infs))
+    printReport(args, report)
+    return 0
+
+
+def runValidate(args):
+    failed = 0
+    for fileName in args.files:
+        try:
+            problems = weightOps.validateWeights(loadFile(fileName), tolerance=args.tolerance)
+        except Exception as error:
+            problems = [str(error)]
+        failed += bool(problems)
+        print("{}: {}".format(fileName, "; ".join(problems) if problems else "ok"))
+    return 1 if failed else 0
+
+
+def runConvert(args):
+    skinData = loadFile(args.file)
+    return saveResult(args, skinData, skinData)
+
+
+def runPrune(args):
+    skinData = loadFile(args.file)
+    return saveResult(args, weightOps.pruneInfluences(skinData, args.max_infs, minWeight=args.min_weight), skinData)
+
+
+def runNormalize(args):
+    skinData = loadFile(args.file)
+    return saveResult(args, weightOps.normalizeWeights(skinData), skinData)
+
+
+def runRename(args):
+    if not args.rules:
+        raise SystemExit("rename needs at least one --rule or --exact")
+    skinData = loadFile(args.file)
+    return saveResult(args, weightOps.renameInfluences(skinData, args.rules), skinData)
+
+
+def runInfluences(args):
+    skinData = loadFile(args.file)
+    report = weightOps.influenceReport(skinData, epsilon=args.epsilon)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for entry in report:
+            print("{influence:<40} {total:>14.4f} {vertex_count:>10}".format(**entry))
+    if args.output:
+        return saveResult(args, weightOps.removeUnusedInfluences(skinData, epsilon=args.epsilon), skinData)
+    return 0
+
+
+def runDiff(args):
+    report = weightOps.diffWeights(loadFile(args.file), loadFile(args.other),
+                                   epsilon=args.epsilon)
+    printReport(args, report)
+    return 1 if report['changed_vertex_count'] or report['missing_influences'] or report['added_influences'] else 0
+
+
+def printProgress(done, total, result):
+    print("[{}/{}] {} {} {:.3f}s{}".format(done, total, result['file'], result['status'], result['seconds'],
+                                           " " + result['error'] if result['error'] else ""), file=sys.stderr)
+
+
+def runBatch(args):
+    jobs = weightBatch.collectFiles(args.paths, outputDir=args.output)
+    try:
+        summary = weightBatch.runBatch(jobs, args.pipeline or [], codec=args.codec, workers=args.workers,
+                                       progress=None if args.quiet else printProgress)
+    except ValueError as error:
+        raise SystemExit(str(error))
+    if args.summary:
+        with open(args.summary, "w") as summaryFile:
+            json.dump(summary, summaryFile, indent=2)
+    print("{file_count} files, {failed_count} failed, {seconds:.2f}s".format(**summary))
+    return 1 if summary['failed_count'] else 0
+
+
+class RenameRule(argparse.Action):
+    # collect regex and exact rename rules into one list, in command line order
+    def __call__(self, parser, namespace, values, optionString=None):
+        rules = getattr(namespace, self.dest) or []
+        rules.append(tuple(values) + ((True,) if self.const else ()))
+        setattr(namespace, self.dest, rules)
+
+
+# argument types of the pipeline steps that take values, optional arguments last
+STEP_TYPES = {'prune': (int, float),
+              'removeUnused': (float,)}
+
+
+class PipelineStep(argparse.Action):
+    # collect the operation flags into one pipeline, in command line order
+    def __call__(self, parser, namespace, values, optionString=None):
+        values = values or ()
+        types = STEP_TYPES.get(self.const)
+        if types is not None:
+            if len(values) > len(types):
+                parser.error("{} takes at most {} values".format(optionString, len(types)))
+            try:
+                values = [valueType(value) for valueType, value in zip(types, values)]
+            except ValueError as error:
+                parser.error("{}: {}".format(optionString, error))
+        pipeline = getattr(namespace, self.dest) or []
+        pipeline.append((self.const, tuple(values)))
+        setattr(namespace, self.dest, pipeline)
+
+
+def addPipelineStep(parser, flag, operation, **kwargs):
+    parser.add_argument(flag, dest='pipeline', action=PipelineStep, const=operation, **kwargs)
+
+
+def addOutputArguments(parser):
+    parser.add_argument('-o', '--output', help="file to write, the input file is overwritten when omitted")
+    parser.add_argument('--codec', choices=sorted(weightFile.CODECS),
+                        help="weight encoding of the output, defaults to the codec of the input")
+
+
+def buildParser():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    command = commands.add_parser('stats', help="print the file metadata and weight statistics")
+    command.add_argument('file')
+    command.add_argument('--max-infs', type=int, default=4)
+    command.add_argument('--json', action='store_true')
+    command.set_defaults(run=runStats)
+
+    command = commands.add_parser('validate', help="check files for structural and normalization problems")
+    command.add_argument('files', nargs='+')
+    command.add_argument('--tolerance', type=float, default=weightOps.NORMALIZE_TOLERANCE)
+    command.set_defaults(run=runValidate)
+
+    command = commands.add_parser('convert', help="rewrite a file, possibly with another codec")
+    command.add_argument('file')
+    addOutputArguments(command)
+    command.set_defaults(run=runConvert)
+
+    command = commands.add_parser('prune', help="limit every vertex to a maximum number of influences")
+    command.add_argument('file')
+    command.add_argument('--max-infs', type=int, required=True)
+    command.add_argument('--min-weight', type=float, default=0.0)
+    addOutputArguments(command)
+    command.set_defaults(run=runPrune)
+
+    command = commands.add_parser('normalize', help="scale every vertex so its weights sum to 1")
+    command.add_argument('file')
+    addOutputArguments(command)
+    command.set_defaults(run=runNormalize)
+
+    command = commands.add_parser('rename', help="rename influences with ordered regex and exact rules")
+    command.add_argument('file')
+    command.add_argument('--rule', dest='rules', nargs=2, action=RenameRule, const=False,
+                         metavar=('PATTERN', 'REPLACEMENT'), help="regex substitution")
+    command.add_argument('--exact', dest='rules', nargs=2, action=RenameRule, const=True,
+                         metavar=('NAME', 'NEW_NAME'), help="rename one influence by its exact name")
+    addOutputArguments(command)
+    command.set_defaults(run=runRename, rules=[])
+
+    command = commands.add_parser('influences', help="weight total and vertex count of every influence, "
+                                                     "-o writes a copy without the unused influences")
+    command.add_argument('file')
+    command.add_argument('--epsilon', type=float, default=0.0)
+    command.add_argument('--json', action='store_true')
+    addOutputArguments(command)
+    command.set_defaults(run=runInfluences)
+
+    command = commands.add_parser('diff', help="compare the weights of two files")
+    command.add_argument('file')
+    command.add_argument('other')
+    command.add_argument('--epsilon', type=float, default=1e-6)
+    command.add_argument('--json', action='store_true')
+    command.set_defaults(run=runDiff)
+
+    command = commands.add_parser('batch', help="run a pipeline of operations over many files in parallel")
+    command.add_argument('paths', nargs='+', help=".wts files, directories or glob patterns")
+    addPipelineStep(command, '--rename', 'rename', nargs=2, metavar=('PATTERN', 'REPLACEMENT'))
+    addPipelineStep(command, '--rename-exact', 'renameExact', nargs=2, metavar=('NAME', 'NEW_NAME'))
+    addPipelineStep(command, '--prune', 'prune', nargs='+', metavar='MAX_INFS',
+                    help="maximum influences per vertex, optionally followed by a minimum weight")
+    addPipelineStep(command, '--remove-unused', 'removeUnused', nargs='*', metavar='EPSILON')
+    addPipelineStep(command, '--normalize', 'normalize', nargs=0)
+    command.add_argument('-o', '--output', help="output directory, the inputs are overwritten when omitted")
+    command.add_argument('--codec', choices=sorted(weightFile.CODECS),
+                         help="weight encoding of the outputs, defaults to the codec of every input")
+    command.add_argument('--workers', type=int, help="number of processes, defaults to the cpu count")
+    command.add_argument('--summary', help="json file the per file timings and failures are written to")
+    command.add_argument('--quiet', action='store_true', help="no per file progress")
+    command.set_defaults(run=runBatch, pipeline=None)
+    return parser
+
+
+def main(argv=None):
+    args = buildParser().parse_args(argv)
+    return args.run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,785 @@
+"""
+Maya-free reading and writing of .wts skin weight files.
+
+legacy files (version 0) are a plain pickle of the skinData dict with dense weights.
+versioned files start with a small header (magic + version).
+weights are stored as CSR typed arrays:
+    weights_indptr  - int64, row pointers, vertex v owns entries indptr[v]:indptr[v + 1]
+    weights_indices - int32, influence index of every stored entry
+    weights_values  - float64, weight of every stored entry
+
+version 1 pickles the skinData dict with those arrays after the header.
+version 2 is a binary container:
+    fixed header    - magic, version, reserved, metadata length
+    metadata        - utf-8 json, influences, topology and a table of the array sections
+    sections        - little endian arrays, every one aligned to ALIGNMENT bytes from the data start
+so the header and influences can be read without touching the weights,
+and uncompressed sections can be memory mapped straight into numpy.
+
+delta files are version 2 files that only hold the vertices that changed against a baseline file,
+'components' lists those vertices and the metadata records 'baseline_file' (relative to the delta)
+and 'baseline_hash'. loading a delta loads its baseline, which may itself be a delta, and applies it.
+
+the codec recorded in the metadata decides how sections are stored, see CODECS.
+uint16 codecs quantize the values to 1 / QUANTIZE_SCALE steps, every stored value is within
+QUANTIZE_MAX_ERROR of the original. every vertex is renormalized when decoded, which spreads the rounding
+of its other weights onto each weight, so a decoded weight of a vertex with n influences is within
+about (n + 1) * QUANTIZE_MAX_ERROR. 'max_error' records the largest difference between the saved weights
+and the weights loadSkinData returns, measured on write.
+"""
+import hashlib
+import json
+import lzma
+import os
+import pickle
+import struct
+import zlib
+
+import numpy as np
+
+from . import weightMath
+
+MAGIC = b'SKWT'
+HEADER = struct.Struct('<4sH')
+HEADER_V2 = struct.Struct('<4sHHQ')
+ALIGNMENT = 64
+VERSION = 2
+LEGACY_VERSION = 0
+
+# skinData entries written as array sections instead of json metadata
+SECTION_DTYPES = {'components': '<i8',
+                  'positions': '<f8',
+                  'weights_indptr': '<i8',
+                  'weights_indices': '<i4',
+                  'weights_values': '<f8'}
+
+SECTION_ORDER = ('components', 'positions', 'weights_indptr', 'weights_values', 'weights_indices')
+
+# codec name: (quantize values, section compression)
+CODECS = {'raw': (False, None),
+          'zlib': (False, 'zlib'),
+          'lzma': (False, 'lzma'),
+          'uint16': (True, None),
+          'uint16-zlib': (True, 'zlib'),
+          'uint16-lzma': (True, 'lzma')}
+DEFAULT_CODEC = 'raw'
+
+QUANTIZED_DTYPE = '<u2'
+QUANTIZE_SCALE = 65535
+QUANTIZE_MAX_ERROR = 0.5 / QUANTIZE_SCALE
+
+COMPRESSORS = {'zlib': lambda: zlib.compressobj(6),
+               'lzma': lambda: lzma.LZMACompressor()}
+DECOMPRESSORS = {'zlib': zlib.decompress,
+                 'lzma': lzma.decompress}
+
+REQUIRED_KEYS = ('partial_path_names', 'full_path_names', 'components')
+
+# metadata describing how a loaded file was stored, recomputed by every save
+FILE_KEYS = ('version', 'data_offset', 'sections', 'codec', 'quantize_scale', 'max_error',
+             'vertex_count', 'influence_count', 'nonzero_count')
+
+# parsed skin data handed over by batch imports, {path: (modified time, skinData)}.
+# consumed by the next loadSkinData of the same unchanged file
+preloadedSkinData = {}
+
+
+def denseToCsr(weights):
+    """
+    :param weights(np.ndarray): (V, I) weight matrix
+    :return: (indptr, indices, values) typed arrays
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    mask = weights != 0
+    indptr = np.zeros(weights.shape[0] + 1, dtype=np.int64)
+    np.cumsum(np.count_nonzero(mask, axis=1), out=indptr[1:])
+    # nonzero walks the matrix row by row, so entries come out in csr order
+    rows, cols = np.nonzero(mask)
+    return indptr, cols.astype(np.int32), weights[rows, cols]
+
+
+def csrToDense(indptr, indices, values, influenceCount):
+    """
+    :param indptr(np.ndarray): row pointers
+    :param indices(np.ndarray): influence index of every entry
+    :param values(np.ndarray): weight of every entry
+    :param influenceCount(int): number of influence columns
+    :return: (V, I) float64 weight matrix
+    """
+    indptr = np.asarray(indptr, dtype=np.int64)
+    vertexCount = indptr.size - 1
+    weights = np.zeros((vertexCount, influenceCount), dtype=np.float64)
+    rows = np.repeat(np.arange(vertexCount), np.diff(indptr))
+    weights[rows, np.asarray(indices, dtype=np.int64)] = values
+    return weights
+
+
+def alignOffset(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def readVersion(fileObj):
+    """
+    detect the file version from the header, the file position is left right after the header
+    :param fileObj: file opened in binary mode
+    :return: version number, LEGACY_VERSION for headerless pickle files
+    """
+    header = fileObj.read(HEADER.size)
+    if len(header) == HEADER.size:
+        magic, version = HEADER.unpack(header)
+        if magic == MAGIC:
+            return version
+    fileObj.seek(0)
+    return LEGACY_VERSION
+
+
+def validateSkinData(skinData):
+    for key in REQUIRED_KEYS:
+        if key not in skinData:
+            raise RuntimeError('Invalid weights files!')
+    return skinData
+
+
+class SkinDataWriter(object):
+    """
+    write a version 2 file one block of vertices at a time, so only the current block is held in memory.
+
+    with the raw codec, components, row pointers and values are written in place and influence indices
+    are spilled to a temporary file that is appended on close. other codecs spill every section and
+    encode them one after another on close. the metadata block is reserved up front and filled in on close.
+
+    with SkinDataWriter(fileName, skinData) as writer:
+        for block in blocks:
+            writer.writeBlock(block)
+    """
+    COPY_CHUNK = 1 << 24
+
+    def __init__(self, fileName, skinData, codec=DEFAULT_CODEC, atomic=False):
+        """
+        :param fileName(str): .wts file path
+        :param skinData(dict): skin data without 'weights', 'components' lists the vertices in write order,
+            optional 'positions' holds their (V, 3) object space points
+        :param codec(str): one of CODECS
+        :param atomic(bool): write next to the file and move it in place on close, a failed write keeps the
+            previous file, readers never see a partial file and memory maps of the old file stay valid
+        """
+        if codec not in CODECS:
+            raise ValueError("Unknown codec {}, expected one of {}".format(codec, sorted(CODECS)))
+        self.fileName = fileName
+        self.writeName = "{}.{}.partial".format(fileName, os.getpid()) if atomic else fileName
+        self.quantize, self.compression = CODECS[codec]
+        self.influenceCount = len(skinData['partial_path_names'])
+        components = np.ascontiguousarray(skinData.get('components', []), dtype=SECTION_DTYPES['components'])
+        self.vertexCount = components.size
+        positions = np.ascontiguousarray(skinData.get('positions', []), dtype=SECTION_DTYPES['positions']).ravel()
+        if positions.size not in (0, self.vertexCount * 3):
+            raise ValueError("Expected {} positions, got {}".format(self.vertexCount, positions.size // 3))
+        self.writtenVertices = 0
+        self.nonzeroCount = 0
+        self.maxError = 0.0
+
+        self.metadata = dict((key, value) for key, value in skinData.items()
+                             if key != 'weights' and key not in SECTION_DTYPES and key not in FILE_KEYS)
+        self.metadata['vertex_count'] = self.vertexCount
+        self.metadata['influence_count'] = self.influenceCount
+        self.metadata['codec'] = codec
+        if self.quantize:
+            self.metadata['quantize_scale'] = QUANTIZE_SCALE
+
+        self.sections = {}
+        for name in SECTION_ORDER:
+            dtype = QUANTIZED_DTYPE if self.quantize and name == 'weights_values' else SECTION_DTYPES[name]
+            self.sections[name] = {'offset': 0, 'dtype': dtype, 'count': 0,
+                                   'compression': self.compression, 'stored_bytes': 0}
+
+        # fixed size sections first, the values offset is known before any weight is written
+        inPlace = () if self.compression else ('components', 'positions', 'weights_indptr', 'weights_values')
+        sizes = {'components': components.nbytes,
+                 'positions': positions.nbytes,
+                 'weights_indptr': (self.vertexCount + 1) * np.dtype(SECTION_DTYPES['weights_indptr']).itemsize}
+        offset = 0
+        for name in inPlace:
+            offset = alignOffset(offset)
+            self.sections[name]['offset'] = offset
+            offset += sizes.get(name, 0)
+
+        # reserve room for the largest metadata the final numbers can produce, json ignores the padding
+        self.metaLength = len(self.encodeMetadata(placeholder=True))
+        self.dataOffset = alignOffset(HEADER_V2.size + self.metaLength)
+
+        dirName = os.path.dirname(fileName)
+        if dirName and not os.path.isdir(dirName):
+            os.makedirs(dirName)
+
+        self.fileObj = open(self.writeName, "wb")
+        self.spills = dict((name, open(self.spillName(name), "wb")) for name in SECTION_ORDER if name not in inPlace)
+        self.fileObj.write(HEADER_V2.pack(MAGIC, VERSION, 0, self.metaLength))
+        self.append('components', components)
+        self.append('positions', positions)
+        self.append('weights_indptr', np.zeros(1))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        if excType is None:
+            try:
+                self.close()
+            except BaseException:
+                self.abort()
+                raise
+        else:
+            self.abort()
+
+    def spillName(self, name):
+        return "{}.{}.tmp".format(self.writeName, name)
+
+    def encodeMetadata(self, placeholder=False):
+        metadata = dict(self.metadata)
+        metadata['nonzero_count'] = self.nonzeroCount
+        metadata['sections'] = self.sections
+        if self.quantize:
+            metadata['max_error'] = self.maxError
+        if placeholder:
+            maxValue = np.iinfo(np.int64).max
+            metadata['nonzero_count'] = maxValue
+            metadata['sections'] = dict((name, dict(section, offset=maxValue, count=maxValue, stored_bytes=maxValue))
+                                        for name, section in self.sections.items())
+            if self.quantize:
+                metadata['max_error'] = -np.finfo(np.float64).max
+        return json.dumps(metadata).encode('utf-8')
+
+    def append(self, name, array):
+        section = self.sections[name]
+        array = np.ascontiguousarray(array, dtype=section['dtype'])
+        if name in self.spills:
+            self.spills[name].write(array.tobytes())
+        else:
+            self.fileObj.seek(self.dataOffset + section['offset'] + section['count'] * array.itemsize)
+            self.fileObj.write(array.tobytes())
+        section['count'] += array.size
+
+    def writeBlock(self, weights):
+        """
+        :param weights(MDoubleArray/np.ndarray): flat or (n, I) weights of the next n vertices
+        """
+        weights = weightMath.asWeightMatrix(weights, self.influenceCount)
+        if self.writtenVertices + weights.shape[0] > self.vertexCount:
+            raise RuntimeError("More vertices written than components stored")
+        indptr, indices, values = denseToCsr(weights)
+        if self.quantize and values.size:
+            quantized = np.rint(np.clip(values, 0.0, 1.0) * QUANTIZE_SCALE)
+            self.maxError = max(self.maxError, float(np.abs(decodedValues(indptr, quantized) - values).max()))
+            values = quantized
+        self.append('weights_indptr', indptr[1:] + self.nonzeroCount)
+        self.append('weights_values', values)
+        self.append('weights_indices', indices)
+        self.writtenVertices += weights.shape[0]
+        self.nonzeroCount += values.size
+
+    def copySpill(self, name, offset):
+        """
+        :return: number of bytes stored in the file
+        """
+        compressor = COMPRESSORS[self.compression]() if self.compression else None
+        storedBytes = 0
+        self.fileObj.seek(self.dataOffset + offset)
+        with open(self.spillName(name), "rb") as spillObj:
+            chunk = spillObj.read(self.COPY_CHUNK)
+            while chunk:
+                if compressor:
+                    chunk = compressor.compress(chunk)
+                self.fileObj.write(chunk)
+                storedBytes += len(chunk)
+                chunk = spillObj.read(self.COPY_CHUNK)
+        if compressor:
+            chunk = compressor.flush()
+            self.fileObj.write(chunk)
+            storedBytes += len(chunk)
+        os.remove(self.spillName(name))
+        return storedBytes
+
+    def close(self):
+        if self.writtenVertices != self.vertexCount:
+            self.abort()
+            raise RuntimeError("Expected weights for {} vertices, got {}".format(self.vertexCount,
+                                                                                 self.writtenVertices))
+        offset = 0
+        for name in SECTION_ORDER:
+            section = self.sections[name]
+            if name not in self.spills:
+                section['stored_bytes'] = section['count'] * np.dtype(section['dtype']).itemsize
+                offset = max(offset, section['offset'] + section['stored_bytes'])
+
+        # spilled sections go after the ones written in place
+        for name in SECTION_ORDER:
+            if name in self.spills:
+                self.spills.pop(name).close()
+                offset = alignOffset(offset)
+                self.sections[name]['offset'] = offset
+                self.sections[name]['stored_bytes'] = self.copySpill(name, offset)
+                offset += self.sections[name]['stored_bytes']
+
+        metaBytes = self.encodeMetadata()
+        self.fileObj.seek(HEADER_V2.size)
+        self.fileObj.write(metaBytes.ljust(self.metaLength))
+        self.fileObj.close()
+        if self.writeName != self.fileName:
+            os.replace(self.writeName, self.fileName)
+
+    def abort(self):
+        for name, spillObj in self.spills.items():
+            spillObj.close()
+            if os.path.exists(self.spillName(name)):
+                os.remove(self.spillName(name))
+        self.spills = {}
+        self.fileObj.close()
+        if os.path.exists(self.writeName):
+            os.remove(self.writeName)
+
+
+def saveSkinData(fileName, skinData, codec=DEFAULT_CODEC, atomic=False):
+    """
+    :param fileName(str): .wts file path
+    :param skinData(dict): skin data, 'weights' is a (V, I) matrix or flat per vertex weights
+    :param codec(str): one of CODECS
+    :param atomic(bool): write next to the file and move it in place once complete,
+        readers never see a partial file and memory maps of the old file stay valid
+    """
+    with SkinDataWriter(fileName, skinData, codec=codec, atomic=atomic) as writer:
+        writer.writeBlock(skinData['weights'])
+
+
+def decodedValues(indptr, quantized, scale=QUANTIZE_SCALE):
+    """
+    scale quantized csr values back and renormalize them per vertex without expanding them,
+    shared by the writer and decodeWeights so 'max_error' is measured on exactly what is loaded
+    :param indptr(np.ndarray): row pointers
+    :param quantized(np.ndarray): values scaled by scale and rounded
+    :param scale(float): the quantize_scale of the file
+    :return: float64 values in csr order
+    """
+    indptr = np.asarray(indptr, dtype=np.int64)
+    rows = np.repeat(np.arange(indptr.size - 1), np.diff(indptr))
+    values = np.asarray(quantized, dtype=np.float64) / scale
+    sums = np.bincount(rows, weights=values, minlength=indptr.size - 1)
+    sums[sums <= 0] = 1.0
+    return values / sums[rows]
+
+
+def decodeWeights(metadata, indptr, indices, values):
+    """
+    expand csr arrays of a version 2 file, quantized values are scaled back and renormalized per vertex
+    :param metadata(dict): metadata returned by readHeader
+    :return: (V, I) float64 weight matrix
+    """
+    scale = metadata.get('quantize_scale')
+    if scale:
+        values = decodedValues(indptr, values, scale)
+    return csrToDense(indptr, indices, values, metadata['influence_count'])
+
+
+def iterWeightBlocks(fileName, blockSize, metadata=None):
+    """
+    decode the weights of a file blockSize vertices at a time,
+    uncompressed version 2 sections are memory mapped so only the current block is expanded in memory,
+    compressed sections are decompressed whole
+    :param fileName(str): .wts file path
+    :param blockSize(int): number of vertices per block
+    :param metadata(dict): metadata returned by readHeader, read from the file when None
+    :return: generator of (start, end, (end - start, I) weight matrix)
+    """
+    if metadata is None:
+        metadata = readHeader(fileName)
+
+    if metadata is None:
+        # older versions have no sections to map, decode everything and slice it
+        skinData = loadSkinData(fileName)
+        weights = weightMath.asWeightMatrix(skinData['weights'], len(skinData['partial_path_names']))
+        for start in range(0, weights.shape[0], blockSize):
+            yield start, min(start + blockSize, weights.shape[0]), weights[start:start + blockSize]
+        return
+
+    indptr = readSection(fileName, metadata, 'weights_indptr')
+    indices = readSection(fileName, metadata, 'weights_indices')
+    values = readSection(fileName, metadata, 'weights_values')
+    vertexCount = metadata['vertex_count']
+    for start in range(0, vertexCount, blockSize):
+        end = min(start + blockSize, vertexCount)
+        rowPointers = np.asarray(indptr[start:end + 1])
+        first, last = rowPointers[0], rowPointers[-1]
+        yield start, end, decodeWeights(metadata, rowPointers - first, indices[first:last], values[first:last])
+
+
+def readHeader(fileName):
+    """
+    read only the fixed header and the json metadata of a version 2 file
+    :param fileName(str): .wts file path
+    :return: metadata dict, 'data_offset' is where the sections start. None for older versions
+    """
+    with open(fileName, "rb") as skinDataFile:
+        header = skinDataFile.read(HEADER_V2.size)
+        if len(header) < HEADER_V2.size:
+            return None
+        magic, version, _, metaLength = HEADER_V2.unpack(header)
+        if magic != MAGIC or version < 2:
+            return None
+        if version > VERSION:
+            raise RuntimeError("Unsupported weights file version {}".format(version))
+        metadata = json.loads(skinDataFile.read(metaLength).decode('utf-8'))
+    metadata['version'] = version
+    metadata['data_offset'] = alignOffset(HEADER_V2.size + metaLength)
+    return metadata
+
+
+def readSection(fileName, metadata, name, mmap=True):
+    """
+    :param fileName(str): .wts file path
+    :param metadata(dict): metadata returned by readHeader
+    :param name(str): section name
+    :param mmap(bool): memory map the section instead of reading it into memory, ignored when compressed
+    :return: 1d numpy array, read only when memory mapped or decompressed
+    """
+    section = metadata['sections'][name]
+    dtype = np.dtype(section['dtype'])
+    offset = metadata['data_offset'] + section['offset']
+    if not section['count']:
+        return np.empty(0, dtype=dtype)
+    if section.get('compression'):
+        with open(fileName, "rb") as skinDataFile:
+            skinDataFile.seek(offset)
+            data = DECOMPRESSORS[section['compression']](skinDataFile.read(section['stored_bytes']))
+        return np.frombuffer(data, dtype=dtype, count=section['count'])
+    if mmap:
+        return np.memmap(fileName, dtype=dtype, mode='r', offset=offset, shape=(section['count'],))
+    with open(fileName, "rb") as skinDataFile:
+        skinDataFile.seek(offset)
+        return np.fromfile(skinDataFile, dtype=dtype, count=section['count'])
+
+
+def querySkinData(fileName):
+    """
+    influences and metadata without decoding any weights, only version 2 files skip the weights
+    :param fileName(str): .wts file path
+    :return: skin data dict without 'weights'
+    """
+    if not os.path.exists(fileName):
+        raise IOError("File not found!")
+
+    metadata = readHeader(fileName)
+    if metadata is None:
+        skinData = loadSkinData(fileName)
+        skinData.pop('weights')
+        return skinData
+    return metadata
+
+
+def queryFileInfo(fileName):
+    """
+    summary of a weights file. version 2 files only read the header and metadata,
+    older versions are decoded to count their weights
+    :param fileName(str): .wts file path
+    :return: dict with version, codec, vertex_count, influence_count, nonzero_count,
+        topology_fingerprint (None when not stored), baseline_file (None unless a delta) and file_bytes
+    """
+    if not os.path.exists(fileName):
+        raise IOError("File not found!")
+
+    metadata = readHeader(fileName)
+    if metadata is None:
+        skinData = loadSkinData(fileName)
+        weights = skinData['weights']
+        influenceCount = len(skinData['partial_path_names'])
+        metadata = {'version': skinData['version'],
+                    'codec': None,
+                    'vertex_count': weights.size // influenceCount if influenceCount else 0,
+                    'influence_count': influenceCount,
+                    'nonzero_count': int(np.count_nonzero(weights))}
+
+    return {'version': metadata['version'],
+            'codec': metadata.get('codec', DEFAULT_CODEC),
+            'vertex_count': metadata['vertex_count'],
+            'influence_count': metadata['influence_count'],
+            'nonzero_count': metadata.get('nonzero_count'),
+            'topology_fingerprint': metadata.get('topology_fingerprint'),
+            'baseline_file': metadata.get('baseline_file'),
+            'file_bytes': os.path.getsize(fileName)}
+
+
+def preloadKey(fileName):
+    return os.path.normcase(os.path.abspath(fileName))
+
+
+def preloadSkinData(fileName):
+    """
+    parse a file ahead of time, safe to call from worker threads
+    :param fileName(str): .wts file path
+    """
+    modifiedTime = os.path.getmtime(fileName)
+    preloadedSkinData[preloadKey(fileName)] = (modifiedTime, loadSkinData(fileName, mmap=False))
+
+
+def discardPreloadedSkinData(fileName):
+    """
+    drop the preloaded data of a file whether or not a load consumed it, an import that fails before
+    loading would otherwise keep the decoded weights for the rest of the session
+    :param fileName(str): .wts file path
+    """
+    preloadedSkinData.pop(preloadKey(fileName), None)
+
+
+def fileHash(fileName, chunkSize=1 << 24):
+    """
+    :param fileName(str): file path
+    :return: hex digest of the file content
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(fileName, "rb") as fileObj:
+        chunk = fileObj.read(chunkSize)
+        while chunk:
+            digest.update(chunk)
+            chunk = fileObj.read(chunkSize)
+    return digest.hexdigest()
+
+
+def arrayDigest(*arrays):
+    """
+    :param arrays(np.ndarray): arrays hashed one after another, e.g. the points a cached result was built from
+    :return: hex digest of their raw buffers
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for array in arrays:
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()
+
+
+def topologyFingerprint(faceCounts, faceConnects):
+    """
+    :param faceCounts(MIntArray/np.ndarray): vertex count of every face, see MFnMesh.getVertices
+    :param faceConnects(MIntArray/np.ndarray): vertex ids of every face, face after face
+    :return: hex digest of the connectivity, equal for meshes with the same topology
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(np.ascontiguousarray(faceCounts, dtype='<i4').tobytes())
+    digest.update(np.ascontiguousarray(faceConnects, dtype='<i4').tobytes())
+    return digest.hexdigest()
+
+
+def contentHash(skinData):
+    """
+    hash of everything an export writes: influences, components, positions, weights and topology fingerprint
+    :param skinData(dict): skin data, see saveSkinData
+    :return: hex digest
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    names = [list(skinData['partial_path_names']), list(skinData.get('full_path_names', []))]
+    digest.update(json.dumps(names).encode('utf-8'))
+    digest.update(str(skinData.get('topology_fingerprint')).encode('utf-8'))
+    digest.update(np.ascontiguousarray(skinData['components'], dtype=SECTION_DTYPES['components']).tobytes())
+    digest.update(np.ascontiguousarray(skinData.get('positions', []), dtype=SECTION_DTYPES['positions']).tobytes())
+    digest.update(np.ascontiguousarray(skinData['weights'], dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+def manifestName(fileName):
+    return fileName + ".manifest"
+
+
+def readManifest(fileName):
+    """
+    :param fileName(str): .wts file path
+    :return: manifest dict written by writeManifest, None when missing, unreadable
+        or when the .wts file was written since, by any export
+    """
+    try:
+        with open(manifestName(fileName), "r") as manifestFile:
+            manifest = json.load(manifestFile)
+        stat = os.stat(fileName)
+        if (stat.st_size, stat.st_mtime_ns) != (manifest.get('file_bytes'), manifest.get('file_mtime_ns')):
+            return None
+    except (IOError, OSError, ValueError):
+        return None
+    return manifest
+
+
+def writeManifest(fileName, skinData, digest=None):
+    """
+    write the sidecar manifest of a saved .wts file, exports compare against it to skip unchanged weights
+    :param fileName(str): .wts file path, already saved
+    :param skinData(dict): the saved skin data
+    :param digest(str): contentHash of the skin data, computed when not provided
+    :return: manifest dict
+    """
+    manifest = {'content_hash': digest or contentHash(skinData),
+                'influences': list(skinData['partial_path_names']),
+                'topology_fingerprint': skinData.get('topology_fingerprint'),
+                'vertex_count': len(skinData['components']),
+                'file_bytes': os.stat(fileName).st_size,
+                'file_mtime_ns': os.stat(fileName).st_mtime_ns}
+    tempName = "{}.{}.partial".format(manifestName(fileName), os.getpid())
+    with open(tempName, "w") as manifestFile:
+        json.dump(manifest, manifestFile, indent=2)
+    os.replace(tempName, manifestName(fileName))
+    return manifest
+
+
+def isDelta(skinData):
+    return 'baseline_hash' in skinData
+
+
+def applyDelta(baseline, delta):
+    """
+    :param baseline(dict): full skin data
+    :param delta(dict): decoded delta skin data
+    :return: full skin data in the influence order of the delta
+    """
+    influences = delta['partial_path_names']
+    baseWeights = weightMath.asWeightMatrix(baseline['weights'], len(baseline['partial_path_names']))
+    mapping = weightMath.influenceMapping(baseline['partial_path_names'], influences)
+    weights = weightMath.remapWeights(baseWeights, mapping, len(influences))
+
+    # rows of the changed vertices in the baseline
+    baseComponents = np.asarray(baseline['components'])
+    deltaComponents = np.asarray(delta['components'])
+    order = np.argsort(baseComponents, kind='stable')
+    positions = np.searchsorted(baseComponents[order], deltaComponents)
+    positions = np.minimum(positions, max(baseComponents.size - 1, 0))
+    if deltaComponents.size and (not baseComponents.size or
+                                 np.any(baseComponents[order][positions] != deltaComponents)):
+        raise RuntimeError("Delta holds vertices that are not in its baseline")
+    rows = order[positions]
+    weights[rows] = weightMath.asWeightMatrix(delta['weights'], len(influences))
+
+    skinData = dict(baseline)
+    skinData.update((key, value) for key, value in delta.items()
+                    if key not in ('components', 'weights', 'sections', 'data_offset', 'vertex_count',
+                                   'nonzero_count', 'baseline_hash', 'baseline_file'))
+    skinData['weights'] = weights.ravel()
+    skinData['vertex_count'] = weights.shape[0]
+    skinData['nonzero_count'] = int(np.count_nonzero(weights))
+    # rows come from both files, the error bound is the larger one
+    maxError = max(baseline.get('max_error') or 0.0, delta.get('max_error') or 0.0)
+    if maxError:
+        skinData['max_error'] = maxError
+    return skinData
+
+
+def applyDeltas(baselineFileName, deltaFileNames):
+    """
+    apply a chain of deltas in order, every delta has to be diffed against the file before it
+    :param baselineFileName(str): full .wts file, or a delta that resolves to one
+    :param deltaFileNames(list): delta .wts files
+    :return: full skin data
+    """
+    skinData = loadSkinData(baselineFileName)
+    previousFileName = baselineFileName
+    for deltaFileName in deltaFileNames:
+        delta = loadSkinData(deltaFileName, resolveDelta=False)
+        if not isDelta(delta):
+            raise RuntimeError("{} is not a delta weights file".format(deltaFileName))
+        if delta['baseline_hash'] != fileHash(previousFileName):
+            raise RuntimeError("{} was not saved against {}".format(deltaFileName, previousFileName))
+        skinData = applyDelta(skinData, delta)
+        previousFileName = deltaFileName
+    return skinData
+
+
+def baselinePath(fileName, delta):
+    """
+    :param fileName(str): delta .wts file path
+    :param delta(dict): metadata or skin data of the delta
+    :return: absolute path of the file the delta was saved against
+    """
+    return os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(fileName)), delta['baseline_file']))
+
+
+def applyBaseline(fileName, delta):
+    baselineFileName = baselinePath(fileName, delta)
+    if not os.path.exists(baselineFileName):
+        raise IOError("Baseline {} of delta {} not found!".format(baselineFileName, fileName))
+    if fileHash(baselineFileName) != delta['baseline_hash']:
+        raise RuntimeError("Baseline {} changed since delta {} was saved".format(baselineFileName, fileName))
+    return applyDelta(loadSkinData(baselineFileName), delta)
+
+
+def saveDeltaSkinData(fileName, skinData, baselineFileName, codec=DEFAULT_CODEC, epsilon=0.0, atomic=False):
+    """
+    save only the vertices whose weights differ from the baseline file
+    :param fileName(str): delta .wts file path
+    :param skinData(dict): full skin data, see saveSkinData
+    :param baselineFileName(str): .wts file to diff against, may be a delta itself
+    :param codec(str): one of CODECS
+    :param epsilon(float): weight differences up to this value are ignored, never less than the 'max_error'
+        of a quantized baseline, its rounding is not a change
+    :param atomic(bool): see saveSkinData
+    :return: number of changed vertices written
+    """
+    baseline = loadSkinData(baselineFileName)
+    influences = skinData['partial_path_names']
+    weights = weightMath.asWeightMatrix(skinData['weights'], len(influences))
+    baseWeights = weightMath.asWeightMatrix(baseline['weights'], len(baseline['partial_path_names']))
+    if baseWeights.shape[0] != weights.shape[0] or \
+            not np.array_equal(np.asarray(baseline['components']), np.asarray(skinData['components'])):
+        raise RuntimeError("Mismatched topologies: baseline vertices do not match the skin data vertices")
+
+    mapping = weightMath.influenceMapping(baseline['partial_path_names'], influences)
+    baseWeights = weightMath.remapWeights(baseWeights, mapping, len(influences))
+    rows = weightMath.changedRows(baseWeights, weights, epsilon=max(epsilon, baseline.get('max_error') or 0.0))
+
+    delta = dict((key, value) for key, value in skinData.items() if key not in ('weights', 'positions'))
+    delta['components'] = np.asarray(skinData['components'])[rows]
+    delta['weights'] = weights[rows]
+    delta['baseline_hash'] = fileHash(baselineFileName)
+    delta['baseline_file'] = os.path.relpath(os.path.abspath(baselineFileName),
+                                             os.path.dirname(os.path.abspath(fileName)))
+    saveSkinData(fileName, delta, codec=codec, atomic=atomic)
+    return int(rows.size)
+
+
+def loadSkinData(fileName, mmap=True, resolveDelta=True):
+    """
+    :param fileName(str): .wts file path
+    :param mmap(bool): memory map version 2 sections instead of reading them
+    :param resolveDelta(bool): apply delta files onto their baseline, otherwise return only the changed vertices
+    :return: skin data dict, 'weights' is always a flat contiguous float64 array
+    """
+    if not os.path.exists(fileName):
+        raise IOError("File not found!")
+
+    preloaded = preloadedSkinData.pop(preloadKey(fileName), None)
+    if preloaded and preloaded[0] == os.path.getmtime(fileName):
+        return preloaded[1]
+
+    metadata = readHeader(fileName)
+    if metadata is not None:
+        skinData = metadata
+        skinData['components'] = readSection(fileName, metadata, 'components', mmap=mmap)
+        if metadata['sections'].get('positions', {}).get('count'):
+            skinData['positions'] = readSection(fileName, metadata, 'positions', mmap=mmap).reshape(-1, 3)
+        validateSkinData(skinData)
+        weights = decodeWeights(metadata,
+                                readSection(fileName, metadata, 'weights_indptr', mmap=mmap),
+                                readSection(fileName, metadata, 'weights_indices', mmap=mmap),
+                                readSection(fileName, metadata, 'weights_values', mmap=mmap))
+        skinData['weights'] = weights.ravel()
+        if resolveDelta and isDelta(skinData):
+            return applyBaseline(fileName, skinData)
+        return skinData
+
+    with open(fileName, "rb") as skinDataFile:
+        version = readVersion(skinDataFile)
+        if version > VERSION:
+            raise RuntimeError("Unsupported weights file version {}".format(version))
+        skinData = pickle.load(skinDataFile)
+
+    validateSkinData(skinData)
+    if version == LEGACY_VERSION:
+        skinData['weights'] = np.asarray(skinData.get('weights', []), dtype=np.float64)
+    else:
+        weights = csrToDense(skinData.pop('weights_indptr'),
+                             skinData.pop('weights_indices'),
+                             skinData.pop('weights_values'),
+                             len(skinData['partial_path_names']))
+        skinData['weights'] = weights.ravel()
+    skinData['version'] = version
+    return skinData
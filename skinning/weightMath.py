@@ -0,0 +1,643 @@
+"""
+Maya-free weight math.
+
+Skin weights coming out of MFnSkinCluster.getWeights are a flat array laid out per vertex:
+(inf1, inf2, inf3, inf4), (inf1, inf2, inf3, inf4)....
+everything in here works on that layout reshaped to a (vertices, influences) numpy matrix,
+so it can be run and profiled outside of maya on synthetic data.
+"""
+import re
+
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    # nearestNeighbours falls back to gridNearestNeighbours
+    cKDTree = None
+
+try:
+    from scipy import sparse
+except ImportError:
+    # neighbourSums falls back to a gather and np.add.reduceat
+    sparse = None
+
+# left/right naming swapped by mirrorName, whole name tokens and words inside names
+SIDE_TOKENS = (('L', 'R'), ('l', 'r'), ('lf', 'rt'), ('Lf', 'Rt'))
+SIDE_WORDS = (('Left', 'Right'), ('left', 'right'), ('LEFT', 'RIGHT'))
+
+
+def asWeightMatrix(weights, influenceCount):
+    """
+    reshape flat weights into a (vertices, influences) matrix
+    :param weights(MDoubleArray/list/np.ndarray): flat per vertex weights
+    :param influenceCount(int): number of influences per vertex
+    :return: float64 array of shape (V, I)
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    if influenceCount <= 0:
+        raise ValueError("influenceCount must be greater than 0")
+    if weights.size % influenceCount:
+        raise ValueError("weights size {} is not a multiple of influence count {}".format(weights.size,
+                                                                                       influenceCount))
+    return weights.reshape(-1, influenceCount)
+
+
+def syntheticWeights(vertexCount, influenceCount, nonzeros, seed=0):
+    """
+    sparse weights for the tests and the benchmarks, every vertex is weighted to nonzeros neighbouring
+    influences around a random joint
+    :param vertexCount(int): number of vertices
+    :param influenceCount(int): number of influences
+    :param nonzeros(int): number of weighted influences per vertex
+    :param seed(int): random seed, the same seed gives the same weights
+    :return: (V, I) float64 weight matrix, every row sums to 1
+    """
+    rng = np.random.default_rng(seed)
+    nonzeros = min(nonzeros, influenceCount)
+    home = rng.integers(0, influenceCount, vertexCount)
+    columns = (home[:, None] + np.arange(nonzeros)) % influenceCount
+    weights = np.zeros((vertexCount, influenceCount), dtype=np.float64)
+    # never 0, every row has exactly nonzeros weights
+    np.put_along_axis(weights, columns, rng.random((vertexCount, nonzeros)) + 0.01, axis=1)
+    return weights / weights.sum(axis=1, keepdims=True)
+
+
+def normalizeRows(weights):
+    """
+    scale every row so it sums to 1, rows that sum to 0 are left untouched
+    :param weights(np.ndarray): (V, I) weight matrix, modified in place
+    :return: the same matrix
+    """
+    sums = weights.sum(axis=1)
+    nonZero = sums > 0
+    weights[nonZero] /= sums[nonZero, None]
+    return weights
+
+
+def normalizeLocked(weights, lockedColumns=None, tolerance=1e-9):
+    """
+    normalize every row to 1 without touching locked influences, the remainder left by the locked
+    weights is distributed over the unlocked influences in proportion to their weights. when they are all 0
+    the remainder goes to the first unlocked influence, spreading it would bind the vertex to every one of them
+    :param weights(np.ndarray): (V, I) weight matrix
+    :param lockedColumns(np.ndarray): bool per influence, None when nothing is locked
+    :param tolerance(float): rows within this distance of 1 are left as they are
+    :return: new (V, I) matrix and a report dict with
+        'rows_adjusted': number of rows changed,
+        'total_adjustment' / 'max_adjustment': summed and largest absolute change of a row sum,
+        'zero_rows': rows without any weight, left as they are,
+        'assigned_rows': rows whose remainder went to the first unlocked influence,
+        'unfixable_rows': rows that cannot sum to 1 without changing a locked weight
+    """
+    weights = np.array(weights, dtype=np.float64)
+    influenceCount = weights.shape[1]
+    locked = np.zeros(influenceCount, dtype=bool) if lockedColumns is None else np.asarray(lockedColumns, dtype=bool)
+    unlocked = ~locked
+
+    sums = weights.sum(axis=1)
+    lockedSums = weights[:, locked].sum(axis=1)
+    unlockedSums = sums - lockedSums
+    remainder = 1.0 - lockedSums
+
+    zeroRows = sums <= 0.0
+    unfixable = ~zeroRows & ((remainder < -tolerance) | ((remainder > tolerance) & (not unlocked.any())))
+    adjust = (np.abs(sums - 1.0) > tolerance) & ~zeroRows & ~unfixable
+
+    scaled = adjust & (unlockedSums > 0.0)
+    if scaled.any():
+        scale = np.clip(remainder[scaled], 0.0, None) / unlockedSums[scaled]
+        weights[np.ix_(scaled, unlocked)] *= scale[:, None]
+    assigned = adjust & (unlockedSums <= 0.0)
+    if assigned.any():
+        weights[assigned, np.argmax(unlocked)] = remainder[assigned]
+
+    change = np.abs(sums[adjust] - 1.0)
+    report = {'rows_adjusted': int(np.count_nonzero(adjust)),
+              'total_adjustment': float(change.sum()),
+              'max_adjustment': float(change.max()) if change.size else 0.0,
+              'zero_rows': int(np.count_nonzero(zeroRows)),
+              'assigned_rows': int(np.count_nonzero(assigned)),
+              'unfixable_rows': int(np.count_nonzero(unfixable))}
+    return weights, report
+
+
+def pruneWeights(weights, maxInfs, minWeight=0.0):
+    """
+    keep the maxInfs largest weights of every vertex, zero the rest
+    and distribute the removed weight (weighted) across the remaining influences
+    :param weights(np.ndarray): (V, I) weight matrix
+    :param maxInfs(int): maximum number of influences per vertex
+    :param minWeight(float): weights below this value are removed as well
+    :return: new pruned and normalized (V, I) matrix
+    """
+    weights = np.array(weights, dtype=np.float64)
+    if weights.ndim != 2:
+        raise ValueError("weights must be a (vertices, influences) matrix")
+    if maxInfs < 1:
+        raise ValueError("maxInfs must be at least 1")
+    vertexCount, influenceCount = weights.shape
+    if not vertexCount:
+        return weights
+
+    if minWeight > 0:
+        # never strip a vertex completely, its largest influence always survives
+        rows = np.arange(vertexCount)
+        largest = weights.argmax(axis=1)
+        keep = weights[rows, largest]
+        weights[weights < minWeight] = 0.0
+        weights[rows, largest] = keep
+
+    dropCount = influenceCount - maxInfs
+    if dropCount > 0:
+        # smallest dropCount influences of every row, order within the partition does not matter
+        dropIds = np.argpartition(weights, dropCount - 1, axis=1)[:, :dropCount]
+        np.put_along_axis(weights, dropIds, 0.0, axis=1)
+
+    return normalizeRows(weights)
+
+
+def influenceCounts(weights, epsilon=1e-6):
+    """
+    :param weights(np.ndarray): (V, I) weight matrix
+    :param epsilon(float): weights at or below this value are not counted
+    :return: int array with the number of influences of every vertex
+    """
+    return np.count_nonzero(weights > epsilon, axis=1)
+
+
+def auditInfluences(weights, maxInfs, epsilon=1e-6, worstCount=10):
+    """
+    find the vertices carrying more than maxInfs influences
+    :param weights(np.ndarray): (V, I) weight matrix
+    :param maxInfs(int): maximum number of influences allowed per vertex
+    :param epsilon(float): weights at or below this value are not counted
+    :param worstCount(int): how many of the worst vertices to report
+    :return: dict with
+        'counts': influence count per vertex,
+        'offending': sorted indices of the vertices above maxInfs,
+        'histogram': histogram[n] is the number of vertices with n influences,
+        'worst': up to worstCount (vertex index, influence count) pairs, worst first
+    """
+    counts = influenceCounts(weights, epsilon)
+    offending = np.flatnonzero(counts > maxInfs)
+    histogram = np.bincount(counts, minlength=weights.shape[1] + 1)
+
+    worst = []
+    if offending.size and worstCount > 0:
+        offendingCounts = counts[offending]
+        # stable sort keeps the lower vertex index first for equal counts
+        order = np.argsort(-offendingCounts, kind='stable')[:worstCount]
+        worst = list(zip(offending[order].tolist(), offendingCounts[order].tolist()))
+
+    return {'counts': counts,
+            'offending': offending,
+            'histogram': histogram,
+            'worst': worst}
+
+
+def influenceUsage(weights, epsilon=0.0):
+    """
+    :param weights(np.ndarray): (V, I) weight matrix
+    :param epsilon(float): weights at or below this value do not count as used
+    :return: weight total and number of weighted vertices of every influence
+    """
+    used = weights > epsilon
+    return np.where(used, weights, 0.0).sum(axis=0), np.count_nonzero(used, axis=0)
+
+
+def unusedInfluences(weights, epsilon=0.0):
+    """
+    :param weights(np.ndarray): (V, I) weight matrix
+    :param epsilon(float): weights at or below this value do not count as used
+    :return: int64 indices of the influences without any weight above epsilon
+    """
+    return np.flatnonzero(~np.any(weights > epsilon, axis=0))
+
+
+def dropInfluences(weights, columns, lockedColumns=None):
+    """
+    zero the weights of influences about to be removed and renormalize the rows that carried any of them,
+    the result matches what the skincluster holds once the columns are gone
+    :param weights(np.ndarray): (V, I) weight matrix
+    :param columns(np.ndarray): indices of the influences to drop
+    :param lockedColumns(np.ndarray): bool per influence, see normalizeLocked
+    :return: new (V, I) matrix with the columns zeroed, int64 indices of the rows that changed
+    """
+    weights = np.array(weights, dtype=np.float64)
+    columns = np.asarray(columns, dtype=np.int64)
+    rows = np.flatnonzero(np.any(weights[:, columns] != 0, axis=1))
+    if rows.size:
+        weights[:, columns] = 0.0
+        weights[rows] = normalizeLocked(weights[rows], lockedColumns)[0]
+    return weights, rows
+
+
+def indexRanges(indices):
+    """
+    collapse indices into contiguous ranges, [0, 1, 2, 5, 7, 8] -> [(0, 2), (5, 5), (7, 8)]
+    :param indices(list/np.ndarray): vertex indices
+    :return: list of inclusive (start, end) tuples
+    """
+    indices = np.unique(np.asarray(indices, dtype=np.int64))
+    if not indices.size:
+        return []
+    breaks = np.flatnonzero(np.diff(indices) != 1)
+    starts = np.concatenate(([indices[0]], indices[breaks + 1]))
+    ends = np.concatenate((indices[breaks], [indices[-1]]))
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+def influenceMapping(sourceInfluences, targetInfluences):
+    """
+    resolve where every source influence column lands in the target influence list
+    :param sourceInfluences(list): influence names the weights were saved with
+    :param targetInfluences(list): influence names of the target skincluster
+    :return: int array, target index of every source influence, -1 when missing from the target
+    """
+    targetIds = dict((name, index) for index, name in enumerate(targetInfluences))
+    return np.array([targetIds.get(name, -1) for name in sourceInfluences], dtype=np.int64)
+
+
+def remapWeights(weights, mapping, targetCount):
+    """
+    move weight columns to their target influence, columns mapped to the same target are summed
+    and columns without a target are dropped
+    :param weights(np.ndarray): (V, S) weight matrix in source influence order
+    :param mapping(np.ndarray): target index of every source column, see influenceMapping
+    :param targetCount(int): number of target influences
+    :return: (V, targetCount) weight matrix
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    mapping = np.asarray(mapping, dtype=np.int64)
+    valid = mapping >= 0
+    targetIds = mapping[valid]
+    remapped = np.zeros((weights.shape[0], targetCount), dtype=np.float64)
+    if np.unique(targetIds).size == targetIds.size:
+        # one to one, a plain column scatter
+        remapped[:, targetIds] = weights[:, valid]
+    else:
+        np.add.at(remapped, (slice(None), targetIds), weights[:, valid])
+    return remapped
+
+
+def gridNearestNeighbours(sourcePoints, targetPoints, k=1, chunkSize=16384):
+    """
+    exact k nearest neighbour search in pure numpy.
+    source points are bucketed in a uniform grid and every target gathers the candidates of the 27 cells around
+    its (clamped) cell at once. a candidate is only certain when it is closer than the nearest face of that
+    block that still has cells beyond it, other targets are searched again with cells twice as large
+    :param sourcePoints(np.ndarray): (S, 3) points
+    :param targetPoints(np.ndarray): (T, 3) points
+    :param k(int): neighbours per target
+    :param chunkSize(int): targets processed together, bounds the memory of the candidate lists
+    :return: (T, k) distances and (T, k) source indices, closest first
+    """
+    sourcePoints = np.asarray(sourcePoints, dtype=np.float64)
+    targetPoints = np.asarray(targetPoints, dtype=np.float64)
+    sourceCount = sourcePoints.shape[0]
+    k = min(k, sourceCount)
+    lower = sourcePoints.min(axis=0)
+    extent = np.maximum(sourcePoints.max(axis=0) - lower, 1e-9)
+    offsets = np.array([(x, y, z) for x in (-1, 0, 1) for y in (-1, 0, 1) for z in (-1, 0, 1)], dtype=np.int64)
+
+    def gridQuery(points, cellSize):
+        cellCounts = (extent // cellSize).astype(np.int64) + 1
+
+        def cellIds(cells):
+            return (cells[:, 0] * cellCounts[1] + cells[:, 1]) * cellCounts[2] + cells[:, 2]
+
+        sourceIds = cellIds(((sourcePoints - lower) // cellSize).astype(np.int64))
+        order = np.argsort(sourceIds, kind='stable')
+        sortedIds = sourceIds[order]
+
+        # (targets * 27) neighbour cells, cells outside the grid hold nothing
+        targetCells = np.clip(np.floor((points - lower) / cellSize).astype(np.int64), 0, cellCounts - 1)
+        cells = (targetCells[:, None, :] + offsets[None, :, :]).reshape(-1, 3)
+        inside = np.all((cells >= 0) & (cells < cellCounts), axis=1)
+        ids = cellIds(np.clip(cells, 0, cellCounts - 1))
+        starts = np.searchsorted(sortedIds, ids, side='left')
+        ends = np.where(inside, np.searchsorted(sortedIds, ids, side='right'), starts)
+        lengths = ends - starts
+
+        # flatten the variable length candidate ranges
+        owners = np.repeat(np.arange(ids.size) // offsets.shape[0], lengths)
+        positions = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        candidates = order[np.repeat(starts, lengths) + positions]
+        candidateDistances = np.linalg.norm(sourcePoints[candidates] - points[owners], axis=1)
+
+        # closest k candidates per target. owners are already grouped, so one sort on
+        # owner + distance scaled below 1 orders every group by distance
+        scale = 0.5 / (candidateDistances.max() + 1.0) if candidateDistances.size else 1.0
+        sortOrder = np.argsort(owners + candidateDistances * scale)
+        owners, candidates = owners[sortOrder], candidates[sortOrder]
+        candidateDistances = candidateDistances[sortOrder]
+        counts = np.bincount(owners, minlength=points.shape[0])
+        firsts = np.cumsum(counts) - counts
+        distances = np.full((points.shape[0], k), np.inf)
+        indices = np.zeros((points.shape[0], k), dtype=np.int64)
+        for neighbour in range(k):
+            found = counts > neighbour
+            distances[found, neighbour] = candidateDistances[firsts[found] + neighbour]
+            indices[found, neighbour] = candidates[firsts[found] + neighbour]
+
+        # a source behind a block face is at least as far as that face along its axis, and at least as far
+        # as the source bounding box along the other axes
+        lowFaces = np.where(targetCells > 0, points - lower - (targetCells - 1) * cellSize, np.inf)
+        highFaces = np.where(targetCells < cellCounts - 2, lower + (targetCells + 2) * cellSize - points, np.inf)
+        outside = np.maximum(lower - points, 0.0) + np.maximum(points - lower - extent, 0.0)
+        otherAxes = (outside ** 2).sum(axis=1, keepdims=True) - outside ** 2
+        radius = np.sqrt(np.minimum(lowFaces, highFaces) ** 2 + otherAxes).min(axis=1)
+        return distances, indices, radius
+
+    distances = np.empty((targetPoints.shape[0], k), dtype=np.float64)
+    indices = np.empty((targetPoints.shape[0], k), dtype=np.int64)
+    # mesh points lie on a surface, size the cells so a few points fall in every cell of the bounding box area,
+    # targets that need a larger search are picked up by the doubling below
+    area = 2.0 * (extent[0] * extent[1] + extent[1] * extent[2] + extent[0] * extent[2])
+    startCellSize = max(float(np.sqrt(area * k / sourceCount)), float(extent.max()) * 1e-6)
+    for chunkStart in range(0, targetPoints.shape[0], chunkSize):
+        pending = np.arange(chunkStart, min(chunkStart + chunkSize, targetPoints.shape[0]))
+        cellSize = startCellSize
+        while pending.size:
+            pendingDistances, pendingIndices, radius = gridQuery(targetPoints[pending], cellSize)
+            resolved = pendingDistances[:, -1] <= radius
+            distances[pending[resolved]] = pendingDistances[resolved]
+            indices[pending[resolved]] = pendingIndices[resolved]
+            pending = pending[~resolved]
+            cellSize *= 2.0
+    return distances, indices
+
+
+def nearestNeighbours(sourcePoints, targetPoints, k=1):
+    """
+    :param sourcePoints(np.ndarray): (S, 3) points
+    :param targetPoints(np.ndarray): (T, 3) points
+    :param k(int): neighbours per target
+    :return: (T, k) distances and (T, k) source indices, closest first
+    """
+    if cKDTree is None:
+        return gridNearestNeighbours(sourcePoints, targetPoints, k=k)
+    k = min(k, len(sourcePoints))
+    distances, indices = cKDTree(sourcePoints).query(targetPoints, k=k)
+    return distances.reshape(-1, k), indices.reshape(-1, k)
+
+
+def transferTable(sourcePoints, targetPoints, k=1, power=2.0):
+    """
+    closest source vertices and blend factors of every target, one batched neighbour query for all targets.
+    with k > 1 the k nearest source vertices are blended by inverse distance
+    :param sourcePoints(np.ndarray): (S, 3) points the weights were saved with
+    :param targetPoints(np.ndarray): (T, 3) points to transfer onto
+    :param k(int): number of source vertices blended per target
+    :param power(float): inverse distance exponent
+    :return: (T, k) source indices, (T, k) blend factors summing to 1 per target
+    """
+    distances, indices = nearestNeighbours(sourcePoints, targetPoints, k=k)
+    if indices.shape[1] == 1:
+        return indices, np.ones(indices.shape, dtype=np.float64)
+
+    # an exact hit takes the whole contribution
+    blend = 1.0 / np.maximum(distances, 1e-12) ** power
+    exact = distances <= 1e-12
+    hasExact = exact.any(axis=1)
+    blend[hasExact] = exact[hasExact]
+    blend /= blend.sum(axis=1, keepdims=True)
+    return indices, blend
+
+
+def applyTransferTable(sourceWeights, indices, blend, chunkSize=65536):
+    """
+    :param sourceWeights(np.ndarray): (S, I) weight matrix
+    :param indices(np.ndarray): (T, k) source indices, see transferTable
+    :param blend(np.ndarray): (T, k) blend factors, see transferTable
+    :param chunkSize(int): targets blended together, bounds the (chunk, k, I) gather
+    :return: (T, I) normalized weight matrix
+    """
+    sourceWeights = np.asarray(sourceWeights, dtype=np.float64)
+    if indices.shape[1] == 1:
+        return normalizeRows(sourceWeights[indices[:, 0]])
+
+    weights = np.empty((indices.shape[0], sourceWeights.shape[1]), dtype=np.float64)
+    for start in range(0, indices.shape[0], chunkSize):
+        end = start + chunkSize
+        weights[start:end] = np.einsum('tk,tki->ti', blend[start:end], sourceWeights[indices[start:end]])
+    return normalizeRows(weights)
+
+
+def transferWeights(sourcePoints, sourceWeights, targetPoints, k=1, power=2.0, chunkSize=65536):
+    """
+    closest point weight transfer between different topologies, see transferTable
+    :param sourcePoints(np.ndarray): (S, 3) points the weights were saved with
+    :param sourceWeights(np.ndarray): (S, I) weight matrix
+    :param targetPoints(np.ndarray): (T, 3) points to transfer onto
+    :return: (T, I) normalized weight matrix
+    """
+    indices, blend = transferTable(sourcePoints, targetPoints, k=k, power=power)
+    return applyTransferTable(sourceWeights, indices, blend, chunkSize=chunkSize)
+
+
+def faceEdges(faceCounts, faceConnects):
+    """
+    unique edges of a polygon mesh from its face vertex lists, see MFnMesh.getVertices
+    :param faceCounts(np.ndarray): vertex count of every face
+    :param faceConnects(np.ndarray): vertex ids of every face, face after face
+    :return: (E, 2) int64 array, smaller vertex id first
+    """
+    faceCounts = np.asarray(faceCounts, dtype=np.int64)
+    faceConnects = np.asarray(faceConnects, dtype=np.int64)
+    if not faceConnects.size:
+        return np.zeros((0, 2), dtype=np.int64)
+    # every face vertex connects to the next one, the last one of a face wraps around to the first
+    faceStarts = np.repeat(np.cumsum(faceCounts) - faceCounts, faceCounts)
+    positions = np.arange(faceConnects.size)
+    nextPositions = positions + 1
+    faceEnds = np.cumsum(faceCounts) - 1
+    nextPositions[faceEnds] = faceStarts[faceEnds]
+    edges = np.stack((faceConnects, faceConnects[nextPositions]), axis=1)
+    edges.sort(axis=1)
+    return np.unique(edges, axis=0)
+
+
+def vertexAdjacency(edges, vertexCount):
+    """
+    :param edges(np.ndarray): (E, 2) vertex id pairs
+    :param vertexCount(int): number of vertices
+    :return: (indptr, indices) csr neighbour lists, neighbours of v are indices[indptr[v]:indptr[v + 1]]
+    """
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    sources = np.concatenate((edges[:, 0], edges[:, 1]))
+    targets = np.concatenate((edges[:, 1], edges[:, 0]))
+    order = np.argsort(sources, kind='stable')
+    indptr = np.zeros(vertexCount + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=vertexCount), out=indptr[1:])
+    return indptr, targets[order]
+
+
+def neighbourSums(weights, indptr, indices, rows=None):
+    """
+    sum of the neighbour weight rows of every vertex, a sparse adjacency matrix times the weight matrix
+    :param weights(np.ndarray): (V, I) weight matrix
+    :param indptr(np.ndarray): see vertexAdjacency
+    :param indices(np.ndarray): see vertexAdjacency
+    :param rows(np.ndarray): vertices to sum for, all when None
+    :return: (len(rows), I) sums and the neighbour count of every row
+    """
+    vertexCount = len(indptr) - 1
+    if rows is not None:
+        # csr of the requested rows only
+        rows = np.asarray(rows, dtype=np.int64)
+        counts = indptr[rows + 1] - indptr[rows]
+        starts = np.repeat(indptr[rows] - np.cumsum(counts) + counts, counts)
+        indices = indices[starts + np.arange(counts.sum())]
+        indptr = np.concatenate(([0], np.cumsum(counts)))
+    counts = np.diff(indptr)
+
+    if sparse is not None:
+        adjacency = sparse.csr_matrix((np.ones(indices.size), indices, indptr), shape=(counts.size, vertexCount))
+        return np.asarray(adjacency @ weights), counts
+
+    # a trailing zero row keeps reduceat in range for vertices without neighbours
+    gathered = np.concatenate((weights[indices], np.zeros((1, weights.shape[1]))))
+    sums = np.add.reduceat(gathered, indptr[:-1], axis=0)
+    sums[counts == 0] = 0.0
+    return sums, counts
+
+
+def smoothWeights(weights, indptr, indices, iterations=1, strength=0.5, rows=None, lockedColumns=None):
+    """
+    laplacian smoothing, every iteration blends each vertex towards the mean of its neighbours
+    :param weights(np.ndarray): (V, I) weight matrix of the whole mesh
+    :param indptr(np.ndarray): see vertexAdjacency
+    :param indices(np.ndarray): see vertexAdjacency
+    :param iterations(int): number of smoothing passes
+    :param strength(float): 0 keeps the weights, 1 replaces them with the neighbour mean
+    :param rows(np.ndarray): vertices to smooth, all when None. the others only act as neighbours
+    :param lockedColumns(np.ndarray): bool per influence, locked weights are kept and
+        the unlocked ones are renormalized to fill the rest of every row
+    :return: new (V, I) weight matrix
+    """
+    weights = np.array(weights, dtype=np.float64)
+    rows = np.arange(weights.shape[0]) if rows is None else np.asarray(rows, dtype=np.int64)
+    unlocked = slice(None) if lockedColumns is None else ~np.asarray(lockedColumns, dtype=bool)
+    if not rows.size:
+        return weights
+
+    for _ in range(iterations):
+        sums, counts = neighbourSums(weights, indptr, indices, rows=rows)
+        current = weights[rows]
+        hasNeighbours = counts > 0
+        smoothed = current.copy()
+        smoothed[hasNeighbours] += strength * (sums[hasNeighbours] / counts[hasNeighbours, None] -
+                                               current[hasNeighbours])
+        if lockedColumns is None:
+            normalizeRows(smoothed)
+        else:
+            # locked weights stay, unlocked weights share what is left of the row
+            smoothed[:, ~unlocked] = current[:, ~unlocked]
+            available = 1.0 - current[:, ~unlocked].sum(axis=1)
+            unlockedSums = smoothed[:, unlocked].sum(axis=1)
+            scalable = unlockedSums > 0
+            scale = np.ones(len(rows))
+            scale[scalable] = np.clip(available[scalable], 0.0, None) / unlockedSums[scalable]
+            smoothed[:, unlocked] *= scale[:, None]
+        weights[rows] = smoothed
+    return weights
+
+
+def mirrorName(name, tokens=SIDE_TOKENS, words=SIDE_WORDS):
+    """
+    swap the side of a name, L_arm -> R_arm, arm_l -> arm_r, leftArm -> rightArm, ns:L_arm -> ns:R_arm
+    :param name(str): influence name
+    :param tokens(tuple): (left, right) pairs swapped when they are a whole '_', ':' or '|' separated part
+    :param words(tuple): (left, right) pairs swapped anywhere in a part that has no side token
+    :return: mirrored name, the name itself when it has no side
+    """
+    swapTokens = dict(tokens)
+    swapTokens.update((right, left) for left, right in tokens)
+    swapWords = dict(words)
+    swapWords.update((right, left) for left, right in words)
+    wordPattern = re.compile('|'.join(re.escape(word) for word in sorted(swapWords, key=len, reverse=True)))
+
+    parts = re.split(r'([_:|])', name)
+    if any(part in swapTokens for part in parts):
+        return ''.join(swapTokens.get(part, part) for part in parts)
+    return wordPattern.sub(lambda match: swapWords[match.group(0)], name)
+
+
+def sidePermutation(influences, tokens=SIDE_TOKENS, words=SIDE_WORDS):
+    """
+    :param influences(list): influence names
+    :return: int64 array, index of the mirrored influence of every influence, itself when it has none
+    """
+    indices = dict((name, index) for index, name in enumerate(influences))
+    return np.array([indices.get(mirrorName(name, tokens, words), index) for index, name in enumerate(influences)],
+                    dtype=np.int64)
+
+
+def symmetryMap(points, axis=0, tolerance=1e-3):
+    """
+    mirrored vertex of every vertex, one nearest neighbour query of the points mirrored across the axis
+    :param points(np.ndarray): (V, 3) object space points
+    :param axis(int): 0, 1 or 2, the mirror plane is at 0 on this axis
+    :param tolerance(float): maximum distance between a mirrored point and its match
+    :return: int64 array, mirrored vertex index, -1 when nothing is within tolerance
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    mirrored = points.copy()
+    mirrored[:, axis] *= -1.0
+    if not len(points):
+        return np.zeros(0, dtype=np.int64)
+    distances, indices = nearestNeighbours(points, mirrored, k=1)
+    symmetry = indices[:, 0].astype(np.int64)
+    symmetry[distances[:, 0] > tolerance] = -1
+    return symmetry
+
+
+def mirrorWeights(weights, symmetry, permutation, rows):
+    """
+    copy the weights of the mirrored vertices onto rows, with every influence swapped to its other side
+    :param weights(np.ndarray): (V, I) weight matrix
+    :param symmetry(np.ndarray): see symmetryMap
+    :param permutation(np.ndarray): see sidePermutation
+    :param rows(np.ndarray): vertices to write, rows without a mirrored vertex are left as they are
+    :return: new (V, I) weight matrix
+    """
+    weights = np.array(weights, dtype=np.float64)
+    rows = np.asarray(rows, dtype=np.int64)
+    rows = rows[symmetry[rows] >= 0]
+    mirrored = np.zeros((rows.size, weights.shape[1]), dtype=np.float64)
+    # column j of the source lands on the column of its mirrored influence, summed if two share one
+    np.add.at(mirrored, (slice(None), permutation), weights[symmetry[rows]])
+    weights[rows] = mirrored
+    return weights
+
+
+def changedRows(baseWeights, weights, epsilon=0.0):
+    """
+    :param baseWeights(np.ndarray): (V, I) weights to compare against
+    :param weights(np.ndarray): (V, I) weights
+    :param epsilon(float): differences up to this value are ignored
+    :return: int64 array of the rows that differ
+    """
+    return np.flatnonzero(np.any(np.abs(weights - baseWeights) > epsilon, axis=1))
+
+
+def undoSnapshot(oldWeights, newWeights):
+    """
+    the part of oldWeights needed to undo setting newWeights, as csr arrays over the changed rows only.
+    inside a changed row every influence that is nonzero before or after is kept, a normalizing
+    setWeights may rescale any of them. influences that are zero before and after stay zero
+    :param oldWeights(np.ndarray): (V, I) weights before the edit
+    :param newWeights(np.ndarray): (V, I) weights that were set
+    :return: (changed row indices, indptr, influence indices, old values)
+    """
+    oldWeights = np.asarray(oldWeights, dtype=np.float64)
+    newWeights = np.asarray(newWeights, dtype=np.float64)
+    rows = np.flatnonzero(np.any(oldWeights != newWeights, axis=1))
+    oldRows = oldWeights[rows]
+    mask = (oldRows != 0) | (newWeights[rows] != 0)
+    indptr = np.zeros(rows.size + 1, dtype=np.int64)
+    np.cumsum(np.count_nonzero(mask, axis=1), out=indptr[1:])
+    rowIds, columns = np.nonzero(mask)
+    return rows, indptr, columns.astype(np.int32), oldRows[rowIds, columns]
@@ -0,0 +1,387 @@
+"""
+Maya-free operations on skin data dicts, as returned by weightFile.loadSkinData.
+
+the maya plug-in and the offline tools (weightCli) share these, every operation returns a new
+skin data dict with a (V, I) 'weights' matrix and leaves its input untouched.
+"""
+import re
+
+import numpy as np
+
+from . import weightFile
+from . import weightMath
+
+# rows whose sum is further than this from 1 are reported as not normalized
+NORMALIZE_TOLERANCE = 1e-4
+
+
+def syntheticSkinData(vertexCount, influenceCount, nonzeros, seed=0, positions=True):
+    """
+    skin data of a made up mesh for the tests and the benchmarks, see weightMath.syntheticWeights
+    :param positions(bool): add random (V, 3) points
+    :return: skin data dict, see weightFile.saveSkinData
+    """
+    influences = ['joint{}'.format(index) for index in range(influenceCount)]
+    skinData = {'partial_path_names': influences,
+                'full_path_names': ['|root|' + name for name in influences],
+                'components': np.arange(vertexCount),
+                'topology_vertex_count': vertexCount,
+                'weights': weightMath.syntheticWeights(vertexCount, influenceCount, nonzeros, seed=seed)}
+    if positions:
+        skinData['positions'] = np.random.default_rng(seed).random((vertexCount, 3))
+    return skinData
+
+
+def weightMatrix(skinData):
+    return weightMath.asWeightMatrix(skinData['weights'], len(skinData['partial_path_names']))
+
+
+def withWeights(skinData, weights, influences=None):
+    result = dict(skinData)
+    result['weights'] = weights
+    if influences is not None:
+        result['partial_path_names'] = list(influences)
+    return result
+
+
+class RenameRules(object):
+    """
+    ordered influence rename rules, compiled once and applied in turn to every name.
+    a rule is a (pattern, replacement) regex pair or a (name, newName, True) exact rule,
+    which only renames names equal to name. results are cached per name.
+
+    rules = RenameRules([('^L_', 'left_'), ('spine_01', 'spine1', True)])
+    rules.rename('L_arm')  # 'left_arm'
+    """
+
+    def __init__(self, rules=()):
+        self.rules = []
+        self.cache = {}
+        for rule in rules:
+            self.add(*rule)
+
+    def __bool__(self):
+        return bool(self.rules)
+
+    __nonzero__ = __bool__
+
+    def add(self, pattern, replacement, exact=False):
+        if exact:
+            self.rules.append((None, {pattern: replacement}))
+        else:
+            self.rules.append((re.compile(pattern), replacement))
+        self.cache.clear()
+
+    def rename(self, name):
+        renamed = self.cache.get(name)
+        if renamed is None:
+            renamed = name
+            for pattern, replacement in self.rules:
+                if pattern is None:
+                    renamed = replacement.get(renamed, renamed)
+                else:
+                    renamed = pattern.sub(replacement, renamed)
+            self.cache[name] = renamed
+        return renamed
+
+    def renameAll(self, names):
+        return [self.rename(name) for name in names]
+
+
+def compileRules(rules):
+    """
+    :param rules(RenameRules/list): compiled rules or rule tuples, see RenameRules
+    :return: RenameRules
+    """
+    if isinstance(rules, RenameRules):
+        return rules
+    return RenameRules(rules or ())
+
+
+def renameInfluence(influence, rules):
+    """
+    :param influence(str): influence name
+    :param rules(RenameRules/list): ordered rules, see RenameRules
+    :return: renamed influence
+    """
+    return compileRules(rules).rename(influence)
+
+
+class HierarchyIndex(object):
+    """
+    in-memory snapshot of the scene transforms, answers the objExists and joint type
+    questions of influence resolution without a maya round-trip per name
+    """
+
+    def __init__(self, longNames, jointNames=()):
+        """
+        :param longNames(list): long names of every transform, joints included
+        :param jointNames(list): long names of the joints
+        """
+        self.joints = set(jointNames)
+        # leaf name: long names ending in it
+        self.leaves = {}
+        for longName in longNames:
+            self.leaves.setdefault(longName.rsplit('|', 1)[-1], []).append(longName)
+
+    def find(self, name):
+        """
+        :param name(str): short name, partial or long path
+        :return: long names matching the name, like mc.ls(name, long=True)
+        """
+        candidates = self.leaves.get(name.rsplit('|', 1)[-1], [])
+        if '|' not in name:
+            return candidates
+        if name.startswith('|'):
+            return [longName for longName in candidates if longName == name]
+        suffix = '|' + name
+        return [longName for longName in candidates if longName.endswith(suffix)]
+
+    def exists(self, name):
+        return bool(self.find(name))
+
+    def isJoint(self, name):
+        return any(longName in self.joints for longName in self.find(name))
+
+
+def resolveInfluences(influences, fullPathNames, index, rules=(), doAncestorSwap=False):
+    """
+    resolve every saved influence against the scene in one pass.
+    a rename is only taken when the renamed influence exists, missing influences fall back to
+    their closest existing joint ancestor from the saved full path when doAncestorSwap is on
+    :param influences(list): saved partial path names
+    :param fullPathNames(list): saved full path names, same order
+    :param index(HierarchyIndex): scene snapshot
+    :param rules(RenameRules/list): ordered rename rules, see RenameRules
+    :param doAncestorSwap(bool): substitute missing influences with an ancestor joint
+    :return: resolution table, one dict per influence with
+        'influence', 'resolved' (None when missing) and 'method': exact, renamed, ancestor or missing
+    """
+    rules = compileRules(rules)
+
+    def rename(name):
+        renamed = rules.rename(name)
+        if renamed != name and index.exists(renamed):
+            return renamed, True
+        return name, False
+
+    table = []
+    for position, influence in enumerate(influences):
+        resolved, renamed = rename(influence)
+        entry = {'influence': influence, 'resolved': None, 'method': 'missing'}
+        if index.exists(resolved):
+            entry.update(resolved=resolved, method='renamed' if renamed else 'exact')
+        elif doAncestorSwap and position < len(fullPathNames):
+            # nearest ancestor first, the leading '' of the long name is skipped
+            ancestors = fullPathNames[position].split('|')[1:-1]
+            for ancestor in reversed(ancestors):
+                ancestor, _ = rename(ancestor)
+                if index.isJoint(ancestor):
+                    entry.update(resolved=ancestor, method='ancestor')
+                    break
+        table.append(entry)
+    return table
+
+
+def renameInfluences(skinData, rules):
+    """
+    rename the influences, influences renamed onto the same name are merged
+    :param skinData(dict): skin data
+    :param rules(RenameRules/list): ordered rename rules, see RenameRules
+    :return: skin data with renamed influences
+    """
+    influences = skinData['partial_path_names']
+    renamed = compileRules(rules).renameAll(influences)
+    renamedData = dict(skinData, partial_path_names=renamed)
+    if len(skinData.get('full_path_names', ())) == len(influences):
+        # the partial path is the end of the full path, it is swapped for the renamed one
+        renamedData['full_path_names'] = [renameFullPath(fullPathName, influence, newName)
+                                          for fullPathName, influence, newName
+                                          in zip(skinData['full_path_names'], influences, renamed)]
+    return remapInfluences(renamedData, list(dict.fromkeys(renamed)))
+
+
+def renameFullPath(fullPathName, influence, newName):
+    """
+    :param fullPathName(str): full path name of the influence, e.g. '|root|spine|L_arm'
+    :param influence(str): its partial path name, e.g. 'spine|L_arm' or 'L_arm'
+    :param newName(str): the renamed partial path name
+    :return: full path name ending in newName
+    """
+    if fullPathName == influence:
+        return newName
+    if fullPathName.endswith('|' + influence):
+        return fullPathName[:len(fullPathName) - len(influence)] + newName
+    # not a suffix, only the leaf is swapped
+    return fullPathName.rsplit('|', 1)[0] + '|' + newName.rsplit('|', 1)[-1]
+
+
+def remapInfluences(skinData, influences):
+    """
+    reorder the weight columns to the given influence list, weights of influences not in it are dropped
+    :param skinData(dict): skin data
+    :param influences(list): target influence names
+    :return: skin data in the target influence order
+    """
+    mapping = weightMath.influenceMapping(skinData['partial_path_names'], influences)
+    weights = weightMath.remapWeights(weightMatrix(skinData), mapping, len(influences))
+    result = withWeights(skinData, weights, influences)
+    if 'full_path_names' in skinData and len(skinData['full_path_names']) == len(skinData['partial_path_names']):
+        fullPathNames = dict(zip(skinData['partial_path_names'], skinData['full_path_names']))
+        result['full_path_names'] = [fullPathNames.get(influence, influence) for influence in influences]
+    return result
+
+
+def influenceReport(skinData, epsilon=0.0):
+    """
+    :param skinData(dict): skin data
+    :param epsilon(float): weights at or below this value do not count as used
+    :return: json friendly list with the 'influence', 'total' weight and 'vertex_count' of every influence
+    """
+    totals, counts = weightMath.influenceUsage(weightMatrix(skinData), epsilon=epsilon)
+    return [{'influence': influence, 'total': total, 'vertex_count': count}
+            for influence, total, count in zip(skinData['partial_path_names'], totals.tolist(), counts.tolist())]
+
+
+def removeUnusedInfluences(skinData, epsilon=0.0):
+    """
+    drop the influences without any weight above epsilon, the last influence is always kept.
+    vertices that still had a weight at or below epsilon on them are renormalized
+    :param skinData(dict): skin data
+    :param epsilon(float): weights at or below this value do not count as used
+    :return: skin data with the compacted weight matrix
+    """
+    weights = weightMatrix(skinData)
+    unused = weightMath.unusedInfluences(weights, epsilon=epsilon)
+    if unused.size == weights.shape[1]:
+        unused = unused[:-1]
+    # weights at or below epsilon are dropped, the rows that had them are renormalized
+    weights, _ = weightMath.dropInfluences(weights, unused)
+    unused = set(unused.tolist())
+    influences = [influence for index, influence in enumerate(skinData['partial_path_names']) if index not in unused]
+    return remapInfluences(withWeights(skinData, weights), influences)
+
+
+def pruneInfluences(skinData, maxInfs, minWeight=0.0):
+    """
+    :param skinData(dict): skin data
+    :param maxInfs(int): maximum number of influences per vertex
+    :param minWeight(float): weights below this value are removed as well
+    :return: pruned and normalized skin data
+    """
+    return withWeights(skinData, weightMath.pruneWeights(weightMatrix(skinData), maxInfs, minWeight=minWeight))
+
+
+def normalizeWeights(skinData):
+    return withWeights(skinData, weightMath.normalizeRows(np.array(weightMatrix(skinData))))
+
+
+def validateWeights(skinData, tolerance=NORMALIZE_TOLERANCE):
+    """
+    :param skinData(dict): skin data
+    :param tolerance(float): allowed distance of every row sum from 1
+    :return: list of problems, empty when the skin data is valid
+    """
+    problems = []
+    for key in weightFile.REQUIRED_KEYS + ('weights',):
+        if key not in skinData:
+            problems.append("missing '{}'".format(key))
+    if problems:
+        return problems
+
+    influences = skinData['partial_path_names']
+    if not influences:
+        return ["no influences"]
+    if len(set(influences)) != len(influences):
+        problems.append("duplicate influence names")
+    if len(skinData['full_path_names']) != len(influences):
+        problems.append("{} full path names for {} influences".format(len(skinData['full_path_names']),
+                                                                     len(influences)))
+    try:
+        weights = weightMatrix(skinData)
+    except ValueError as error:
+        return problems + [str(error)]
+
+    componentCount = len(skinData['components'])
+    if componentCount != weights.shape[0]:
+        problems.append("{} components for {} weight rows".format(componentCount, weights.shape[0]))
+    if componentCount and np.unique(np.asarray(skinData['components'])).size != componentCount:
+        problems.append("duplicate components")
+    positions = skinData.get('positions')
+    if positions is not None and len(positions) and np.asarray(positions).shape != (weights.shape[0], 3):
+        problems.append("positions shape {} does not match {} vertices".format(np.asarray(positions).shape,
+                                                                               weights.shape[0]))
+
+    invalid = np.count_nonzero(~np.isfinite(weights))
+    if invalid:
+        problems.append("{} weights are not finite".format(invalid))
+    negative = np.count_nonzero(weights < 0)
+    if negative:
+        problems.append("{} weights are negative".format(negative))
+    unnormalized = np.count_nonzero(np.abs(weights.sum(axis=1) - 1.0) > tolerance)
+    if unnormalized:
+        problems.append("{} vertices are not normalized".format(unnormalized))
+    return problems
+
+
+def weightStats(skinData, maxInfs=4, epsilon=1e-6):
+    """
+    :param skinData(dict): skin data
+    :param maxInfs(int): vertices above this many influences are counted as offending
+    :param epsilon(float): weights at or below this value are not counted
+    :return: json friendly dict of weight statistics
+    """
+    influences = skinData['partial_path_names']
+    weights = weightMatrix(skinData)
+    audit = weightMath.auditInfluences(weights, maxInfs, epsilon=epsilon)
+    sums = weights.sum(axis=1)
+    used = np.count_nonzero(weights > epsilon, axis=0)
+    histogram = audit['histogram']
+    return {'vertex_count': weights.shape[0],
+            'influence_count': len(influences),
+            'nonzero_count': int(np.count_nonzero(weights)),
+            'max_influences': int(audit['counts'].max()) if weights.shape[0] else 0,
+            'offending_count': int(audit['offending'].size),
+            'histogram': histogram[:np.flatnonzero(histogram)[-1] + 1].tolist() if histogram.any() else [],
+            'unused_influences': [influences[index] for index in np.flatnonzero(used == 0).tolist()],
+            'row_sum_min': float(sums.min()) if sums.size else 0.0,
+            'row_sum_max': float(sums.max()) if sums.size else 0.0,
+            'unnormalized_count': int(np.count_nonzero(np.abs(sums - 1.0) > NORMALIZE_TOLERANCE))}
+
+
+def diffWeights(skinData, otherSkinData, epsilon=1e-6, worstCount=10):
+    """
+    compare two skin data dicts by influence name and component
+    :param skinData(dict): skin data
+    :param otherSkinData(dict): skin data to compare against
+    :param epsilon(float): differences up to this value are ignored
+    :param worstCount(int): how many of the most changed vertices to report
+    :return: json friendly dict of the differences
+    """
+    influences = skinData['partial_path_names']
+    otherInfluences = otherSkinData['partial_path_names']
+    influenceSet = set(influences)
+    otherInfluenceSet = set(otherInfluences)
+    result = {'missing_influences': [name for name in influences if name not in otherInfluenceSet],
+              'added_influences': [name for name in otherInfluences if name not in influenceSet],
+              'vertex_count': len(skinData['components']),
+              'other_vertex_count': len(otherSkinData['components'])}
+
+    # compare the shared vertices in the union of both influence lists
+    union = influences + result['added_influences']
+    weights = weightMath.remapWeights(weightMatrix(skinData),
+                                      weightMath.influenceMapping(influences, union), len(union))
+    otherWeights = weightMath.remapWeights(weightMatrix(otherSkinData),
+                                           weightMath.influenceMapping(otherInfluences, union), len(union))
+    components, rows, otherRows = np.intersect1d(np.asarray(skinData['components']),
+                                                 np.asarray(otherSkinData['components']),
+                                                 return_indices=True)
+    difference = np.abs(weights[rows] - otherWeights[otherRows]).max(axis=1, initial=0.0)
+    changed = np.flatnonzero(difference > epsilon)
+    order = changed[np.argsort(-difference[changed], kind='stable')[:worstCount]]
+
+    result['shared_vertex_count'] = int(components.size)
+    result['changed_vertex_count'] = int(changed.size)
+    result['max_difference'] = float(difference.max()) if difference.size else 0.0
+    result['worst'] = list(zip(components[order].tolist(), difference[order].tolist()))
+    return result
@@ -0,0 +1,20 @@
+"""
+shared data for the Maya-free tests, run from the repository root with python -m pytest
+"""
+import os
+import sys
+
+import pytest
+
+# the package is imported the way the tools and the benchmarks import it
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from skinning import weightOps
+
+
+def makeSkinData(vertexCount=200, influenceCount=8, nonzeros=4, seed=0, positions=True):
+    return weightOps.syntheticSkinData(vertexCount, influenceCount, nonzeros, seed=seed, positions=positions)
+
+
+@pytest.fixture
+def skinData():
+    return makeSkinData()
@@ -0,0 +1,125 @@
+import json
+
+import pytest
+
+from skinning import decorators
+
+
+@pytest.fixture
+def session(monkeypatch):
+    # the module functions and timeIt record into the shared session
+    session = decorators.TimingSession()
+    session.enable()
+    monkeypatch.setattr(decorators, 'session', session)
+    return session
+
+
+@pytest.mark.parametrize('value, enabled', [('', False), ('0', False), ('false', False), ('False', False),
+                                            ('off', False), ('1', True), ('yes', True)])
+def testEnvironmentEnablesTiming(monkeypatch, value, enabled):
+    monkeypatch.setenv('SKINNING_TIMING', value)
+    assert decorators.TimingSession().enabled is enabled
+
+
+def testDisabledSessionRecordsNothing(session):
+    session.disable()
+
+    @decorators.timeIt
+    def work():
+        return 3
+
+    assert decorators.span('load') is decorators.NULL_SPAN
+    with decorators.span('load', bytes=10) as timing:
+        timing.count('vertices', 5)
+        decorators.count('vertices', 5)
+        assert work() == 3
+    assert session.spans == []
+    assert session.report() == {'spans': [], 'totals': {}}
+
+
+def testNestedSpans(session):
+    with decorators.span('import') as outer:
+        with decorators.span('decode'):
+            with decorators.span('inflate') as inner:
+                pass
+        with decorators.span('set'):
+            pass
+    assert outer.parent is None and outer.depth == 0
+    assert inner.parent.name == 'decode' and inner.depth == 2
+
+    spans = dict((entry['name'], entry) for entry in session.report()['spans'])
+    # children finish first
+    assert [span.name for span in session.spans] == ['inflate', 'decode', 'set', 'import']
+    assert spans['decode']['parent'] == 'import' and spans['decode']['depth'] == 1
+    assert spans['set']['parent'] == 'import'
+    assert spans['import']['self_seconds'] == pytest.approx(
+        spans['import']['seconds'] - spans['decode']['seconds'] - spans['set']['seconds'], abs=1e-12)
+    assert spans['decode']['self_seconds'] == pytest.approx(
+        spans['decode']['seconds'] - spans['inflate']['seconds'], abs=1e-12)
+    assert spans['inflate']['self_seconds'] == spans['inflate']['seconds']
+    # the per thread stack is empty again
+    assert session.stack() == []
+
+
+def testCountAddsToInnermostSpan(session):
+    decorators.count('vertices', 1)
+    with decorators.span('export', vertices=10) as outer:
+        decorators.count('vertices', 5)
+        with decorators.span('serialize') as inner:
+            decorators.count('bytes', 64)
+            decorators.count('bytes', 16)
+    assert outer.counters == {'vertices': 15}
+    assert inner.counters == {'bytes': 80}
+
+
+def testReportTotalsPerName(session):
+    @decorators.timeIt(name='weights.prune')
+    def prune(vertexCount):
+        decorators.count('vertices', vertexCount)
+        return vertexCount
+
+    assert [prune(count) for count in (10, 20, 30)] == [10, 20, 30]
+    with decorators.span('weights.other'):
+        pass
+    totals = session.report()['totals']
+    assert sorted(totals) == ['weights.other', 'weights.prune']
+    prune = totals['weights.prune']
+    assert prune['calls'] == 3
+    assert prune['counters'] == {'vertices': 60}
+    seconds = [entry['seconds'] for entry in session.report()['spans'] if entry['name'] == 'weights.prune']
+    assert prune['seconds'] == pytest.approx(sum(seconds))
+    assert prune['self_seconds'] == pytest.approx(prune['seconds'])
+
+
+def testTimeItDefaultName(session):
+    @decorators.timeIt
+    def gather():
+        pass
+
+    gather()
+    assert session.spans[0].name == 'test_decorators.testTimeItDefaultName.<locals>.gather'
+
+
+def testDumps(session, tmp_path):
+    with decorators.span('import', vertices=4):
+        with decorators.span('decode'):
+            pass
+    jsonName = str(tmp_path / 'report.json')
+    traceName = str(tmp_path / 'trace.json')
+    session.dumpJson(jsonName)
+    session.dumpChromeTrace(traceName)
+
+    with open(jsonName) as reportFile:
+        report = json.load(reportFile)
+    assert report['totals']['import']['counters'] == {'vertices': 4}
+
+    with open(traceName) as traceFile:
+        events = json.load(traceFile)['traceEvents']
+    spans = session.report()['spans']
+    assert len(events) == len(spans) == 2
+    for event, entry in zip(events, spans):
+        assert event['name'] == entry['name']
+        assert event['ph'] == 'X'
+        assert event['ts'] == pytest.approx(entry['start'] * 1e6)
+        assert event['dur'] == pytest.approx(entry['seconds'] * 1e6)
+    assert events[1]['args'] == {'vertices': 4}
@@ -0,0 +1,116 @@
+import json
+import os
+
+import pytest
+
+from conftest import makeSkinData
+from skinning import weightBatch
+from skinning import weightCli
+from skinning import weightFile
+from skinning import weightOps
+
+
+@pytest.fixture
+def wtsFile(tmp_path):
+    fileName = str(tmp_path / 'body.wts')
+    weightFile.saveSkinData(fileName, makeSkinData(nonzeros=6), codec='zlib')
+    return fileName
+
+
+def testStats(wtsFile, capsys):
+    assert weightCli.main(['stats', wtsFile, '--json']) == 0
+    report = json.loads(capsys.readouterr().out)
+    assert report['vertex_count'] == 200
+    assert report['codec'] == 'zlib'
+
+
+def testPruneKeepsCodec(wtsFile, tmp_path):
+    outputName = str(tmp_path / 'pruned.wts')
+    assert weightCli.main(['prune', wtsFile, '--max-infs', '4', '-o', outputName]) == 0
+    pruned = weightFile.loadSkinData(outputName)
+    assert pruned['codec'] == 'zlib'
+    assert weightOps.weightStats(pruned, maxInfs=4)['offending_count'] == 0
+
+
+def testValidate(wtsFile, tmp_path):
+    badName = str(tmp_path / 'bad.wts')
+    skinData = makeSkinData()
+    weightFile.saveSkinData(badName, dict(skinData, weights=skinData['weights'] * 2.0))
+    assert weightCli.main(['validate', wtsFile]) == 0
+    assert weightCli.main(['validate', wtsFile, badName]) == 1
+
+
+def testInfluencesRemovesUnused(tmp_path):
+    fileName = str(tmp_path / 'body.wts')
+    outputName = str(tmp_path / 'used.wts')
+    skinData = makeSkinData()
+    weights = skinData['weights'].copy()
+    weights[:, 2] = 0.0
+    weights[:, 5] = 0.0
+    weights[0, 5] = 5e-4
+    weightFile.saveSkinData(fileName, dict(skinData, weights=weightOps.weightMath.normalizeRows(weights)))
+
+    assert weightCli.main(['influences', fileName, '--epsilon', '1e-3', '-o', outputName]) == 0
+    used = weightFile.loadSkinData(outputName)
+    assert used['partial_path_names'] == [name for index, name in enumerate(skinData['partial_path_names'])
+                                          if index not in (2, 5)]
+    # the row that had a weight below epsilon is renormalized once it is dropped
+    assert weightOps.validateWeights(used) == []
+
+
+def testBatchToOutputDirectory(tmp_path, wtsFile):
+    outputDir = str(tmp_path / 'out')
+    summaryName = str(tmp_path / 'summary.json')
+    assert weightCli.main(['batch', wtsFile, '--rename', '^joint', 'bone', '--prune', '3', '0.01', '--normalize',
+                           '-o', outputDir, '--workers', '1', '--summary', summaryName, '--quiet']) == 0
+    with open(summaryName) as summaryFile:
+        assert json.load(summaryFile)['failed_count'] == 0
+    result = weightFile.loadSkinData(os.path.join(outputDir, 'body.wts'))
+    assert all(name.startswith('bone') for name in result['partial_path_names'])
+    assert result['full_path_names'] == ['|root|' + name for name in result['partial_path_names']]
+    assert weightOps.weightStats(result, maxInfs=3)['offending_count'] == 0
+
+
+def testBatchRefusesRewritingABaseline(tmp_path):
+    baseName = str(tmp_path / 'base.wts')
+    skinData = makeSkinData()
+    weightFile.saveSkinData(baseName, skinData)
+    weights = skinData['weights'].copy()
+    weights[0] = weights[0][::-1]
+    weightFile.saveDeltaSkinData(str(tmp_path / 'delta.wts'), dict(skinData, weights=weights), baseName)
+    with pytest.raises(SystemExit) as error:
+        weightCli.main(['batch', str(tmp_path), '--normalize', '--workers', '1', '--quiet'])
+    assert 'base.wts' in str(error.value)
+
+
+@pytest.mark.parametrize('values', [['4', '0.1', '5'], ['four'], ['4', 'small']])
+def testBatchRejectsBadPruneValues(wtsFile, values):
+    with pytest.raises(SystemExit) as error:
+        weightCli.main(['batch', wtsFile, '--prune'] + values)
+    assert error.value.code == 2
+
+
+def testBatchKeepsLayoutOfSameNamedFiles(tmp_path):
+    outputDir = str(tmp_path / 'out')
+    for folder in ('a', 'b'):
+        os.makedirs(str(tmp_path / folder))
+        weightFile.saveSkinData(str(tmp_path / folder / 'body.wts'), makeSkinData())
+    jobs = weightBatch.collectFiles([str(tmp_path / 'a' / 'body.wts'), str(tmp_path / '*' / 'body.wts')],
+                                    outputDir=outputDir)
+    assert [outputName for _, outputName in jobs] == [os.path.join(outputDir, 'a', 'body.wts'),
+                                                      os.path.join(outputDir, 'b', 'body.wts')]
+    summary = weightBatch.runBatch(jobs, [('normalize', ())], workers=1)
+    assert summary['failed_count'] == 0
+    assert all(os.path.isfile(outputName) for _, outputName in jobs)
+
+
+def testBatchRefusesOutputCollisions(tmp_path):
+    outputDir = str(tmp_path / 'out')
+    for folder in ('a', 'b'):
+        os.makedirs(str(tmp_path / folder))
+        weightFile.saveSkinData(str(tmp_path / folder / 'body.wts'), makeSkinData())
+    # both directories lay their files out directly below the output directory
+    jobs = weightBatch.collectFiles([str(tmp_path / 'a'), str(tmp_path / 'b')], outputDir=outputDir)
+    with pytest.raises(ValueError):
+        weightBatch.runBatch(jobs, [('normalize', ())], workers=1)
+    assert not os.path.exists(outputDir)
@@ -0,0 +1,214 @@
+import os
+import pickle
+import time
+
+import numpy as np
+import pytest
+
+from conftest import makeSkinData
+from skinning import weightFile
+
+
+def writeBlocks(fileName, skinData, blockSize, codec=weightFile.DEFAULT_CODEC, atomic=False):
+    header = dict((key, value) for key, value in skinData.items() if key != 'weights')
+    with weightFile.SkinDataWriter(fileName, header, codec=codec, atomic=atomic) as writer:
+        for start in range(0, len(skinData['components']), blockSize):
+            writer.writeBlock(skinData['weights'][start:start + blockSize])
+
+
+def saveVersion1(fileName, skinData):
+    # the pickled csr layout written before the binary container
+    fileData = dict((key, value) for key, value in skinData.items() if key != 'weights')
+    fileData['weights_indptr'], fileData['weights_indices'], fileData['weights_values'] = \
+        weightFile.denseToCsr(skinData['weights'])
+    with open(fileName, "wb") as fileObj:
+        fileObj.write(weightFile.HEADER.pack(weightFile.MAGIC, 1))
+        pickle.dump(fileData, fileObj)
+
+
+@pytest.mark.parametrize('codec', sorted(weightFile.CODECS))
+def testRoundTrip(tmp_path, skinData, codec):
+    fileName = str(tmp_path / 'body.wts')
+    weightFile.saveSkinData(fileName, skinData, codec=codec)
+    loaded = weightFile.loadSkinData(fileName)
+
+    assert loaded['partial_path_names'] == skinData['partial_path_names']
+    assert loaded['full_path_names'] == skinData['full_path_names']
+    np.testing.assert_array_equal(loaded['components'], skinData['components'])
+    np.testing.assert_array_equal(loaded['positions'], skinData['positions'])
+    error = np.abs(loaded['weights'] - skinData['weights'].ravel()).max()
+    if weightFile.CODECS[codec][0]:
+        # the stored bound holds for what is loaded, renormalization included
+        assert error <= loaded['max_error']
+        assert loaded['max_error'] <= (4 + 1) * weightFile.QUANTIZE_MAX_ERROR
+    else:
+        assert error == 0.0
+
+
+@pytest.mark.parametrize('codec', ['raw', 'zlib', 'uint16'])
+@pytest.mark.parametrize('blockSize', [1, 7, 64, 1000])
+def testBlockWritesMatchWholeWrite(tmp_path, skinData, codec, blockSize):
+    wholeName = str(tmp_path / 'whole.wts')
+    blockName = str(tmp_path / 'blocks.wts')
+    weightFile.saveSkinData(wholeName, skinData, codec=codec)
+    writeBlocks(blockName, skinData, blockSize, codec=codec)
+
+    whole = weightFile.loadSkinData(wholeName)
+    blocks = weightFile.loadSkinData(blockName)
+    np.testing.assert_array_equal(blocks['weights'], whole['weights'])
+    np.testing.assert_array_equal(blocks['positions'], whole['positions'])
+    assert blocks['nonzero_count'] == whole['nonzero_count']
+    # no spill files are left behind
+    assert sorted(os.listdir(str(tmp_path))) == ['blocks.wts', 'whole.wts']
+
+
+@pytest.mark.parametrize('codec', ['raw', 'lzma', 'uint16-zlib'])
+def testIterWeightBlocks(tmp_path, skinData, codec):
+    fileName = str(tmp_path / 'body.wts')
+    weightFile.saveSkinData(fileName, skinData, codec=codec)
+    expected = weightFile.loadSkinData(fileName)['weights'].reshape(-1, len(skinData['partial_path_names']))
+    blocks = list(weightFile.iterWeightBlocks(fileName, 33))
+    assert [start for start, _, _ in blocks] == list(range(0, 200, 33))
+    np.testing.assert_array_equal(np.concatenate([weights for _, _, weights in blocks]), expected)
+
+
+def testWriterRejectsWrongVertexCount(tmp_path, skinData):
+    fileName = str(tmp_path / 'body.wts')
+    header = dict((key, value) for key, value in skinData.items() if key != 'weights')
+    with pytest.raises(RuntimeError):
+        with weightFile.SkinDataWriter(fileName, header) as writer:
+            writer.writeBlock(skinData['weights'][:10])
+    assert not os.listdir(str(tmp_path))
+
+
+@pytest.mark.parametrize('codec', ['raw', 'zlib'])
+def testAtomicWriteKeepsPreviousFile(tmp_path, skinData, codec):
+    fileName = str(tmp_path / 'body.wts')
+    weightFile.saveSkinData(fileName, skinData)
+    with open(fileName, "rb") as fileObj:
+        previous = fileObj.read()
+
+    header = dict((key, value) for key, value in skinData.items() if key != 'weights')
+    with pytest.raises(ValueError):
+        with weightFile.SkinDataWriter(fileName, header, codec=codec, atomic=True) as writer:
+            writer.writeBlock(skinData['weights'][:100])
+            raise ValueError("export failed halfway")
+    with open(fileName, "rb") as fileObj:
+        assert fileObj.read() == previous
+    assert os.listdir(str(tmp_path)) == ['body.wts']
+
+
+def testLegacyAndVersion1Files(tmp_path, skinData):
+    legacyName = str(tmp_path / 'legacy.wts')
+    version1Name = str(tmp_path / 'version1.wts')
+    with open(legacyName, "wb") as fileObj:
+        pickle.dump(dict(skinData, weights=skinData['weights'].ravel().tolist()), fileObj)
+    saveVersion1(version1Name, skinData)
+
+    for fileName, version in ((legacyName, 0), (version1Name, 1)):
+        assert weightFile.readHeader(fileName) is None
+        loaded = weightFile.loadSkinData(fileName)
+        assert loaded['version'] == version
+        np.testing.assert_array_equal(loaded['weights'], skinData['weights'].ravel())
+        info = weightFile.queryFileInfo(fileName)
+        assert info['vertex_count'] == 200 and info['influence_count'] == 8
+        blocks = list(weightFile.iterWeightBlocks(fileName, 64))
+        np.testing.assert_array_equal(np.concatenate([weights for _, _, weights in blocks]), skinData['weights'])
+
+
+def testHeaderQueryReadsNoWeights(tmp_path, skinData):
+    fileName = str(tmp_path / 'body.wts')
+    weightFile.saveSkinData(fileName, dict(skinData, topology_fingerprint='abc'), codec='uint16-lzma')
+    queried = weightFile.querySkinData(fileName)
+    assert 'weights' not in queried
+    assert queried['topology_fingerprint'] == 'abc'
+    info = weightFile.queryFileInfo(fileName)
+    assert info['codec'] == 'uint16-lzma'
+    assert info['nonzero_count'] == np.count_nonzero(skinData['weights'])
+    assert info['baseline_file'] is None
+
+
+def changeRows(skinData, rows, seed):
+    weights = skinData['weights'].copy()
+    weights[rows] = np.random.default_rng(seed).permutation(weights[rows].T).T
+    return dict(skinData, weights=weights)
+
+
+@pytest.mark.parametrize('codec', ['raw', 'uint16-zlib'])
+def testDeltaChain(tmp_path, skinData, codec):
+    baseName = str(tmp_path / 'base.wts')
+    weightFile.saveSkinData(baseName, skinData, codec=codec)
+
+    previousName, current = baseName, skinData
+    deltaNames = []
+    for index, rows in enumerate(([3, 4], [10], [3, 150, 151])):
+        current = changeRows(current, rows, seed=index)
+        deltaName = str(tmp_path / 'delta{}.wts'.format(index))
+        assert weightFile.saveDeltaSkinData(deltaName, current, previousName, codec=codec) == len(rows)
+        deltaNames.append(deltaName)
+        previousName = deltaName
+
+    header = weightFile.readHeader(deltaNames[-1])
+    assert weightFile.isDelta(header)
+    assert weightFile.baselinePath(deltaNames[-1], header) == os.path.abspath(deltaNames[-2])
+
+    tolerance = weightFile.loadSkinData(deltaNames[-1]).get('max_error', 0.0)
+    resolved = weightFile.loadSkinData(deltaNames[-1])['weights']
+    np.testing.assert_allclose(resolved, current['weights'].ravel(), atol=tolerance, rtol=0)
+    chained = weightFile.applyDeltas(baseName, deltaNames)['weights']
+    np.testing.assert_array_equal(chained, resolved)
+
+
+@pytest.mark.parametrize('codec', ['uint16', 'uint16-zlib'])
+def testDeltaIgnoresBaselineQuantization(tmp_path, skinData, codec):
+    baseName = str(tmp_path / 'base.wts')
+    weightFile.saveSkinData(baseName, skinData, codec=codec)
+    assert weightFile.saveDeltaSkinData(str(tmp_path / 'same.wts'), skinData, baseName) == 0
+    assert weightFile.saveDeltaSkinData(str(tmp_path / 'one.wts'), changeRows(skinData, [5], 0), baseName) == 1
+
+
+def testDeltaRejectsChangedBaseline(tmp_path, skinData):
+    baseName = str(tmp_path / 'base.wts')
+    deltaName = str(tmp_path / 'delta.wts')
+    weightFile.saveSkinData(baseName, skinData)
+    weightFile.saveDeltaSkinData(deltaName, changeRows(skinData, [1], 0), baseName)
+    weightFile.saveSkinData(baseName, changeRows(skinData, [2], 1))
+    with pytest.raises(RuntimeError):
+        weightFile.loadSkinData(deltaName)
+
+
+def testManifestInvalidatedByAnyWrite(tmp_path, skinData):
+    fileName = str(tmp_path / 'body.wts')
+    weightFile.saveSkinData(fileName, skinData)
+    manifest = weightFile.writeManifest(fileName, skinData)
+    assert weightFile.readManifest(fileName) == manifest
+
+    # same sparsity and size, other values
+    time.sleep(0.01)
+    weightFile.saveSkinData(fileName, dict(skinData, weights=skinData['weights'][:, ::-1].copy()))
+    assert os.path.getsize(fileName) == manifest['file_bytes']
+    assert weightFile.readManifest(fileName) is None
+
+
+def testContentHash(skinData):
+    digest = weightFile.contentHash(skinData)
+    assert digest == weightFile.contentHash(makeSkinData())
+    assert digest != weightFile.contentHash(dict(skinData, positions=skinData['positions'] + 1.0))
+    assert digest != weightFile.contentHash(changeRows(skinData, [0], 0))
+
+
+def testPreloadedSkinDataIsDiscarded(tmp_path, skinData):
+    fileName = str(tmp_path / 'body.wts')
+    weightFile.saveSkinData(fileName, skinData)
+    weightFile.preloadSkinData(fileName)
+    assert weightFile.preloadKey(fileName) in weightFile.preloadedSkinData
+    weightFile.discardPreloadedSkinData(fileName)
+    assert weightFile.preloadKey(fileName) not in weightFile.preloadedSkinData
+
+
+def testTopologyFingerprint():
+    faceCounts = np.array([3, 3])
+    fingerprint = weightFile.topologyFingerprint(faceCounts, np.array([0, 1, 2, 1, 2, 3]))
+    assert fingerprint == weightFile.topologyFingerprint(faceCounts.tolist(), [0, 1, 2, 1, 2, 3])
+    # same vertex count, other connectivity
+    assert fingerprint != weightFile.topologyFingerprint(faceCounts, np.array([0, 1, 3, 1, 2, 3]))
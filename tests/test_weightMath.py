@@ -0,0 +1,286 @@
+import numpy as np
+import pytest
+
+from skinning import weightMath
+
+
+def bruteForceNeighbours(sourcePoints, targetPoints, k):
+    distances = np.linalg.norm(targetPoints[:, None, :] - sourcePoints[None, :, :], axis=2)
+    return np.sort(distances, axis=1)[:, :k]
+
+
+@pytest.mark.parametrize('k', [1, 4])
+@pytest.mark.parametrize('chunkSize', [16, 16384])
+def testGridNearestNeighboursMatchesBruteForce(k, chunkSize):
+    rng = np.random.default_rng(3)
+    # clustered sources leave most cells empty, the targets reach outside the source bounds
+    sourcePoints = np.concatenate([rng.normal(0.0, 0.1, (300, 3)), rng.uniform(-5.0, 5.0, (100, 3))])
+    targetPoints = rng.uniform(-8.0, 8.0, (250, 3))
+    distances, indices = weightMath.gridNearestNeighbours(sourcePoints, targetPoints, k=k, chunkSize=chunkSize)
+
+    assert distances.shape == indices.shape == (250, k)
+    np.testing.assert_allclose(distances, bruteForceNeighbours(sourcePoints, targetPoints, k), rtol=0, atol=1e-12)
+    found = np.linalg.norm(targetPoints[:, None, :] - sourcePoints[indices], axis=2)
+    np.testing.assert_allclose(found, distances, rtol=0, atol=1e-12)
+
+
+def testGridNearestNeighboursFewerSourcesThanK():
+    sourcePoints = np.array([[0.0, 0.0, 0.0], [1.0, 0.0, 0.0]])
+    targetPoints = np.array([[0.2, 0.0, 0.0]])
+    distances, indices = weightMath.gridNearestNeighbours(sourcePoints, targetPoints, k=2)
+    np.testing.assert_array_equal(indices, [[0, 1]])
+    np.testing.assert_allclose(distances, [[0.2, 0.8]])
+
+
+def testNormalizeLockedKeepsLockedColumns():
+    weights = np.array([[0.2, 0.3, 0.3],
+                        [0.5, 0.25, 0.0],
+                        [0.4, 0.0, 0.0],
+                        [0.25, 0.5, 0.25]])
+    locked = np.array([True, False, False])
+    normalized, report = weightMath.normalizeLocked(weights, locked)
+
+    np.testing.assert_array_equal(normalized[:, 0], weights[:, 0])
+    np.testing.assert_allclose(normalized.sum(axis=1), 1.0)
+    # the unlocked weights keep their proportions
+    np.testing.assert_allclose(normalized[0, 1:], [0.4, 0.4])
+    np.testing.assert_allclose(normalized[1, 1:], [0.5, 0.0])
+    # nothing unlocked to scale, the remainder goes to the first unlocked influence
+    np.testing.assert_allclose(normalized[2, 1:], [0.6, 0.0])
+    np.testing.assert_array_equal(normalized[3], weights[3])
+    assert report['rows_adjusted'] == 3
+    assert report['assigned_rows'] == 1
+    assert report['unfixable_rows'] == 0
+    assert report['max_adjustment'] == pytest.approx(0.6)
+
+
+def testNormalizeLockedKeepsInfluenceCountOfEmptyRows():
+    weights = np.zeros((2, 100))
+    weights[0, [0, 1]] = [0.3, 0.2]
+    weights[1, 2] = 0.5
+    locked = np.zeros(100, dtype=bool)
+    locked[:2] = True
+    normalized, report = weightMath.normalizeLocked(weights, locked)
+    np.testing.assert_allclose(normalized.sum(axis=1), 1.0)
+    # the remainder is not spread over the 98 unlocked influences
+    assert weightMath.influenceCounts(normalized).tolist() == [3, 1]
+    assert normalized[0, 2] == pytest.approx(0.5)
+    assert report['assigned_rows'] == 1
+
+
+def testNormalizeLockedReportsUnfixableAndZeroRows():
+    weights = np.array([[0.7, 0.6, 0.1],
+                        [0.0, 0.0, 0.0],
+                        [0.5, 0.0, 0.0]])
+    locked = np.array([True, True, False])
+    normalized, report = weightMath.normalizeLocked(weights, locked)
+    np.testing.assert_array_equal(normalized[:2], weights[:2])
+    np.testing.assert_allclose(normalized[2], [0.5, 0.0, 0.5])
+    assert report['unfixable_rows'] == 1
+    assert report['zero_rows'] == 1
+    assert report['rows_adjusted'] == 1
+
+    allLocked, report = weightMath.normalizeLocked(np.array([[0.5, 0.25, 0.0]]), np.ones(3, dtype=bool))
+    np.testing.assert_array_equal(allLocked, [[0.5, 0.25, 0.0]])
+    assert report['unfixable_rows'] == 1
+
+
+def testNormalizeLockedWithoutLocks():
+    weights = weightMath.syntheticWeights(50, 6, 3, seed=1) * 1.5
+    normalized, report = weightMath.normalizeLocked(weights)
+    np.testing.assert_allclose(normalized, weights / 1.5)
+    assert report['rows_adjusted'] == 50
+
+
+def testPruneWeights():
+    weights = np.array([[0.1, 0.2, 0.3, 0.4],
+                        [0.05, 0.0, 0.0, 0.95]])
+    pruned = weightMath.pruneWeights(weights, 2, minWeight=0.1)
+    np.testing.assert_allclose(pruned, [[0.0, 0.0, 3.0 / 7.0, 4.0 / 7.0],
+                                        [0.0, 0.0, 0.0, 1.0]])
+
+
+def testDropInfluencesRenormalizesAffectedRows():
+    weights = np.array([[0.1, 0.6, 0.3],
+                        [0.0, 0.5, 0.5],
+                        [0.2, 0.2, 0.6]])
+    locked = np.array([False, False, True])
+    dropped, rows = weightMath.dropInfluences(weights, [0], locked)
+    np.testing.assert_array_equal(rows, [0, 2])
+    np.testing.assert_array_equal(dropped[:, 0], 0.0)
+    np.testing.assert_array_equal(dropped[1], weights[1])
+    np.testing.assert_array_equal(dropped[:, 2], weights[:, 2])
+    np.testing.assert_allclose(dropped.sum(axis=1), 1.0)
+
+
+def testTransferTable():
+    sourcePoints = np.array([[0.0, 0.0, 0.0], [1.0, 0.0, 0.0], [2.0, 0.0, 0.0]])
+    sourceWeights = np.eye(3)
+    targetPoints = np.array([[0.0, 0.0, 0.0], [0.25, 0.0, 0.0], [1.9, 0.0, 0.0]])
+
+    indices, blend = weightMath.transferTable(sourcePoints, targetPoints, k=2)
+    np.testing.assert_allclose(blend.sum(axis=1), 1.0)
+    transferred = weightMath.applyTransferTable(sourceWeights, indices, blend, chunkSize=2)
+    np.testing.assert_allclose(transferred[0], [1.0, 0.0, 0.0])
+    # inverse squared distance, 1 / 0.25 ** 2 against 1 / 0.75 ** 2
+    np.testing.assert_allclose(transferred[1], [0.9, 0.1, 0.0])
+    np.testing.assert_allclose(transferred.sum(axis=1), 1.0)
+    np.testing.assert_array_equal(transferred,
+                                  weightMath.transferWeights(sourcePoints, sourceWeights, targetPoints, k=2))
+
+
+def testMirror():
+    assert weightMath.mirrorName('L_arm_jnt') == 'R_arm_jnt'
+    assert weightMath.mirrorName('spine_jnt') == 'spine_jnt'
+    influences = ['L_arm', 'spine', 'R_arm']
+    permutation = weightMath.sidePermutation(influences)
+    np.testing.assert_array_equal(permutation, [2, 1, 0])
+
+    points = np.array([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [-1.0, 0.0, 0.0], [2.0, 0.0, 0.0]])
+    symmetry = weightMath.symmetryMap(points)
+    np.testing.assert_array_equal(symmetry, [2, 1, 0, -1])
+
+    weights = np.array([[1.0, 0.0, 0.0],
+                        [0.0, 1.0, 0.0],
+                        [0.0, 0.5, 0.5],
+                        [0.0, 1.0, 0.0]])
+    mirrored = weightMath.mirrorWeights(weights, symmetry, permutation, [2, 3])
+    np.testing.assert_array_equal(mirrored[2], [0.0, 0.0, 1.0])
+    np.testing.assert_array_equal(mirrored[3], weights[3])
+
+
+def testAuditInfluences():
+    weights = np.array([[0.5, 0.5, 0.0, 0.0],
+                        [0.25, 0.25, 0.25, 0.25],
+                        [1.0, 0.0, 0.0, 0.0],
+                        [0.4, 0.3, 0.3, 1e-7]])
+    audit = weightMath.auditInfluences(weights, 2, worstCount=1)
+    np.testing.assert_array_equal(audit['counts'], [2, 4, 1, 3])
+    np.testing.assert_array_equal(audit['offending'], [1, 3])
+    np.testing.assert_array_equal(audit['histogram'], [0, 1, 1, 1, 1])
+    assert audit['worst'] == [(1, 4)]
+
+    audit = weightMath.auditInfluences(weights, 4)
+    assert audit['offending'].size == 0 and audit['worst'] == []
+
+
+def testIndexRanges():
+    assert weightMath.indexRanges([8, 0, 1, 2, 5, 7, 1]) == [(0, 2), (5, 5), (7, 8)]
+    assert weightMath.indexRanges(np.array([3])) == [(3, 3)]
+    assert weightMath.indexRanges([]) == []
+
+
+def testInfluenceMappingAndRemap():
+    mapping = weightMath.influenceMapping(['hip', 'knee', 'gone', 'ankle'], ['ankle', 'hip', 'knee'])
+    np.testing.assert_array_equal(mapping, [1, 2, -1, 0])
+
+    weights = np.array([[0.1, 0.2, 0.3, 0.4],
+                        [1.0, 0.0, 0.0, 0.0]])
+    remapped = weightMath.remapWeights(weights, mapping, 3)
+    # missing influences are dropped, not renormalized
+    np.testing.assert_array_equal(remapped, [[0.4, 0.1, 0.2],
+                                             [0.0, 1.0, 0.0]])
+
+
+def testRemapWeightsSumsSharedTargets():
+    weights = np.array([[0.1, 0.2, 0.3, 0.4]])
+    remapped = weightMath.remapWeights(weights, [1, 1, 0, -1], 2)
+    np.testing.assert_allclose(remapped, [[0.3, 0.3]])
+
+
+def testUndoSnapshotRestoresOldWeights():
+    oldWeights = weightMath.syntheticWeights(30, 6, 2, seed=4)
+    newWeights = oldWeights.copy()
+    newWeights[[2, 17]] = weightMath.syntheticWeights(2, 6, 3, seed=5)
+    rows, indptr, indices, values = weightMath.undoSnapshot(oldWeights, newWeights)
+    np.testing.assert_array_equal(rows, [2, 17])
+    # only influences nonzero before or after are kept
+    for position, row in enumerate(rows):
+        used = np.flatnonzero((oldWeights[row] != 0) | (newWeights[row] != 0))
+        np.testing.assert_array_equal(indices[indptr[position]:indptr[position + 1]], used)
+
+    # what SkinWeightIOCmd.undoIt sets back
+    restored = newWeights.copy()
+    for position, row in enumerate(rows):
+        columns = indices[indptr[position]:indptr[position + 1]]
+        restored[row, columns] = values[indptr[position]:indptr[position + 1]]
+    np.testing.assert_array_equal(restored, oldWeights)
+
+    rows, indptr, indices, values = weightMath.undoSnapshot(oldWeights, oldWeights)
+    assert rows.size == indices.size == values.size == 0
+    np.testing.assert_array_equal(indptr, [0])
+
+
+def testChangedRows():
+    baseWeights = np.array([[0.5, 0.5], [1.0, 0.0], [0.2, 0.8]])
+    weights = np.array([[0.5, 0.5], [0.99995, 0.00005], [0.8, 0.2]])
+    np.testing.assert_array_equal(weightMath.changedRows(baseWeights, weights), [1, 2])
+    np.testing.assert_array_equal(weightMath.changedRows(baseWeights, weights, epsilon=1e-4), [2])
+
+
+# two quads sharing the edge 1-4, a triangle on 2-5 and vertex 7 without any face
+# 0 - 1 - 2
+# |   |   | \
+# 3 - 4 - 5 - 6
+QUAD_COUNTS = [4, 4, 3]
+QUAD_CONNECTS = [0, 1, 4, 3, 1, 2, 5, 4, 2, 6, 5]
+
+
+def testFaceEdgesAndAdjacency():
+    edges = weightMath.faceEdges(QUAD_COUNTS, QUAD_CONNECTS)
+    assert edges.tolist() == [[0, 1], [0, 3], [1, 2], [1, 4], [2, 5], [2, 6], [3, 4], [4, 5], [5, 6]]
+    assert weightMath.faceEdges([], []).shape == (0, 2)
+
+    indptr, indices = weightMath.vertexAdjacency(edges, 8)
+    neighbours = [sorted(indices[indptr[vertex]:indptr[vertex + 1]].tolist()) for vertex in range(8)]
+    assert neighbours == [[1, 3], [0, 2, 4], [1, 5, 6], [0, 4], [1, 3, 5], [2, 4, 6], [2, 5], []]
+
+
+@pytest.mark.parametrize('useSparse', [True, False])
+def testNeighbourSums(monkeypatch, useSparse):
+    if not useSparse:
+        # the gather and np.add.reduceat fallback used without scipy
+        monkeypatch.setattr(weightMath, 'sparse', None)
+    elif weightMath.sparse is None:
+        pytest.skip("scipy is not installed")
+    indptr, indices = weightMath.vertexAdjacency(weightMath.faceEdges(QUAD_COUNTS, QUAD_CONNECTS), 8)
+    weights = weightMath.syntheticWeights(8, 5, 2, seed=2)
+    expected = np.array([weights[indices[indptr[vertex]:indptr[vertex + 1]]].sum(axis=0) for vertex in range(8)])
+
+    sums, counts = weightMath.neighbourSums(weights, indptr, indices)
+    np.testing.assert_allclose(sums, expected)
+    np.testing.assert_array_equal(counts, [2, 3, 3, 2, 3, 3, 2, 0])
+
+    rows = np.array([7, 4, 0])
+    sums, counts = weightMath.neighbourSums(weights, indptr, indices, rows=rows)
+    np.testing.assert_allclose(sums, expected[rows])
+    np.testing.assert_array_equal(counts, [0, 3, 2])
+
+
+def testSmoothWeights():
+    indptr, indices = weightMath.vertexAdjacency(weightMath.faceEdges(QUAD_COUNTS, QUAD_CONNECTS), 8)
+    weights = np.zeros((8, 2))
+    weights[:, 0] = 1.0
+    weights[[3, 7], :] = [0.0, 1.0]
+
+    smoothed = weightMath.smoothWeights(weights, indptr, indices, strength=1.0)
+    # vertex 0 takes the mean of 1 and 3, vertex 7 has no neighbours and keeps its weights
+    np.testing.assert_allclose(smoothed[0], [0.5, 0.5])
+    np.testing.assert_allclose(smoothed[4], [2.0 / 3.0, 1.0 / 3.0])
+    np.testing.assert_array_equal(smoothed[7], weights[7])
+    np.testing.assert_allclose(smoothed.sum(axis=1), 1.0)
+
+    partial = weightMath.smoothWeights(weights, indptr, indices, strength=1.0, rows=[0], iterations=3)
+    np.testing.assert_array_equal(partial[1:], weights[1:])
+    np.testing.assert_allclose(partial[0], [0.5, 0.5])
+    np.testing.assert_array_equal(weightMath.smoothWeights(weights, indptr, indices, strength=0.0), weights)
+
+
+def testSmoothWeightsKeepsLockedInfluences():
+    indptr, indices = weightMath.vertexAdjacency(weightMath.faceEdges(QUAD_COUNTS, QUAD_CONNECTS), 8)
+    weights = weightMath.syntheticWeights(8, 4, 3, seed=6)
+    locked = np.array([False, True, False, False])
+    smoothed = weightMath.smoothWeights(weights, indptr, indices, iterations=2, lockedColumns=locked)
+    np.testing.assert_array_equal(smoothed[:, 1], weights[:, 1])
+    np.testing.assert_allclose(smoothed.sum(axis=1), 1.0)
+
@@ -0,0 +1,89 @@
+from skinning import weightOps
+
+
+SCENE = ['|root', '|root|spine', '|root|spine|L_arm', '|root|spine|L_arm|L_hand',
+         '|rig|L_arm', '|root|spine|group1']
+JOINTS = ['|root', '|root|spine', '|root|spine|L_arm', '|root|spine|L_arm|L_hand']
+
+
+def testHierarchyIndexFind():
+    index = weightOps.HierarchyIndex(SCENE, JOINTS)
+    assert index.find('L_arm') == ['|root|spine|L_arm', '|rig|L_arm']
+    assert index.find('spine|L_arm') == ['|root|spine|L_arm']
+    assert index.find('|rig|L_arm') == ['|rig|L_arm']
+    assert index.find('pine|L_arm') == []
+    assert index.exists('L_hand') and not index.exists('R_hand')
+    assert index.isJoint('spine') and not index.isJoint('group1')
+    assert not index.isJoint('rig|L_arm')
+
+
+def testResolveInfluencesSwapsMissingInfluencesForAncestors():
+    index = weightOps.HierarchyIndex(SCENE, JOINTS)
+    influences = ['L_hand', 'L_finger', 'L_thumb', 'gone']
+    fullPathNames = ['|root|spine|L_arm|L_hand',
+                     '|root|spine|L_arm|L_hand|L_finger',
+                     # group1 is not a joint, the swap walks on to spine
+                     '|root|spine|group1|L_thumb',
+                     '|gone']
+    table = weightOps.resolveInfluences(influences, fullPathNames, index, doAncestorSwap=True)
+    assert [(entry['resolved'], entry['method']) for entry in table] == [('L_hand', 'exact'),
+                                                                          ('L_hand', 'ancestor'),
+                                                                          ('spine', 'ancestor'),
+                                                                          (None, 'missing')]
+
+    table = weightOps.resolveInfluences(influences, fullPathNames, index)
+    assert [entry['method'] for entry in table] == ['exact', 'missing', 'missing', 'missing']
+
+
+def testResolveInfluencesOnlyTakesExistingRenames():
+    index = weightOps.HierarchyIndex(SCENE, JOINTS)
+    table = weightOps.resolveInfluences(['left_hand', 'left_foot', 'spine'], [], index, rules=[('^left_', 'L_')])
+    assert [(entry['resolved'], entry['method']) for entry in table] == [('L_hand', 'renamed'),
+                                                                          (None, 'missing'),
+                                                                          ('spine', 'exact')]
+
+
+def testRenameRulesApplyInOrder():
+    rules = weightOps.RenameRules([('^L_', 'left_'), ('left_arm', 'arm_L', True), ('_jnt$', '')])
+    assert rules.rename('L_arm') == 'arm_L'
+    assert rules.rename('L_leg_jnt') == 'left_leg'
+    # the exact rule runs after the regex, a name already equal to it is renamed as well
+    assert rules.rename('left_arm') == 'arm_L'
+
+    reversedRules = weightOps.RenameRules([('left_arm', 'arm_L', True), ('^L_', 'left_')])
+    assert reversedRules.rename('L_arm') == 'left_arm'
+
+
+def testRenameRulesExactMatchesWholeNames():
+    rules = weightOps.RenameRules([('spine', 'spine1', True)])
+    assert rules.renameAll(['spine', 'spine_01', 'upper_spine']) == ['spine1', 'spine_01', 'upper_spine']
+    # regex characters in an exact rule are literal
+    assert weightOps.renameInfluence('a.b', [('a.b', 'ab', True)]) == 'ab'
+    assert weightOps.renameInfluence('axb', [('a.b', 'ab', True)]) == 'axb'
+
+
+def testRenameRulesCacheIsClearedByAdd():
+    rules = weightOps.RenameRules()
+    assert not rules
+    assert rules.rename('L_arm') == 'L_arm'
+    rules.add('^L_', 'left_')
+    assert rules and rules.rename('L_arm') == 'left_arm'
+    assert weightOps.compileRules(rules) is rules
+
+
+def testRenameInfluencesMergesColumns():
+    skinData = {'partial_path_names': ['L_arm', 'left_arm', 'spine'],
+                'weights': [0.25, 0.25, 0.5, 0.0, 1.0, 0.0]}
+    renamed = weightOps.renameInfluences(skinData, [('^L_', 'left_')])
+    assert renamed['partial_path_names'] == ['left_arm', 'spine']
+    assert renamed['weights'].tolist() == [[0.5, 0.5], [1.0, 0.0]]
+
+
+def testRenameInfluencesRenamesFullPaths():
+    skinData = {'partial_path_names': ['L_arm', 'spine|L_leg', 'spine'],
+                'full_path_names': ['|root|spine|L_arm', '|root|spine|L_leg', '|root|spine'],
+                'weights': [0.25, 0.25, 0.5]}
+    renamed = weightOps.renameInfluences(skinData, [('L_', 'left_'), ('spine', 'chest', True)])
+    assert renamed['partial_path_names'] == ['left_arm', 'spine|left_leg', 'chest']
+    assert renamed['full_path_names'] == ['|root|spine|left_arm', '|root|spine|left_leg', '|root|chest']
+